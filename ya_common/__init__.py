@@ -0,0 +1,6 @@
+"""
+Модули, общие для проектов ya_news и ya_note.
+
+Пакет лежит рядом с проектами, settings.py каждого проекта добавляет
+его родительскую директорию в sys.path.
+"""
@@ -0,0 +1,106 @@
+"""
+Кэш пользователя для аутентифицированных запросов.
+
+CachedAuthenticationMiddleware заменяет AuthenticationMiddleware
+и берёт пользователя из кэша вместо запроса к таблице пользователей.
+В кэше лежит не модель, а короткая запись: id, имя, флаги и хэш
+сессии. Хэша пароля в общем кэше нет, остальные поля пользователя
+загружаются из базы при первом обращении к ним.
+
+Проверки те же, что в django.contrib.auth.get_user: бэкенд из сессии,
+user_can_authenticate бэкенда (is_active) и хэш сессии, поэтому смена
+пароля по-прежнему завершает чужие сессии. Запись сбрасывается при
+сохранении и удалении пользователя. QuerySet.update() сигналов
+не отправляет: после него нужно вызвать forget_user, иначе изменение
+станет видно только через USER_CACHE_TIMEOUT секунд.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import get_user_model
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.db import router
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+USER_CACHE_KEY = 'auth:user:{}'
+CACHED_FLAGS = ('is_active', 'is_staff', 'is_superuser')
+
+
+def get_user_cache():
+    return caches[settings.USER_CACHE_ALIAS]
+
+
+def user_cache_key(pk):
+    return USER_CACHE_KEY.format(pk)
+
+
+def forget_user(pk):
+    """Удаляет пользователя из кэша."""
+    get_user_cache().delete(user_cache_key(pk))
+
+
+def cached_fields():
+    User = get_user_model()
+    return (User._meta.pk.attname, User.USERNAME_FIELD) + CACHED_FLAGS
+
+
+def make_record(user):
+    return {
+        'fields': {name: getattr(user, name) for name in cached_fields()},
+        'session_hash': user.get_session_auth_hash(),
+    }
+
+
+def restore_user(record):
+    """Пользователь из записи кэша, остальные поля отложены."""
+    User = get_user_model()
+    fields = record['fields']
+    # from_db ждёт значения в порядке полей модели.
+    names = [
+        field.attname for field in User._meta.concrete_fields
+        if field.attname in fields
+    ]
+    return User.from_db(
+        router.db_for_read(User), names, [fields[name] for name in names]
+    )
+
+
+def get_cached_user(request):
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+    cache = get_user_cache()
+    key = user_cache_key(user_id)
+    record = cache.get(key)
+    if record is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            cache.set(key, make_record(user), settings.USER_CACHE_TIMEOUT)
+        return user
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if not session_hash or not constant_time_compare(
+        session_hash, record['session_hash']
+    ):
+        request.session.flush()
+        return AnonymousUser()
+    user = restore_user(record)
+    backend = auth.load_backend(backend_path)
+    can_authenticate = getattr(backend, 'user_can_authenticate', None)
+    if can_authenticate is not None and not can_authenticate(user):
+        return AnonymousUser()
+    user.backend = backend_path
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware с пользователем из кэша."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
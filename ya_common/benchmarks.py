@@ -0,0 +1,117 @@
+"""
+Замеры маршрутов через тестовый клиент Django.
+
+Результаты копятся в results/latest.json директории замеров проекта
+и сравниваются с baseline.json рядом: маршрут считается регрессией,
+если его p95 вырос больше чем на BENCHMARK_THRESHOLD (по умолчанию 25%)
+или стало больше SQL-запросов. BENCHMARK_SAVE_BASELINE=1 записывает
+текущие результаты как новую базу.
+"""
+import json
+import os
+import statistics
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+BASELINE_NAME = 'baseline.json'
+RESULTS_NAME = Path('results') / 'latest.json'
+DEFAULT_SCALES = '10,10000'
+DEFAULT_REQUESTS = 50
+DEFAULT_THRESHOLD = 0.25
+
+
+def scales():
+    """Масштабы данных, например BENCHMARK_SCALES=10,10000,1000000."""
+    raw = os.environ.get('BENCHMARK_SCALES', DEFAULT_SCALES)
+    return [int(scale) for scale in raw.split(',')]
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def measure(client, url, method='get', data=None):
+    """
+    Замеряет маршрут: задержки, запросы в секунду, SQL и пиковую память.
+
+    Кэш очищается перед каждым запросом, чтобы мерить полную обработку.
+    """
+    requests = int(os.environ.get('BENCHMARK_REQUESTS', DEFAULT_REQUESTS))
+    send = getattr(client, method)
+    for _ in range(3):
+        cache.clear()
+        send(url, data=data)
+    latencies = []
+    for _ in range(requests):
+        cache.clear()
+        started = perf_counter()
+        send(url, data=data)
+        latencies.append(perf_counter() - started)
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        tracemalloc.start()
+        send(url, data=data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        'requests_per_second': len(latencies) / sum(latencies),
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'queries': len(queries.captured_queries),
+        'peak_memory_kib': peak / 1024,
+    }
+
+
+class Results:
+    """
+    Результаты прогона и сравнение с сохранённой базой.
+    directory — директория замеров проекта.
+    """
+
+    def __init__(self, directory):
+        self.baseline_path = Path(directory) / BASELINE_NAME
+        self.results_path = Path(directory) / RESULTS_NAME
+        self.routes = {}
+        self.baseline = {}
+        if self.baseline_path.exists():
+            self.baseline = json.loads(self.baseline_path.read_text())
+        self.threshold = float(
+            os.environ.get('BENCHMARK_THRESHOLD', DEFAULT_THRESHOLD)
+        )
+
+    def add(self, name, scale, result):
+        key = f'{name}@{scale}'
+        self.routes[key] = result
+        return self.regressions(key, result)
+
+    def regressions(self, key, result):
+        """Описания регрессий маршрута относительно базы."""
+        base = self.baseline.get(key)
+        if base is None:
+            return []
+        problems = []
+        limit = base['p95_ms'] * (1 + self.threshold)
+        if result['p95_ms'] > limit:
+            problems.append(
+                f'{key}: p95 {result["p95_ms"]:.1f} мс > {limit:.1f} мс'
+            )
+        if result['queries'] > base['queries']:
+            problems.append(
+                f'{key}: SQL-запросов {result["queries"]} '
+                f'вместо {base["queries"]}'
+            )
+        return problems
+
+    def save(self):
+        self.results_path.parent.mkdir(exist_ok=True)
+        text = json.dumps(self.routes, indent=2, sort_keys=True)
+        self.results_path.write_text(text)
+        if os.environ.get('BENCHMARK_SAVE_BASELINE'):
+            self.baseline_path.write_text(text)
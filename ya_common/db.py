@@ -0,0 +1,19 @@
+"""
+Настройка соединений SQLite.
+
+При каждом новом соединении выполняются PRAGMA из SQLITE_PRAGMAS
+в порядке словаря: journal_mode стоит первым, остальные настройки
+действуют только на текущее соединение.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def set_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRAGMAS:
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
@@ -0,0 +1,489 @@
+"""
+Метрики приложения в формате Prometheus.
+
+Счётчики и гистограммы с фиксированными корзинами пополняются
+MetricsMiddleware: время и количество запросов по именам маршрутов,
+количество и время SQL-запросов через execute_wrapper. Страница
+/metrics/ доступна только персоналу.
+
+По умолчанию значения хранятся в памяти процесса. Если задан
+METRICS_MULTIPROCESS_DIR, каждый процесс пишет значения в свой
+mmap-файл в этой директории, а страница метрик суммирует все файлы.
+Файлы завершившихся процессов забирает себе следующий запущенный
+процесс, поэтому директория не растёт с перезапусками воркеров.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+from contextlib import ExitStack
+from pathlib import Path
+from time import perf_counter, sleep
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUANTILES = (0.5, 0.95, 0.99)
+UNRESOLVED_ROUTE = 'unresolved'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+MMAP_INITIAL_SIZE = 1 << 16
+MMAP_HEADER = 8
+MMAP_SEQUENCE = 4
+MMAP_READ_ATTEMPTS = 100
+MMAP_READ_DELAY = 0.001
+
+
+class MemoryStore:
+    """Значения метрик в памяти процесса."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key, amount):
+        self.inc_many(((key, amount),))
+
+    def inc_many(self, amounts):
+        """Прибавляет значения разом: collect видит все или ни одного."""
+        with self._lock:
+            for key, amount in amounts:
+                self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class MmapFile:
+    """
+    Файл значений одного процесса.
+
+    Формат: в заголовке занятый размер и счётчик изменений, затем
+    записи: длина ключа, ключ, выравнивание до 8 байт и значение типа
+    double. На время изменения счётчик нечётный, см. read_values.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(MMAP_INITIAL_SIZE)
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._used = struct.unpack_from('i', self._map, 0)[0]
+        if self._used == 0:
+            self._used = MMAP_HEADER
+            struct.pack_into('i', self._map, 0, self._used)
+        self._positions = {
+            key: position
+            for key, _, position in read_entries(self._map, self._used)
+        }
+
+    def _grow(self, size):
+        while self._used + size > self._capacity:
+            self._capacity *= 2
+        self._map.close()
+        self._file.truncate(self._capacity)
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+
+    def _add(self, key):
+        encoded = key.encode()
+        padding = -(4 + len(encoded)) % 8
+        size = 4 + len(encoded) + padding + 8
+        if self._used + size > self._capacity:
+            self._grow(size)
+        struct.pack_into(
+            f'i{len(encoded)}s{padding}x', self._map, self._used,
+            len(encoded), encoded
+        )
+        position = self._used + size - 8
+        struct.pack_into('d', self._map, position, 0.0)
+        self._used += size
+        # Занятый размер пишем последним: читатели не увидят запись
+        # раньше, чем она будет заполнена.
+        struct.pack_into('i', self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def inc_many(self, amounts):
+        sequence = struct.unpack_from('I', self._map, MMAP_SEQUENCE)[0]
+        struct.pack_into('I', self._map, MMAP_SEQUENCE, sequence + 1)
+        try:
+            for key, amount in amounts:
+                position = self._positions.get(key)
+                if position is None:
+                    position = self._add(key)
+                value = struct.unpack_from('d', self._map, position)[0]
+                struct.pack_into('d', self._map, position, value + amount)
+        finally:
+            struct.pack_into(
+                'I', self._map, MMAP_SEQUENCE, (sequence + 2) % (1 << 32)
+            )
+
+
+def read_entries(data, used):
+    """Перебирает записи (ключ, значение, позиция значения) файла."""
+    position = MMAP_HEADER
+    while position < used:
+        length = struct.unpack_from('i', data, position)[0]
+        key = bytes(data[position + 4:position + 4 + length]).decode()
+        position += 4 + length + (-(4 + length) % 8)
+        yield key, struct.unpack_from('d', data, position)[0], position
+        position += 8
+
+
+def read_values(path):
+    """
+    Значения файла процесса. Если файл прочитан посреди изменения —
+    счётчик изменений нечётный или сменился, — он перечитывается.
+    После MMAP_READ_ATTEMPTS попыток с паузой MMAP_READ_DELAY секунд
+    берётся последнее прочитанное: процесс мог завершиться посреди
+    изменения.
+    """
+    with open(path, 'rb') as file:
+        for _ in range(MMAP_READ_ATTEMPTS):
+            file.seek(0)
+            data = file.read()
+            if len(data) < MMAP_HEADER:
+                return {}
+            file.seek(MMAP_SEQUENCE)
+            sequence = data[MMAP_SEQUENCE:MMAP_HEADER]
+            if sequence == file.read(4) and (
+                struct.unpack('I', sequence)[0] % 2 == 0
+            ):
+                break
+            # Процесс-писатель мог быть вытеснен посреди изменения.
+            sleep(MMAP_READ_DELAY)
+    used = struct.unpack_from('i', data, 0)[0]
+    return {key: value for key, value, _ in read_entries(data, used)}
+
+
+def process_alive(pid):
+    """
+    Жив ли процесс. Вне POSIX os.kill завершает процесс,
+    поэтому там все процессы считаются живыми.
+    """
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MmapStore:
+    """Значения метрик в mmap-файлах, по файлу на процесс."""
+
+    def __init__(self, directory):
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+
+    def inc(self, key, amount):
+        self.inc_many(((key, amount),))
+
+    def inc_many(self, amounts):
+        with self._lock:
+            # После fork у дочернего процесса должен быть свой файл.
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._file = MmapFile(
+                    self._directory / f'metrics_{self._pid}.db'
+                )
+                self._absorb_dead()
+            self._file.inc_many(amounts)
+
+    def _absorb_dead(self):
+        """
+        Переносит значения завершившихся процессов в свой файл.
+        Файл сначала переименовывается: из нескольких процессов,
+        запущенных одновременно, его заберёт только один.
+        """
+        for path in self._directory.glob('metrics_*.db'):
+            try:
+                pid = int(path.stem.split('_', 1)[1])
+            except ValueError:
+                continue
+            if pid == self._pid or process_alive(pid):
+                continue
+            claimed = path.with_name(f'{path.name}.{self._pid}')
+            try:
+                path.rename(claimed)
+            except FileNotFoundError:
+                continue
+            self._file.inc_many(read_values(claimed).items())
+            claimed.unlink()
+
+    def collect(self):
+        values = {}
+        for path in self._directory.glob('metrics_*.db'):
+            try:
+                entries = read_values(path)
+            except FileNotFoundError:
+                continue
+            for key, value in entries.items():
+                values[key] = values.get(key, 0.0) + value
+        return values
+
+
+def make_key(name, labels, bucket=None):
+    return json.dumps([name, labels, bucket], ensure_ascii=False)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n')
+        )
+        for name, value in labels
+    )
+    return f'{{{pairs}}}'
+
+
+def format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, label_names):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+
+    def labels_of(self, values):
+        return [[name, str(values[name])] for name in self.label_names]
+
+    def series(self, values):
+        """Группирует значения хранилища по наборам меток."""
+        series = {}
+        for key, value in values.items():
+            name, labels, bucket = json.loads(key)
+            if name == self.name:
+                labels = tuple(tuple(label) for label in labels)
+                series.setdefault(labels, {})[bucket] = value
+        return series
+
+    def expose(self, values):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        for labels, points in sorted(self.series(values).items()):
+            lines.extend(self.expose_series(labels, points))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.store.inc(
+            make_key(self.name, self.labels_of(labels)), amount
+        )
+
+    def expose_series(self, labels, points):
+        value = format_value(points[None])
+        yield f'{self.name}{format_labels(labels)} {value}'
+
+
+class Histogram(Metric):
+    """
+    Гистограмма с фиксированными корзинами.
+
+    В хранилище лежат некумулятивные счётчики корзин, сумма и количество,
+    поэтому значения разных процессов можно просто складывать.
+    """
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS):
+        super().__init__(*args)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        labels = self.labels_of(labels)
+        bucket = next(bound for bound in self.buckets if value <= bound)
+        self.registry.store.inc_many((
+            (make_key(self.name, labels, str(bucket)), 1),
+            (make_key(self.name, labels, 'sum'), value),
+            (make_key(self.name, labels, 'count'), 1),
+        ))
+
+    def cumulative(self, points):
+        total = 0
+        for bound in self.buckets:
+            total += points.get(str(bound), 0)
+            yield bound, total
+
+    def quantile(self, points, quantile):
+        """Оценка квантиля линейной интерполяцией внутри корзины."""
+        count = points.get('count', 0)
+        if not count:
+            return None
+        rank = quantile * count
+        lower, below = 0.0, 0
+        for bound, total in self.cumulative(points):
+            if total >= rank:
+                if bound == float('inf'):
+                    return lower
+                share = (rank - below) / (total - below)
+                return lower + (bound - lower) * share
+            lower, below = bound, total
+        return lower
+
+    def expose_series(self, labels, points):
+        for bound, total in self.cumulative(points):
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            bucket_labels = labels + (('le', le),)
+            yield (f'{self.name}_bucket{format_labels(bucket_labels)} '
+                   f'{format_value(total)}')
+        yield (f'{self.name}_sum{format_labels(labels)} '
+               f'{format_value(points.get("sum", 0))}')
+        yield (f'{self.name}_count{format_labels(labels)} '
+               f'{format_value(points.get("count", 0))}')
+
+    def expose(self, values):
+        lines = super().expose(values)
+        name = f'{self.name}_quantile'
+        lines.append(
+            f'# HELP {name} Оценка квантилей {self.name} по корзинам'
+        )
+        lines.append(f'# TYPE {name} gauge')
+        for labels, points in sorted(self.series(values).items()):
+            for quantile in QUANTILES:
+                value = self.quantile(points, quantile)
+                if value is None:
+                    continue
+                quantile_labels = labels + (('quantile', str(quantile)),)
+                lines.append(
+                    f'{name}{format_labels(quantile_labels)} {value:.6f}'
+                )
+        return lines
+
+
+class Registry:
+    """Набор метрик с общим хранилищем значений."""
+
+    def __init__(self):
+        self.metrics = []
+        self._store = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    directory = settings.METRICS_MULTIPROCESS_DIR
+                    self._store = (
+                        MmapStore(directory) if directory else MemoryStore()
+                    )
+        return self._store
+
+    def reset(self):
+        """Сбрасывает хранилище: оно создастся заново по настройкам."""
+        with self._lock:
+            self._store = None
+
+    def counter(self, name, documentation, label_names=()):
+        metric = Counter(self, name, documentation, label_names)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, label_names=(), **kwargs):
+        metric = Histogram(self, name, documentation, label_names, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def expose(self):
+        values = self.store.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.expose(values))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+REQUESTS = registry.counter(
+    'http_requests_total', 'Количество запросов',
+    ('route', 'method', 'status'),
+)
+REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'Время обработки запроса',
+    ('route',),
+)
+DB_QUERIES = registry.counter(
+    'db_queries_total', 'Количество SQL-запросов', ('route',),
+)
+DB_QUERY_DURATION = registry.histogram(
+    'db_query_duration_seconds', 'Время выполнения SQL-запроса',
+    ('route',),
+)
+
+
+class QueryObserver:
+    """Обёртка для execute_wrapper: замеряет SQL-запросы маршрута."""
+
+    def __init__(self):
+        self.durations = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations.append(perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """Пополняет метрики по каждому запросу; включается METRICS_ENABLED."""
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        observer = QueryObserver()
+        started = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(observer))
+            response = self.get_response(request)
+        duration = perf_counter() - started
+        match = request.resolver_match
+        route = match.view_name if match else UNRESOLVED_ROUTE
+        REQUESTS.inc(
+            route=route, method=request.method, status=response.status_code
+        )
+        REQUEST_DURATION.observe(duration, route=route)
+        if observer.durations:
+            DB_QUERIES.inc(len(observer.durations), route=route)
+            for query_duration in observer.durations:
+                DB_QUERY_DURATION.observe(query_duration, route=route)
+        return response
+
+
+@staff_member_required
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus."""
+    return HttpResponse(registry.expose(), content_type=CONTENT_TYPE)
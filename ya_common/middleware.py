@@ -0,0 +1,195 @@
+"""
+Инструментирование запросов.
+
+Для каждого запроса считаются SQL-запросы и их время, время view,
+рендеринга шаблона и всего запроса, а для части запросов — пиковая
+память по tracemalloc. Результат отдаётся в заголовке Server-Timing
+и копится в скользящих агрегатах по имени маршрута.
+
+Включается настройкой PERFORMANCE_INSTRUMENTATION, view не меняются.
+"""
+import random
+import threading
+import tracemalloc
+from collections import deque
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+METRICS = ('db', 'view', 'render', 'total')
+UNRESOLVED_ROUTE = 'unresolved'
+
+_stats_lock = threading.Lock()
+_trace_lock = threading.Lock()
+_route_stats = {}
+
+
+class RequestTimings:
+    """Замеры одного запроса, в секундах и байтах."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.view = None
+        self.render = 0.0
+        self.total = 0.0
+        self.memory = None
+        self.view_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += perf_counter() - started
+
+    def header(self):
+        parts = [
+            f'db;desc="{self.queries} queries";dur={self.db * 1000:.2f}',
+            f'view;dur={(self.view or 0) * 1000:.2f}',
+            f'render;dur={self.render * 1000:.2f}',
+            f'total;dur={self.total * 1000:.2f}',
+        ]
+        if self.memory is not None:
+            parts.append(f'mem;desc="peak {self.memory / 1024:.1f} KiB"')
+        return ', '.join(parts)
+
+
+class RouteStats:
+    """Скользящие агрегаты по последним запросам одного маршрута."""
+
+    def __init__(self, window):
+        self.count = 0
+        self.samples = deque(maxlen=window)
+        self.memory = deque(maxlen=window)
+
+    def add(self, timings):
+        self.count += 1
+        self.samples.append(
+            (timings.queries,) + tuple(
+                getattr(timings, metric) or 0.0 for metric in METRICS
+            )
+        )
+        if timings.memory is not None:
+            self.memory.append(timings.memory)
+
+    def summary(self):
+        window = len(self.samples)
+        columns = list(zip(*self.samples))
+        summary = {
+            'count': self.count,
+            'window': window,
+            'queries': sum(columns[0]) / window,
+        }
+        for metric, values in zip(METRICS, columns[1:]):
+            summary[metric] = {
+                'avg': sum(values) / window,
+                'max': max(values),
+            }
+        if self.memory:
+            summary['memory'] = {
+                'avg': sum(self.memory) / len(self.memory),
+                'max': max(self.memory),
+            }
+        return summary
+
+
+def get_route_stats():
+    """Снимок агрегатов по всем маршрутам."""
+    with _stats_lock:
+        return {
+            route: stats.summary() for route, stats in _route_stats.items()
+        }
+
+
+def reset_route_stats():
+    with _stats_lock:
+        _route_stats.clear()
+
+
+def record(route, timings):
+    with _stats_lock:
+        stats = _route_stats.get(route)
+        if stats is None:
+            stats = _route_stats[route] = RouteStats(
+                settings.PERFORMANCE_WINDOW
+            )
+        stats.add(timings)
+
+
+def start_memory_trace():
+    """
+    Включает tracemalloc для выборки запросов.
+
+    tracemalloc общий на процесс, поэтому одновременно трассируется
+    только один запрос, а пик включает выделения соседних потоков.
+    """
+    if random.random() >= settings.PERFORMANCE_MEMORY_SAMPLE_RATE:
+        return False
+    if not _trace_lock.acquire(blocking=False):
+        return False
+    if tracemalloc.is_tracing():
+        _trace_lock.release()
+        return False
+    tracemalloc.start()
+    return True
+
+
+def stop_memory_trace():
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    _trace_lock.release()
+    return peak
+
+
+class ServerTimingMiddleware:
+    """
+    Замеряет запрос и добавляет заголовок Server-Timing.
+
+    Стоит первым в MIDDLEWARE, чтобы замер охватывал весь запрос,
+    а process_template_response вызывался последним, перед рендерингом.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PERFORMANCE_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = request.timings = RequestTimings()
+        traced = start_memory_trace()
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            if traced:
+                timings.memory = stop_memory_trace()
+        timings.total = perf_counter() - started
+        if timings.view is None and timings.view_started is not None:
+            timings.view = timings.total - (timings.view_started - started)
+        response['Server-Timing'] = timings.header()
+        match = request.resolver_match
+        record(match.view_name if match else UNRESOLVED_ROUTE, timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.timings.view_started = perf_counter()
+
+    def process_template_response(self, request, response):
+        timings = request.timings
+        render_started = perf_counter()
+        timings.view = render_started - timings.view_started
+
+        def rendered(response):
+            timings.render = perf_counter() - render_started
+
+        response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,152 @@
+"""
+Фоновые удаления пачками, общие для ya_news и ya_note.
+
+Сборщик удаления Django загружает все зависимые строки в память
+и удаляет их одной транзакцией, которая всё это время держит
+блокировку записи SQLite. Задание удаляет зависимые строки пачками
+по PURGE_BATCH_SIZE: каждая пачка — короткая транзакция с обычными
+сигналами, и в ней же фиксируется прогресс. Сам объект удаляется
+последним, когда зависимых строк уже нет.
+
+Задание сначала захватывается одним UPDATE: выполняемое задание
+с меткой heartbeat моложе PURGE_LEASE секунд другой процесс не берёт,
+а прерванное продолжает команда run_purge_jobs.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+
+class PurgeJobBase(models.Model):
+    """Состояние и прогресс задания, см. news.PurgeJob и notes.PurgeJob."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    target_id = models.PositiveBigIntegerField('id объекта')
+    target = models.CharField('Объект', max_length=150, blank=True)
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUSES, default=PENDING
+    )
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    finished = models.DateTimeField('Завершено', null=True, blank=True)
+    heartbeat = models.DateTimeField(
+        'Последняя пачка', null=True, blank=True
+    )
+
+    class Meta:
+        abstract = True
+        ordering = ('-pk',)
+
+
+def delete_in_batches(rows, batch_size, on_batch=None):
+    """
+    Удаляет строки QuerySet rows пачками по batch_size, по транзакции
+    на пачку. on_batch вызывается с размером пачки внутри её
+    транзакции, чтобы прогресс фиксировался вместе с удалением.
+    """
+    while True:
+        with transaction.atomic():
+            batch = list(rows.values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return
+            rows.model.objects.filter(pk__in=batch).delete()
+            if on_batch is not None:
+                on_batch(len(batch))
+
+
+def claim(job):
+    """
+    Отмечает задание выполняемым, если его не выполняет другой
+    процесс. Проверка и отметка — один UPDATE, поэтому задание
+    захватит только один процесс.
+    """
+    now = timezone.now()
+    stale = now - timezone.timedelta(seconds=settings.PURGE_LEASE)
+    return type(job).objects.filter(
+        Q(status__in=(job.PENDING, job.FAILED))
+        | Q(status=job.RUNNING, heartbeat=None)
+        | Q(status=job.RUNNING, heartbeat__lt=stale),
+        pk=job.pk,
+    ).update(status=job.RUNNING, heartbeat=now) == 1
+
+
+def run_job(job, rows, target, batch_size, progress=None):
+    """
+    Удаляет зависимые строки rows пачками, затем target — QuerySet
+    самого объекта. progress вызывается с заданием после каждой
+    пачки. Возвращает None, если задание выполняет другой процесс.
+    """
+    if not claim(job):
+        return None
+    job.refresh_from_db()
+    job.total = job.deleted + rows.count()
+    job.save(update_fields=('total',))
+
+    def on_batch(deleted):
+        job.deleted += deleted
+        job.heartbeat = timezone.now()
+        job.save(update_fields=('deleted', 'heartbeat'))
+        if progress is not None:
+            progress(job)
+
+    try:
+        delete_in_batches(rows, batch_size, on_batch)
+        with transaction.atomic():
+            target.delete()
+            job.status = job.DONE
+            job.finished = timezone.now()
+            job.save(update_fields=('status', 'finished'))
+    except Exception as error:
+        job.status = job.FAILED
+        job.error = str(error)
+        job.save(update_fields=('status', 'error'))
+        raise
+    return job
+
+
+class RunPurgeJobsCommand(BaseCommand):
+    """
+    Основа команд run_purge_jobs: задания модели job_model выполняет
+    функция run_job проекта.
+    """
+    help = (
+        'Выполняет фоновые удаления, которые ждут в очереди '
+        'или были прерваны. Задания, которые сейчас выполняет '
+        'другой процесс, пропускаются.'
+    )
+    job_model = None
+    run_job = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--failed',
+            action='store_true',
+            help='Повторить и задания, завершившиеся ошибкой.',
+        )
+
+    def handle(self, *args, **options):
+        statuses = [self.job_model.PENDING, self.job_model.RUNNING]
+        if options['failed']:
+            statuses.append(self.job_model.FAILED)
+        jobs = self.job_model.objects.filter(
+            status__in=statuses
+        ).order_by('pk')
+        for job in jobs:
+            if self.run_job(job, progress=self.report) is None:
+                self.stdout.write(f'{job}: выполняется другим процессом')
+                continue
+            self.stdout.write(f'{job}: готово')
+
+    def report(self, job):
+        self.stdout.write(f'{job}: удалено {job.deleted} из {job.total}')
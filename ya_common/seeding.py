@@ -0,0 +1,144 @@
+"""
+Основа команд seed_news и seed_notes.
+
+Строки вставляются кортежами значений через executemany, в обход
+моделей и bulk_create: на миллионе строк построение объектов
+и компиляция INSERT занимают большую часть времени. Строки, которые
+нарушают уникальность, пропускаются, поэтому повторный запуск с тем же
+--seed ничего не дублирует и не падает.
+"""
+import random
+from contextlib import contextmanager
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+User = get_user_model()
+
+ZIPF_EXPONENT = 1.1
+
+
+def zipf_weights(size):
+    """Накопленные веса с длинным хвостом: первым объектам — больше всего."""
+    return list(accumulate(
+        1 / (rank ** ZIPF_EXPONENT) for rank in range(1, size + 1)
+    ))
+
+
+def batched(objects, batch_size):
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert_sql(model, fields):
+    """INSERT по колонкам полей fields, пропускающий конфликты."""
+    ops = connection.ops
+    columns = (model._meta.get_field(name).column for name in fields)
+    return '{} {} ({}) VALUES ({}) {}'.format(
+        ops.insert_statement(ignore_conflicts=True),
+        ops.quote_name(model._meta.db_table),
+        ', '.join(map(ops.quote_name, columns)),
+        ', '.join(['%s'] * len(fields)),
+        ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+    ).rstrip()
+
+
+@contextmanager
+def indexes_dropped(model):
+    """
+    На SQLite снимает неуникальные индексы таблицы на время вставки
+    и строит их заново после неё: построить индекс по готовой таблице
+    во много раз быстрее, чем вставлять миллион строк в несколько
+    индексов вразброс. Уникальные индексы остаются — по ним
+    пропускаются повторы. Вызывается внутри транзакции, поэтому
+    прерванная вставка не оставит таблицу без индексов.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA index_list({table})')
+        names = [
+            name for _, name, unique, origin, _ in cursor.fetchall()
+            if not unique and origin == 'c'
+        ]
+        indexes = []
+        for name in names:
+            cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'index' "
+                "AND name = %s",
+                [name],
+            )
+            indexes.append(cursor.fetchone()[0])
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+    yield
+    with connection.cursor() as cursor:
+        for sql in indexes:
+            cursor.execute(sql)
+
+
+class SeedCommand(BaseCommand):
+    """Общие аргументы, пользователи и вставка пачками."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50000,
+            help='Сколько строк передавать базе одним запросом.',
+        )
+
+    def prepare(self, options):
+        """Вызывается в начале handle."""
+        if options['seed'] < 0:
+            raise CommandError('--seed не может быть отрицательным.')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+    def insert(self, model, fields, rows):
+        """
+        Вставляет строки — кортежи значений полей fields в формате
+        базы — пачками в одной транзакции.
+        """
+        self.execute_rows(model, insert_sql(model, fields), rows)
+
+    def execute_rows(self, model, sql, rows):
+        """
+        Выполняет sql с параметрами из rows пачками в одной
+        транзакции, пока индексы таблицы model сняты.
+        """
+        with transaction.atomic(), indexes_dropped(model):
+            with connection.cursor() as cursor:
+                for batch in batched(rows, self.batch_size):
+                    cursor.executemany(sql, batch)
+
+    def create_users(self, count, seed):
+        """id пользователей seed{seed}_…, недостающие создаются."""
+        prefix = f'seed{seed}_'
+        password = make_password(None)
+        for batch in batched(range(count), self.batch_size):
+            User.objects.bulk_create((
+                User(username=f'{prefix}{index}', password=password)
+                for index in batch
+            ), ignore_conflicts=True)
+        return list(User.objects.filter(
+            username__startswith=prefix
+        ).order_by('pk').values_list('pk', flat=True)[:count])
+
+    def choices(self, population, cum_weights, count):
+        for batch_start in range(0, count, self.batch_size):
+            yield from self.rng.choices(
+                population,
+                cum_weights=cum_weights,
+                k=min(self.batch_size, count - batch_start),
+            )
@@ -0,0 +1,24 @@
+"""
+Бенчмарки проекта YaNews.
+
+Запускаются из директории ya_news как модули, например:
+python -m benchmarks.profanity
+"""
+import os
+
+import django
+
+
+def setup(database=None, settings_module=None):
+    """
+    Настраивает Django для запуска бенчмарка вне manage.py.
+    database — путь к отдельному файлу SQLite вместо рабочей базы,
+    settings_module — профиль настроек вместо yanews.settings.
+    """
+    if settings_module is not None:
+        os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yanews.settings')
+    if database is not None:
+        from django.conf import settings
+        settings.DATABASES['default']['NAME'] = database
+    django.setup()
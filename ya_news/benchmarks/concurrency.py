@@ -0,0 +1,137 @@
+"""
+Пропускная способность SQLite при параллельных читателях и писателях.
+
+python -m benchmarks.concurrency --database /tmp/concurrency.sqlite3
+
+Бенчмарк запускает себя по разу с каждым профилем настроек: читатели
+загружают новость и первую страницу её комментариев, писатели создают
+комментарии со всеми сигналами. Каждая операция обрамлена
+close_old_connections(), как запрос в Django, поэтому CONN_MAX_AGE
+влияет на результат. Режим WAL хранится в самом файле базы, поэтому
+перед замером базового профиля журнал возвращается в режим DELETE.
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import threading
+from time import perf_counter
+
+from benchmarks import setup
+
+PROFILES = ('yanews.settings', 'yanews.settings_production')
+
+
+def worker(operation, deadline, stats, lock):
+    """Повторяет операцию до deadline и копит счётчики."""
+    from django.db import OperationalError, close_old_connections, connection
+
+    done = errors = 0
+    while perf_counter() < deadline:
+        close_old_connections()
+        try:
+            operation()
+            done += 1
+        except OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            errors += 1
+        finally:
+            close_old_connections()
+    connection.close()
+    with lock:
+        stats['operations'] += done
+        stats['lock_errors'] += errors
+
+
+def run(args):
+    """Замер одного профиля, результат печатается строкой JSON."""
+    setup(args.database, args.profile)
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db import connection
+
+    from news.models import Comment, News
+    from news.pagination import get_comments_page
+
+    call_command('migrate', verbosity=0)
+    if not News.objects.exists():
+        call_command(
+            'seed_news', users=100, news=args.news, comments=args.comments,
+            verbosity=0,
+        )
+    if args.profile == PROFILES[0]:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode = DELETE')
+    news_ids = list(News.objects.values_list('pk', flat=True))
+    author_ids = list(get_user_model().objects.values_list('pk', flat=True))
+    connection.close()
+
+    def read():
+        get_comments_page(News.objects.get(pk=random.choice(news_ids)))
+
+    def write():
+        Comment.objects.create(
+            news_id=random.choice(news_ids),
+            author_id=random.choice(author_ids),
+            text='Комментарий из бенчмарка',
+        )
+
+    stats = {'operations': 0, 'lock_errors': 0}
+    counters = {'read': dict(stats), 'write': dict(stats)}
+    lock = threading.Lock()
+    deadline = perf_counter() + args.seconds
+    threads = [
+        threading.Thread(
+            target=worker, args=(operation, deadline, counters[kind], lock)
+        )
+        for kind, operation, count in (
+            ('read', read, args.readers), ('write', write, args.writers)
+        )
+        for _ in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(json.dumps(counters))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', required=True)
+    parser.add_argument('--news', type=int, default=1000)
+    parser.add_argument('--comments', type=int, default=100000)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profile', choices=PROFILES,
+                        help='Замерить только один профиль.')
+    args = parser.parse_args()
+
+    if args.profile is not None:
+        run(args)
+        return
+    print(f'Читателей: {args.readers}, писателей: {args.writers}, '
+          f'{args.seconds:g} с на профиль')
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.concurrency', *sys.argv[1:],
+             '--profile', profile],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        counters = json.loads(output.splitlines()[-1])
+        line = [profile]
+        for kind, label in (('read', 'чтение'), ('write', 'запись')):
+            total = sum(counters[kind].values())
+            share = counters[kind]['lock_errors'] / total if total else 0
+            line.append(
+                f'{label}: {counters[kind]["operations"] / args.seconds:.0f}'
+                f' оп/с, ошибок блокировки {share:.1%}'
+            )
+        print(', '.join(line))
+
+
+if __name__ == '__main__':
+    main()
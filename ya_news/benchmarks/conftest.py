@@ -0,0 +1,49 @@
+from io import StringIO
+from pathlib import Path
+
+import pytest
+from django.core.management import call_command
+from django.db.models import Max
+
+from news.models import News
+from news.pytest_tests.conftest import *  # noqa: F401,F403
+from ya_common.benchmarks import Results, scales
+
+
+@pytest.fixture(scope='session')
+def benchmark_results():
+    """
+    Фикстура собирает результаты всех маршрутов и сохраняет их в JSON
+    """
+    results = Results(Path(__file__).resolve().parent)
+    yield results
+    results.save()
+
+
+@pytest.fixture(scope='module', params=scales(), ids=lambda scale: f'{scale}')
+def scale(request, django_db_setup, django_db_blocker):
+    """
+    Фикстура заполняет базу комментариями в заданном количестве
+    командой seed_news и очищает её после всех замеров масштаба
+    """
+    with django_db_blocker.unblock():
+        call_command(
+            'seed_news',
+            users=max(request.param // 100, 1),
+            news=max(request.param // 100, 20),
+            comments=request.param,
+            seed=request.param,
+            stdout=StringIO(),
+        )
+    yield request.param
+    with django_db_blocker.unblock():
+        call_command('flush', interactive=False, verbosity=0)
+
+
+@pytest.fixture
+def busiest_news(scale):
+    """
+    Фикстура возвращает новость с наибольшим количеством комментариев
+    """
+    top = News.objects.aggregate(Max('comment_count'))['comment_count__max']
+    return News.objects.filter(comment_count=top).first()
@@ -0,0 +1,57 @@
+"""
+Сравнение автомата WordMatcher с проверкой слов в цикле.
+
+python -m benchmarks.profanity --words 5000 --text-length 1000
+"""
+import argparse
+import random
+import timeit
+
+from benchmarks import setup
+
+ALPHABET = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+
+
+def random_word(rng, min_length=4, max_length=12):
+    length = rng.randint(min_length, max_length)
+    return ''.join(rng.choice(ALPHABET) for _ in range(length))
+
+
+def loop_find(words, text):
+    """Прежняя реализация CommentForm.clean_text."""
+    for word in words:
+        if word in text:
+            return word
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--words', type=int, default=5000)
+    parser.add_argument('--text-length', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup()
+    from news.profanity import WordMatcher
+
+    rng = random.Random(args.seed)
+    words = [random_word(rng, min_length=8) for _ in range(args.words)]
+    text = ' '.join(
+        random_word(rng, max_length=7) for _ in range(args.text_length // 5)
+    )[:args.text_length]
+    build = timeit.timeit(lambda: WordMatcher(words), number=1)
+    matcher = WordMatcher(words)
+    assert matcher.find(text) == loop_find(words, text)
+
+    loop = timeit.timeit(lambda: loop_find(words, text), number=args.repeat)
+    automaton = timeit.timeit(lambda: matcher.find(text), number=args.repeat)
+    print(f'Слов: {args.words}, длина текста: {len(text)}')
+    print(f'Сборка автомата: {build * 1000:.1f} мс')
+    print(f'Цикл по словам: {loop / args.repeat * 1e6:.1f} мкс на текст')
+    print(f'Ахо — Корасик: {automaton / args.repeat * 1e6:.1f} мкс на текст')
+
+
+if __name__ == '__main__':
+    main()
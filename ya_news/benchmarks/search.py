@@ -0,0 +1,72 @@
+"""
+Задержка поиска по FTS5 и запасного поиска через icontains.
+
+python -m benchmarks.search --comments 1000000 --database /tmp/search.sqlite3
+
+База заполняется командой seed_news один раз и переиспользуется
+при следующих запусках с тем же --database.
+"""
+import argparse
+import statistics
+import timeit
+
+from benchmarks import setup
+
+# Частые слова из seed_news и редкие слова, добавленные бенчмарком.
+QUERIES = ('робот', 'рекурсия кэш', 'индекс очередь сервер', 'иголка')
+NEEDLES = 10
+
+
+def measure(results, repeat):
+    """Миллисекунды на count() и первую страницу результатов."""
+    def run():
+        results.count()
+        results._count = None
+        return results[:20]
+
+    timings = timeit.repeat(run, number=1, repeat=repeat)
+    return statistics.median(timings) * 1000, results.count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', required=True)
+    parser.add_argument('--news', type=int, default=10000)
+    parser.add_argument('--comments', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--fallback', action='store_true',
+                        help='Замерить и поиск через icontains.')
+    args = parser.parse_args()
+
+    setup(args.database)
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+
+    from news.models import Comment, News
+    from news.search import FtsSearchResults, SearchResults
+
+    call_command('migrate', verbosity=0)
+    if Comment.objects.count() < args.comments:
+        call_command(
+            'seed_news', news=args.news, comments=args.comments, verbosity=0
+        )
+        news = News.objects.first()
+        author = get_user_model().objects.first()
+        for index in range(NEEDLES):
+            Comment.objects.create(
+                news=news, author=author, text=f'Иголка в стоге {index}'
+            )
+
+    print(f'Новостей: {News.objects.count()}, '
+          f'комментариев: {Comment.objects.count()}')
+    for query in QUERIES:
+        fts, found = measure(FtsSearchResults(query), args.repeat)
+        line = f'{query!r}: найдено {found}, FTS5 {fts:.1f} мс'
+        if args.fallback:
+            fallback, _ = measure(SearchResults(query), args.repeat)
+            line += f', icontains {fallback:.1f} мс'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Замеры маршрутов YaNews на нескольких масштабах данных.
+
+Запуск из директории ya_news: pytest benchmarks
+Масштабы задаются BENCHMARK_SCALES, число запросов — BENCHMARK_REQUESTS,
+остальные настройки описаны в ya_common.benchmarks.
+"""
+import pytest
+from django.urls import reverse
+
+from ya_common.benchmarks import measure
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.parametrize(
+    'name, user, url',
+    (('news:home', pytest.lazy_fixture('client'),
+      pytest.lazy_fixture('news_home_url')),
+     ('news:detail', pytest.lazy_fixture('client'),
+      pytest.lazy_fixture('busiest_detail_url')),
+     ('news:detail (author)', pytest.lazy_fixture('author_client'),
+      pytest.lazy_fixture('busiest_detail_url')),
+     ('news:edit', pytest.lazy_fixture('author_client'),
+      pytest.lazy_fixture('news_edit_url')),
+     ('news:delete', pytest.lazy_fixture('author_client'),
+      pytest.lazy_fixture('news_delete_url')),
+     ('users:login', pytest.lazy_fixture('client'),
+      pytest.lazy_fixture('users_login_url')),
+     ('users:signup', pytest.lazy_fixture('client'),
+      pytest.lazy_fixture('users_signup_url'))),
+)
+def test_get_latency(benchmark_results, scale, name, user, url):
+    """Время ответа на GET не выходит за пределы сохранённой базы"""
+    result = measure(user, url)
+
+    assert benchmark_results.add(name, scale, result) == []
+
+
+def test_comment_post_latency(benchmark_results, scale, author_client,
+                              busiest_news, form_data):
+    """Время добавления комментария не выходит за пределы базы"""
+    url = reverse('news:detail', args=(busiest_news.pk,))
+    result = measure(author_client, url, method='post', data=form_data)
+
+    assert benchmark_results.add('news:detail POST', scale, result) == []
+
+
+@pytest.fixture
+def busiest_detail_url(busiest_news):
+    """
+    Фикстура возвращает ссылку на новость с наибольшим
+    количеством комментариев
+    """
+    return reverse('news:detail', args=(busiest_news.pk,))
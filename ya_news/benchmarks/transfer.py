@@ -0,0 +1,58 @@
+"""
+Память и скорость потоковой выгрузки новостей и комментариев.
+
+python -m benchmarks.transfer --database /tmp/search.sqlite3
+
+База должна быть заполнена заранее, например бенчмарком search.
+Максимальный RSS процесса не должен зависеть от количества строк:
+он определяется --chunk-size. --tracemalloc дополнительно считает пик
+памяти Python-объектов, но замедляет выгрузку в несколько раз.
+"""
+import argparse
+import os
+import resource
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+from benchmarks import setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', required=True)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--tracemalloc', action='store_true')
+    args = parser.parse_args()
+
+    setup(args.database)
+    from django.core.management import call_command
+
+    from news.transfer import Exporter
+
+    call_command('migrate', verbosity=0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'dump.jsonl')
+        exporter = Exporter(
+            path, 'jsonl', compress=args.gzip, chunk_size=args.chunk_size
+        )
+        if args.tracemalloc:
+            tracemalloc.start()
+        started = perf_counter()
+        rows = exporter.run()
+        elapsed = perf_counter() - started
+        if args.tracemalloc:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f'Пик памяти Python-объектов: {peak / 2 ** 20:.1f} МиБ')
+        size = os.path.getsize(path)
+    # ru_maxrss в Linux — в КиБ.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'Строк: {rows}, {elapsed:.1f} с ({rows / elapsed:.0f} строк/с), '
+          f'файл {size / 2 ** 20:.0f} МиБ')
+    print(f'Максимальный RSS процесса: {max_rss:.0f} МиБ')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,50 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.templatetags.admin_urls import add_preserved_filters
+from django.db.models.expressions import RawSQL
+from django.forms.models import BaseInlineFormSet
+from django.http import HttpResponseRedirect
+from django.urls import reverse
+from django.utils.html import format_html
 
-from .models import Comment, News
+from .models import BadWord, Comment, News, PurgeJob
+from .purge import enqueue
+from .search import SEARCH_TABLE, FtsSearchResults, use_fts
+
+PURGE_QUEUED = 'Новость «{}» будет удалена в фоне, см. фоновые удаления.'
+NEWS_DELETED = 'Удалено новостей: {}.'
+
+
+def queued_purges(request):
+    """id новостей, которые в этом запросе отданы фоновым заданиям."""
+    if not hasattr(request, '_queued_purges'):
+        request._queued_purges = set()
+    return request._queued_purges
+
+
+def comments_url(**lookups):
+    """Список комментариев в админке с фильтром по индексированному полю."""
+    query = '&'.join(f'{key}={value}' for key, value in lookups.items())
+    return f'{reverse("admin:news_comment_changelist")}?{query}'
+
+
+class LatestCommentsFormSet(BaseInlineFormSet):
+    """Только последние ADMIN_INLINE_COMMENTS комментариев новости."""
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            self._queryset = super().get_queryset().select_related(
+                'author'
+            ).order_by('-created', '-pk')[:settings.ADMIN_INLINE_COMMENTS]
+        return self._queryset
 
 
 class CommentInline(admin.StackedInline):
     model = Comment
+    formset = LatestCommentsFormSet
     extra = 0
+    raw_id_fields = ('author',)
+    readonly_fields = ('created',)
 
 
 @admin.register(News)
@@ -13,3 +52,170 @@ class NewsAdmin(admin.ModelAdmin):
     inlines = [
         CommentInline,
     ]
+    list_display = ('title', 'date', 'comments')
+    date_hierarchy = 'date'
+    search_fields = ('title',)
+    readonly_fields = ('all_comments',)
+    show_full_result_count = False
+
+    def is_large(self, news):
+        return news.comment_count >= settings.PURGE_THRESHOLD
+
+    def get_deleted_objects(self, objs, request):
+        """
+        Для новостей с большим числом комментариев страница
+        подтверждения не перечисляет каждый комментарий.
+        """
+        objs = list(objs)
+        if not any(self.is_large(news) for news in objs):
+            return super().get_deleted_objects(objs, request)
+        perms_needed = {
+            model._meta.verbose_name
+            for model in (News, Comment)
+            if not request.user.has_perm(
+                f'news.delete_{model._meta.model_name}'
+            )
+        }
+        model_count = {
+            News._meta.verbose_name_plural: len(objs),
+            Comment._meta.verbose_name_plural: sum(
+                news.comment_count for news in objs
+            ),
+        }
+        return [str(news) for news in objs], model_count, perms_needed, []
+
+    def delete_model(self, request, obj):
+        """Новость с большим числом комментариев удаляется в фоне."""
+        if not self.is_large(obj):
+            return super().delete_model(request, obj)
+        enqueue(PurgeJob.NEWS, obj)
+        queued_purges(request).add(obj.pk)
+        self.message_user(
+            request, PURGE_QUEUED.format(obj), messages.WARNING
+        )
+
+    def delete_queryset(self, request, queryset):
+        small = []
+        for news in queryset:
+            if self.is_large(news):
+                self.delete_model(request, news)
+            else:
+                small.append(news.pk)
+        queryset.filter(pk__in=small).delete()
+        if small and queued_purges(request):
+            # Своё сообщение вместо сообщения Django, см. message_user.
+            super().message_user(
+                request, NEWS_DELETED.format(len(small)), messages.SUCCESS
+            )
+
+    def response_delete(self, request, obj_display, obj_id):
+        """
+        После новости, отданной фоновому заданию, — сразу в список
+        новостей: о задании уже сообщил delete_model.
+        """
+        if obj_id not in queued_purges(request):
+            return super().response_delete(request, obj_display, obj_id)
+        return HttpResponseRedirect(add_preserved_filters(
+            {
+                'preserved_filters': self.get_preserved_filters(request),
+                'opts': self.model._meta,
+            },
+            reverse(
+                'admin:news_news_changelist',
+                current_app=self.admin_site.name,
+            ),
+        ))
+
+    def message_user(self, request, message, level=messages.INFO,
+                     *args, **kwargs):
+        """
+        Действие удаления сообщает, что удалены все выбранные новости,
+        и отданные фоновым заданиям тоже. Если такие есть, сообщение
+        Django не выводится: об остальных сообщает delete_queryset.
+        """
+        if level == messages.SUCCESS and queued_purges(request):
+            return
+        super().message_user(request, message, level, *args, **kwargs)
+
+    @admin.display(description='Комментариев', ordering='comment_count')
+    def comments(self, news):
+        """Счётчик из comment_count: без подсчёта строк комментариев."""
+        return news.comment_count
+
+    @admin.display(description='Все комментарии')
+    def all_comments(self, news):
+        if news.pk is None:
+            return '—'
+        return format_html(
+            '<a href="{}">{}</a>',
+            comments_url(news__id__exact=news.pk),
+            news.comment_count,
+        )
+
+
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    """
+    Фильтры по новости и автору задаются ссылками из списка и читают
+    индексы (news, created) и (author, created). Сортировка по id
+    не требует сортировки всей таблицы.
+    """
+    list_display = ('__str__', 'news_link', 'author_link', 'created')
+    list_select_related = ('news', 'author')
+    raw_id_fields = ('news', 'author')
+    readonly_fields = ('created',)
+    search_fields = ('text',)
+    ordering = ('-pk',)
+    show_full_result_count = False
+
+    @admin.display(description='Новость', ordering='news')
+    def news_link(self, comment):
+        return format_html(
+            '<a href="{}">{}</a>',
+            comments_url(news__id__exact=comment.news_id),
+            comment.news,
+        )
+
+    @admin.display(description='Автор', ordering='author')
+    def author_link(self, comment):
+        return format_html(
+            '<a href="{}">{}</a>',
+            comments_url(author__id__exact=comment.author_id),
+            comment.author,
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """На SQLite текст ищется по индексу FTS5, а не через LIKE."""
+        terms = FtsSearchResults(search_term)
+        if not use_fts() or not terms.terms:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        matches = RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s AND rowid > 0',
+            [terms.match()],
+        )
+        return queryset.filter(pk__in=matches), False
+
+
+@admin.register(PurgeJob)
+class PurgeJobAdmin(admin.ModelAdmin):
+    """Ход фоновых удалений, только для просмотра."""
+    list_display = ('__str__', 'status', 'progress', 'created', 'finished')
+    list_filter = ('status', 'kind')
+
+    @admin.display(description='Прогресс')
+    def progress(self, job):
+        return f'{job.deleted} из {job.total}'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(BadWord)
+class BadWordAdmin(admin.ModelAdmin):
+    search_fields = ('word',)
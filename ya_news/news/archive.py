@@ -0,0 +1,240 @@
+"""
+Архив старых новостей.
+
+Команда archive_news переносит новости старше NEWS_RETENTION_DAYS дней
+вместе с комментариями в файлы NEWS_ARCHIVE_DIR и удаляет их из таблиц:
+рабочие таблицы и их индексы остаются небольшими.
+
+Файл архива — последовательность членов gzip, по одному на новость.
+Член содержит JSONL: первая строка — новость, остальные — её
+комментарии по времени. ArchivedNews хранит файл, смещение и длину
+члена, поэтому страница архивной новости читает только его. Закрытые
+файлы больше не меняются и копируются в резервную копию как есть.
+
+В член попадают комментарии с id не больше ArchivedNews.last_comment.
+Если после записи члена у новости появились комментарии, она целиком
+остаётся в таблицах, и следующий запуск записывает новый член: старые
+комментарии из прежнего члена и новые из таблицы. Прежний член
+остаётся в файле неиспользуемым.
+"""
+import gzip
+import io
+import json
+import os
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import ArchivedNews, Comment, News
+from .purge import delete_comments, purging
+
+SEGMENT_NAME = 'news-{:%Y%m%d-%H%M%S-%f}.jsonl.gz'
+
+
+def segment_path(name):
+    return Path(settings.NEWS_ARCHIVE_DIR) / name
+
+
+def dump(record):
+    return (json.dumps(record, ensure_ascii=False) + '\n').encode()
+
+
+class SegmentWriter:
+    """
+    Дописывает новости в текущий файл архива. Файл больше
+    NEWS_ARCHIVE_SEGMENT_SIZE закрывается, следующая новость
+    начинает новый.
+    """
+
+    def __init__(self):
+        self.file = None
+        self.name = None
+
+    def write(self, news, previous=None):
+        """
+        Записывает новость с комментариями и возвращает её ArchivedNews.
+        previous — прежняя запись архива новости: её комментарии
+        переносятся в новый член, из таблицы берутся более новые.
+        """
+        if self.file is None or (
+            self.file.tell() >= settings.NEWS_ARCHIVE_SEGMENT_SIZE
+        ):
+            self.open()
+        offset = self.file.tell()
+        since = previous.last_comment if previous is not None else 0
+        comments = Comment.objects.filter(news_id=news.pk, pk__gt=since)
+        # Граница снимается до чтения: комментарии, добавленные во время
+        # записи, в член не попадут и не будут удалены.
+        last_comment = comments.aggregate(last=Max('pk'))['last'] or since
+        comments = comments.filter(pk__lte=last_comment).order_by(
+            'created', 'pk'
+        ).values_list('pk', 'author__username', 'text', 'created')
+        with gzip.GzipFile(
+            filename='', mode='wb', fileobj=self.file
+        ) as member:
+            member.write(dump({
+                'id': news.pk,
+                'title': news.title,
+                'text': news.text,
+                'date': news.date.isoformat(),
+            }))
+            written = set()
+            if previous is not None:
+                records = read_member(previous)
+                next(records)
+                for record in records:
+                    member.write(dump(record))
+                    written.add(record['id'])
+            for pk, author, text, created in comments.iterator():
+                if pk in written:
+                    continue
+                member.write(dump({
+                    'id': pk,
+                    'author': author,
+                    'text': text,
+                    'created': created.isoformat(),
+                }))
+                written.add(pk)
+        return ArchivedNews(
+            news_id=news.pk,
+            title=news.title,
+            date=news.date,
+            comment_count=len(written),
+            segment=self.name,
+            offset=offset,
+            length=self.file.tell() - offset,
+            last_comment=last_comment,
+        )
+
+    def open(self):
+        self.close()
+        Path(settings.NEWS_ARCHIVE_DIR).mkdir(parents=True, exist_ok=True)
+        self.name = SEGMENT_NAME.format(timezone.now())
+        self.file = open(segment_path(self.name), 'xb')
+
+    def sync(self):
+        """Записанное попадает на диск до ссылок на него из базы."""
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+
+def archive_news(before, batch_size, progress=None):
+    """
+    Переносит в архив новости с датой раньше before, пачками
+    по batch_size новостей. Возвращает количество перенесённых.
+
+    Новость удаляется из таблиц только после того, как её член архива
+    записан на диск и сохранена ссылка на него. Если команда прервалась
+    между этими шагами, при следующем запуске уже заархивированная
+    новость просто удаляется, а если у неё появились комментарии —
+    записывается заново.
+    """
+    candidates = News.objects.filter(date__lt=before).order_by(
+        'date', 'pk'
+    ).only('pk', 'title', 'text', 'date')
+    writer = SegmentWriter()
+    archived = 0
+    # Новости, у которых после записи в архив появились комментарии:
+    # до следующего запуска они остаются в таблицах.
+    kept = set()
+    try:
+        while True:
+            batch = list(candidates.exclude(pk__in=kept)[:batch_size])
+            if not batch:
+                break
+            known = ArchivedNews.objects.in_bulk(
+                [news.pk for news in batch]
+            )
+            rows = [
+                writer.write(news, known.get(news.pk))
+                for news in batch if has_new_comments(news, known)
+            ]
+            writer.sync()
+            with transaction.atomic():
+                ArchivedNews.objects.filter(
+                    pk__in=[row.pk for row in rows]
+                ).delete()
+                ArchivedNews.objects.bulk_create(rows)
+            known.update((row.pk, row) for row in rows)
+            for news in batch:
+                if remove_news(news, known[news.pk], writer):
+                    archived += 1
+                else:
+                    kept.add(news.pk)
+            if progress is not None:
+                progress(archived)
+    finally:
+        writer.close()
+    return archived
+
+
+def has_new_comments(news, known):
+    """Нужно ли записать новость в архив: её нет там или есть новее."""
+    previous = known.get(news.pk)
+    return previous is None or Comment.objects.filter(
+        news_id=news.pk, pk__gt=previous.last_comment
+    ).exists()
+
+
+def remove_news(news, archived, writer):
+    """
+    Удаляет из таблиц заархивированные комментарии новости, а затем
+    саму новость. Если у новости есть комментарии новее архива, она
+    не трогается, и возвращается False.
+
+    Комментарии, добавленные, пока удалялись пачки, дописываются
+    в архив в одной транзакции с удалением новости: новость не может
+    остаться в таблицах без части комментариев.
+    """
+    if has_new_comments(news, {news.pk: archived}):
+        return False
+    with purging(news.pk):
+        delete_comments(Comment.objects.filter(
+            news_id=news.pk, pk__lte=archived.last_comment
+        ))
+    with transaction.atomic():
+        if has_new_comments(news, {news.pk: archived}):
+            # Удаление берёт блокировку записи: пока транзакция
+            # не завершится, новых комментариев не появится.
+            ArchivedNews.objects.filter(pk=news.pk).delete()
+            archived = writer.write(news, archived)
+            writer.sync()
+            archived.save(force_insert=True)
+        news.delete()
+    return True
+
+
+def read_member(archived):
+    """Записи члена архива: сначала новость, затем комментарии."""
+    with open(segment_path(archived.segment), 'rb') as segment:
+        segment.seek(archived.offset)
+        data = segment.read(archived.length)
+    with gzip.GzipFile(fileobj=io.BytesIO(data)) as member:
+        for line in member:
+            yield json.loads(line)
+
+
+def read_archived(archived, limit):
+    """
+    Новость и первые limit комментариев из архива. Распаковывается
+    только начало члена gzip этой новости.
+    """
+    records = read_member(archived)
+    news = next(records)
+    comments = list(islice(records, limit))
+    news['date'] = parse_date(news['date'])
+    for comment in comments:
+        comment['created'] = parse_datetime(comment['created'])
+    return news, comments
@@ -0,0 +1,111 @@
+import time
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_cache_control
+
+HOME_VERSION_KEY = 'news:version:home'
+NEWS_VERSION_KEY = 'news:version:{pk}'
+PAGE_KEY = 'news:page:{path}:{versions}'
+
+
+def get_cache():
+    return caches[settings.NEWS_PAGE_CACHE_ALIAS]
+
+
+def news_version_key(pk):
+    return NEWS_VERSION_KEY.format(pk=pk)
+
+
+def get_version(key):
+    """
+    Возвращает текущую версию ключа, создавая её при необходимости.
+
+    Версии — это метки времени в наносекундах: если ключ версии был
+    вытеснен из кэша, новая версия не совпадёт ни с одной из старых.
+    """
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(*keys):
+    """Сбрасывает страницы, закэшированные под этими версиями."""
+    get_cache().set_many(
+        {key: time.time_ns() for key in keys}, timeout=None
+    )
+
+
+def page_key(path, version_keys):
+    versions = '.'.join(str(get_version(key)) for key in version_keys)
+    return PAGE_KEY.format(
+        path=md5(path.encode()).hexdigest(), versions=versions
+    )
+
+
+def make_public(response):
+    """
+    Разрешает общим кэшам и CDN хранить страницу. Ответ не должен
+    зависеть от пользователя: никаких обращений к сессии и CSRF-токену.
+    """
+    patch_cache_control(
+        response, public=True, max_age=settings.NEWS_PAGE_MAX_AGE
+    )
+    return response
+
+
+class PageCacheMixin:
+    """
+    Кэширует страницы для анонимных пользователей.
+
+    Ключ страницы включает версии из get_version_keys(), поэтому для
+    сброса кэша достаточно сменить версию — см. news.signals.
+    По умолчанию страница сбрасывается вместе с главной.
+    Страница с shared_page = True одинакова для всех пользователей:
+    она кэшируется для всех и отдаётся с публичным Cache-Control,
+    а то, что зависит от пользователя, приходит отдельным запросом.
+    """
+    shared_page = False
+
+    def get_version_keys(self):
+        return (HOME_VERSION_KEY,)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['shared_page'] = self.shared_page
+        return context
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.shared_page:
+            response = self.cached_dispatch(request, *args, **kwargs)
+            if response.status_code == 200:
+                make_public(response)
+            return response
+        if request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+        return self.cached_dispatch(request, *args, **kwargs)
+
+    def cached_dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET':
+            return super().dispatch(request, *args, **kwargs)
+        cache = get_cache()
+        key = page_key(request.get_full_path(), self.get_version_keys())
+        response = cache.get(key)
+        if response is not None:
+            # Валидаторы условного GET считаются заново на каждый запрос.
+            for header in ('ETag', 'Last-Modified'):
+                if response.has_header(header):
+                    del response[header]
+            return response
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            response.add_post_render_callback(
+                lambda response: cache.set(
+                    key, response, settings.NEWS_PAGE_CACHE_TIMEOUT
+                )
+            )
+        return response
@@ -0,0 +1,338 @@
+"""
+Отложенная запись комментариев.
+
+В SQLite пишет только одно соединение за раз, и при наплыве
+комментариев каждая транзакция на POST ждёт блокировку. С настройкой
+COMMENT_INGESTION проверенные комментарии кладутся в очередь процесса,
+а фоновый поток записывает их пачками через bulk_create: когда
+набралось COMMENT_INGESTION_BATCH_SIZE или прошло
+COMMENT_INGESTION_FLUSH_INTERVAL секунд. Без интервала потока нет,
+и полную пачку записывает запрос, который её дополнил.
+
+Каждый процесс дописывает свою очередь в файл
+COMMENT_INGESTION_SPOOL.<pid>, поэтому очередь переживает падение
+процесса: первый комментарий в любом процессе дочитывает файлы
+завершившихся процессов. При обычном завершении процесса очередь
+записывается в базу.
+
+Комментарий, который нельзя записать — например, новость или автора
+уже удалили, — пропускается с записью в лог и не задерживает остальные.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.db import (IntegrityError, close_old_connections, connection,
+                       transaction)
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ya_common.metrics import process_alive
+
+from .models import Comment
+
+PENDING_SESSION_KEY = 'pending_comments'
+
+logger = logging.getLogger(__name__)
+
+
+class CommentBuffer:
+    """Очередь комментариев и фоновый поток, который её записывает."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._writer = None
+        self._spool = None
+        self._stopping = False
+        self._pid = None
+        self._at_exit = False
+
+    def put(self, comment):
+        """
+        Ставит комментарий в очередь на запись. Без фонового потока
+        полную пачку записывает сам запрос, который её дополнил.
+        """
+        with self._lock:
+            self._start()
+            self._pending.append(comment)
+            self._append_to_spool(comment)
+            full = len(self._pending) >= settings.COMMENT_INGESTION_BATCH_SIZE
+            if full:
+                self._ready.notify()
+            write_now = full and self._writer is None
+        if write_now:
+            self.flush()
+
+    def flush(self):
+        """
+        Записывает всё, что накопилось, одной транзакцией.
+        Возвращает количество записанных комментариев.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                write_comments(batch)
+                written = len(batch)
+            except IntegrityError:
+                written = self._write_one_by_one(batch)
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = batch
+                raise
+            with self._lock:
+                self._rewrite_spool()
+            return written
+
+    def _write_one_by_one(self, batch):
+        """
+        Пачка не записалась из-за одной из строк: пишем по одной,
+        а те, что снова нарушают ограничения базы, пропускаем.
+        """
+        written = 0
+        for index, comment in enumerate(batch):
+            try:
+                write_comments([comment])
+            except IntegrityError:
+                logger.exception(
+                    'Комментарий к новости %s от пользователя %s '
+                    'пропущен: %s',
+                    comment.news_id, comment.author_id, spool_line(comment),
+                )
+                continue
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = batch[index:]
+                raise
+            written += 1
+        return written
+
+    def stop(self):
+        """Останавливает фоновый поток и записывает остаток очереди."""
+        with self._lock:
+            self._stopping = True
+            self._ready.notify()
+            writer = self._writer
+        if writer is not None:
+            writer.join()
+        self.flush()
+
+    def _start(self):
+        """
+        При первом комментарии процесса открывает его файл очереди,
+        забирает очереди завершившихся процессов и запускает поток
+        записи. Без COMMENT_INGESTION_FLUSH_INTERVAL поток
+        не запускается: пачку записывает put, когда она наберётся,
+        а остаток — stop при завершении процесса.
+        """
+        if self._pid != os.getpid():
+            # После fork очередь, файл и поток остаются у родителя.
+            self._pid = os.getpid()
+            self._pending = []
+            self._spool = None
+            self._writer = None
+            if settings.COMMENT_INGESTION_SPOOL:
+                self._spool = open(
+                    spool_path(self._pid), 'a', encoding='utf-8'
+                )
+                self._claim_dead_spools()
+        if not self._at_exit:
+            self._at_exit = True
+            atexit.register(self.stop)
+        interval = settings.COMMENT_INGESTION_FLUSH_INTERVAL
+        if self._writer is not None or interval is None:
+            return
+        self._stopping = False
+        self._writer = threading.Thread(
+            target=self._run, args=(interval,),
+            name='comment-writer', daemon=True,
+        )
+        self._writer.start()
+
+    def _claim_dead_spools(self):
+        """
+        Переносит в свою очередь файлы завершившихся процессов.
+        Файл сначала переименовывается: из нескольких процессов,
+        запущенных одновременно, его заберёт только один.
+        """
+        base = Path(settings.COMMENT_INGESTION_SPOOL)
+        for path in base.parent.glob(f'{base.name}.*'):
+            try:
+                pid = int(path.suffix[1:])
+            except ValueError:
+                continue
+            if pid == self._pid or process_alive(pid):
+                continue
+            claimed = path.with_name(f'{path.name}.claimed-{self._pid}')
+            try:
+                path.rename(claimed)
+            except FileNotFoundError:
+                continue
+            comments = read_spool(claimed)
+            self._pending.extend(comments)
+            for comment in comments:
+                self._append_to_spool(comment)
+            claimed.unlink()
+
+    def _run(self, interval):
+        while True:
+            with self._lock:
+                if not self._stopping and len(self._pending) < (
+                    settings.COMMENT_INGESTION_BATCH_SIZE
+                ):
+                    self._ready.wait(interval)
+                stopping = self._stopping
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось записать комментарии')
+            finally:
+                close_old_connections()
+            if stopping:
+                with self._lock:
+                    self._writer = None
+                return
+
+    def _append_to_spool(self, comment):
+        if self._spool is None:
+            return
+        self._spool.write(spool_line(comment))
+        self._spool.flush()
+
+    def _rewrite_spool(self):
+        """В файле остаются только ещё не записанные комментарии."""
+        if self._spool is None:
+            return
+        path = spool_path(self._pid)
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as spool:
+            spool.writelines(spool_line(comment) for comment in self._pending)
+        self._spool.close()
+        os.replace(f'{path}.tmp', path)
+        self._spool = open(path, 'a', encoding='utf-8')
+
+
+def spool_path(pid):
+    return f'{settings.COMMENT_INGESTION_SPOOL}.{pid}'
+
+
+def spool_line(comment):
+    return json.dumps({
+        'news': comment.news_id,
+        'author': comment.author_id,
+        'text': comment.text,
+        'queued': comment.created.isoformat(),
+    }, ensure_ascii=False) + '\n'
+
+
+def read_spool(path):
+    """
+    Комментарии из файла очереди, которые ещё не попали в базу.
+
+    Процесс мог упасть между записью пачки и очисткой файла, поэтому
+    уже записанные комментарии того же автора с тем же текстом,
+    созданные не раньше постановки в очередь, пропускаются.
+    """
+    try:
+        with open(path, encoding='utf-8') as spool:
+            entries = [json.loads(line) for line in spool if line.strip()]
+    except FileNotFoundError:
+        return []
+    comments = []
+    for entry in entries:
+        queued = parse_datetime(entry['queued'])
+        if Comment.objects.filter(
+            news_id=entry['news'],
+            author_id=entry['author'],
+            text=entry['text'],
+            created__gte=queued,
+        ).exists():
+            continue
+        comments.append(Comment(
+            news_id=entry['news'],
+            author_id=entry['author'],
+            text=entry['text'],
+            created=queued,
+        ))
+    return comments
+
+
+def write_comments(comments):
+    """
+    Вставляет пачку комментариев и отправляет post_save для каждого,
+    чтобы счётчики, поисковый индекс и кэш страниц обновились так же,
+    как при обычном сохранении, в той же транзакции.
+
+    SQLite не возвращает id из bulk_create. Транзакция держит
+    блокировку записи с первого INSERT до COMMIT, поэтому пачка
+    занимает последние id таблицы, в порядке вставки.
+    """
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            pks = Comment.objects.order_by('-pk').values_list(
+                'pk', flat=True
+            )[:len(comments)]
+            for comment, pk in zip(comments, sorted(pks)):
+                comment.pk = pk
+        for comment in comments:
+            comment._state.adding = False
+            comment._state.db = connection.alias
+            post_save.send(
+                sender=Comment, instance=comment, created=True,
+                update_fields=None, raw=False, using=connection.alias,
+            )
+
+
+def remember_pending(request, comment):
+    """Запоминает комментарий в сессии автора до записи в базу."""
+    pending = request.session.get(PENDING_SESSION_KEY, [])
+    pending.append({
+        'news': comment.news_id,
+        'text': comment.text,
+        'queued': comment.created.isoformat(),
+    })
+    request.session[PENDING_SESSION_KEY] = pending
+
+
+def pop_written(request, news_id):
+    """
+    Ещё не записанные комментарии пользователя к новости.
+
+    Комментарии, которые уже есть в базе, убираются из сессии.
+    Пока очередь не пуста, это стоит одного запроса.
+    """
+    pending = request.session.get(PENDING_SESSION_KEY, [])
+    own = [entry for entry in pending if entry['news'] == news_id]
+    if not own:
+        return []
+    queued = min(parse_datetime(entry['queued']) for entry in own)
+    written = set(Comment.objects.filter(
+        news_id=news_id, author=request.user, created__gte=queued
+    ).values_list('text', flat=True))
+    waiting = [entry for entry in own if entry['text'] not in written]
+    if len(waiting) < len(own):
+        request.session[PENDING_SESSION_KEY] = [
+            entry for entry in pending
+            if entry['news'] != news_id or entry in waiting
+        ]
+    return waiting
+
+
+def queue_comment(request, comment):
+    """Ставит комментарий в очередь и запоминает его для автора."""
+    comment.created = timezone.now()
+    comment_buffer.put(comment)
+    remember_pending(request, comment)
+
+
+comment_buffer = CommentBuffer()
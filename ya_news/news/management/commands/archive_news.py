@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from news.archive import archive_news
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит старые новости с комментариями в файлы архива. '
+        'Рассчитана на запуск по расписанию.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.NEWS_RETENTION_DAYS,
+            help='Архивировать новости старше стольких дней.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Сколько новостей переносить за один проход.',
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.localdate() - timedelta(days=options['days'])
+        archived = archive_news(
+            before, options['batch_size'], progress=self.report
+        )
+        self.stdout.write(f'Перенесено в архив: {archived}')
+
+    def report(self, archived):
+        self.stdout.write(f'Перенесено {archived}')
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from news.models import News
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчик комментариев у новостей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько новостей обновлять в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        updated = 0
+        while True:
+            pks = list(
+                News.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                    'pk', flat=True
+                )[:batch_size]
+            )
+            if not pks:
+                break
+            updated += News.objects.filter(pk__in=pks).recount_comments()
+            last_pk = pks[-1]
+        self.stdout.write(f'Обновлено новостей: {updated}')
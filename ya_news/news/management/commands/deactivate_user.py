@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from news.models import PurgeJob
+from news.purge import run_job
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Отключает пользователя: он больше не может войти. С --purge '
+        'удаляет его комментарии пачками и затем самого пользователя.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--purge', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(
+                f'Пользователь {options["username"]} не найден.'
+            )
+        user.is_active = False
+        user.save(update_fields=('is_active',))
+        self.stdout.write(f'Пользователь {user} отключён.')
+        if not options['purge']:
+            return
+        job = PurgeJob.objects.create(
+            kind=PurgeJob.USER, target_id=user.pk, target=str(user)
+        )
+        run_job(job, progress=self.report)
+        self.stdout.write(f'Пользователь {user} удалён.')
+
+    def report(self, job):
+        self.stdout.write(
+            f'Удалено комментариев: {job.deleted} из {job.total}'
+        )
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from news.transfer import FORMATS, GZIP_SUFFIX, Exporter, guess_format
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает новости и комментарии в JSONL или CSV потоком, '
+        'не загружая таблицы в память.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='По умолчанию определяется по расширению файла.',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Сжимать файл. Включается и расширением .gz.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Сколько строк читать из базы и записывать за раз.',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Продолжить прерванную выгрузку с контрольной точки.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        exporter = Exporter(
+            path,
+            options['format'] or guess_format(path),
+            compress=options['gzip'] or path.endswith(GZIP_SUFFIX),
+            chunk_size=options['chunk_size'],
+        )
+        rows = exporter.run(resume=options['resume'])
+        self.stdout.write(f'Выгружено строк: {rows}')
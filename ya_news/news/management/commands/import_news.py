@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from news.search import rebuild_index
+from news.transfer import FORMATS, Importer, guess_format
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает новости и комментарии из файла export_news '
+        'пачками, сопоставляя авторов по username.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='По умолчанию определяется по расширению файла.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Сколько строк вставлять в одной транзакции.',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Продолжить прерванную загрузку с контрольной точки.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        importer = Importer(
+            path,
+            options['format'] or guess_format(path),
+            batch_size=options['batch_size'],
+        )
+        rows = importer.run(resume=options['resume'])
+        # bulk_create не отправляет сигналы, индекс строится целиком.
+        with transaction.atomic():
+            rebuild_index()
+        self.stdout.write(f'Загружено строк: {rows}')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from news.search import rebuild_index, use_fts
+
+
+class Command(BaseCommand):
+    help = 'Заново строит поисковый индекс новостей и комментариев.'
+
+    def handle(self, *args, **options):
+        if not use_fts():
+            self.stdout.write('Поисковый индекс нужен только на SQLite.')
+            return
+        with transaction.atomic():
+            rebuild_index()
+        self.stdout.write('Поисковый индекс перестроен.')
@@ -0,0 +1,8 @@
+from news.models import PurgeJob
+from news.purge import run_job
+from ya_common.purge import RunPurgeJobsCommand
+
+
+class Command(RunPurgeJobsCommand):
+    job_model = PurgeJob
+    run_job = staticmethod(run_job)
@@ -0,0 +1,120 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from news.models import Comment, News, make_excerpt
+from news.search import rebuild_index
+from ya_common.seeding import SeedCommand, batched, zipf_weights
+
+WORDS = (
+    'новость', 'город', 'проект', 'студент', 'робот', 'код', 'тест',
+    'рекурсия', 'блог', 'приложение', 'конкурс', 'победа', 'данные',
+    'сервер', 'запрос', 'команда', 'релиз', 'ошибка', 'практикум',
+    'интернет', 'мир', 'время', 'работа', 'идея', 'сеть', 'база',
+    'очередь', 'индекс', 'кэш', 'страница', 'комментарий', 'автор',
+)
+DAYS_OF_HISTORY = 3 * 365
+SENTENCE_POOL_SIZE = 10000
+# id новостей и комментариев набора начинаются с (seed + 1) * SEED_PK_BLOCK:
+# повторный запуск с тем же --seed узнаёт свой набор по этим id.
+SEED_PK_BLOCK = 10 ** 10
+
+
+def sentence(rng, min_words, max_words):
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return ' '.join(words).capitalize() + '.'
+
+
+def sentence_pool(rng, min_words, max_words):
+    """Заранее готовим фразы: генерировать текст на каждую строку долго."""
+    return [
+        sentence(rng, min_words, max_words)
+        for _ in range(SENTENCE_POOL_SIZE)
+    ]
+
+
+class Command(SeedCommand):
+    help = (
+        'Заполняет базу большим набором новостей, комментариев '
+        'и пользователей. При одинаковом --seed данные одинаковы, '
+        'повторный запуск ничего не дублирует.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--news', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=1000000)
+
+    def handle(self, *args, **options):
+        """
+        Набор создаётся одной транзакцией: если есть его последняя
+        новость, он создан целиком.
+        """
+        self.prepare(options)
+        first_pk = (options['seed'] + 1) * SEED_PK_BLOCK
+        with transaction.atomic():
+            if options['news'] and News.objects.filter(
+                pk=first_pk + options['news'] - 1
+            ).exists():
+                self.stdout.write('Набор с таким --seed уже создан')
+                return
+            user_ids = self.create_users(options['users'], options['seed'])
+            news_ids = self.create_news(options['news'], first_pk)
+            self.create_comments(
+                options['comments'], first_pk, news_ids, user_ids
+            )
+            # Вставка идёт в обход сигналов, индекс строится целиком.
+            rebuild_index()
+        self.stdout.write(
+            f'Создано: пользователей {len(user_ids)}, новостей '
+            f'{len(news_ids)}, комментариев {options["comments"]}'
+        )
+
+    def create_news(self, count, first_pk):
+        today = timezone.localdate()
+        self.insert(
+            News,
+            ('id', 'title', 'text', 'excerpt', 'date', 'comment_count'),
+            (self.make_news(pk, today)
+             for pk in range(first_pk, first_pk + count)),
+        )
+        return list(range(first_pk, first_pk + count))
+
+    def make_news(self, pk, today):
+        title = sentence(self.rng, 2, 5)[:50]
+        text = ' '.join(
+            sentence(self.rng, 5, 15) for _ in range(self.rng.randint(1, 20))
+        )
+        date = today - timezone.timedelta(
+            days=self.rng.randrange(DAYS_OF_HISTORY)
+        )
+        return (
+            pk, title, text, make_excerpt(text),
+            connection.ops.adapt_datefield_value(date), 0,
+        )
+
+    def create_comments(self, count, first_pk, news_ids, user_ids):
+        """
+        Комментарии распределены по закону Ципфа: у немногих новостей
+        их тысячи, у большинства — единицы. Так же распределены авторы.
+        """
+        if not news_ids or not user_ids:
+            return
+        news_weights = zipf_weights(len(news_ids))
+        user_weights = zipf_weights(len(user_ids))
+        popular_news = self.rng.sample(news_ids, len(news_ids))
+        active_users = self.rng.sample(user_ids, len(user_ids))
+        texts = sentence_pool(self.rng, 3, 30)
+        created = connection.ops.adapt_datetimefield_value(timezone.now())
+        self.insert(
+            Comment,
+            ('id', 'news', 'author', 'text', 'created'),
+            ((pk, news_id, author_id, text, created)
+             for pk, news_id, author_id, text in zip(
+                 range(first_pk, first_pk + count),
+                 self.choices(popular_news, news_weights, count),
+                 self.choices(active_users, user_weights, count),
+                 self.choices(texts, None, count),
+            )),
+        )
+        for batch in batched(news_ids, self.batch_size):
+            News.objects.filter(pk__in=batch).recount_comments()
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+CREATE_SEARCH_TABLE = (
+    'CREATE VIRTUAL TABLE news_search USING fts5('
+    "news_id UNINDEXED, title, text, tokenize='unicode61 remove_diacritics 2')"
+)
+FILL_SEARCH_TABLE = (
+    'INSERT INTO news_search (rowid, news_id, title, text) '
+    'SELECT -id, id, title, text FROM news_news',
+    'INSERT INTO news_search (rowid, news_id, title, text) '
+    "SELECT id, news_id, '', text FROM news_comment",
+)
+
+
+def create_search_table(apps, schema_editor):
+    """Поисковый индекс FTS5 есть только на SQLite."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SEARCH_TABLE)
+    for sql in FILL_SEARCH_TABLE:
+        schema_editor.execute(sql)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE news_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0004_badword'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
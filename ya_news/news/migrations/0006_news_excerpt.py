@@ -0,0 +1,41 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:36
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+# Копия news.models.EXCERPT_WORDS на момент миграции.
+EXCERPT_WORDS = 15
+BATCH_SIZE = 1000
+
+
+def fill_excerpts(apps, schema_editor):
+    """Заполняет анонсы пачками, не загружая все новости сразу."""
+    News = apps.get_model('news', 'News')
+    batch = []
+    for news in News.objects.only('pk', 'text').iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        news.excerpt = Truncator(news.text).words(
+            EXCERPT_WORDS, truncate=' …'
+        )
+        batch.append(news)
+        if len(batch) == BATCH_SIZE:
+            News.objects.bulk_update(batch, ['excerpt'])
+            batch = []
+    News.objects.bulk_update(batch, ['excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0005_news_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='news',
+            name='excerpt',
+            field=models.TextField(default='', editable=False, verbose_name='Анонс'),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0006_news_excerpt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurgeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('news', 'Новость'), ('user', 'Пользователь')], max_length=10, verbose_name='Что удаляется')),
+                ('target_id', models.PositiveBigIntegerField(verbose_name='id объекта')),
+                ('target', models.CharField(blank=True, max_length=150, verbose_name='Объект')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Состояние')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Комментариев всего')),
+                ('deleted', models.PositiveIntegerField(default=0, verbose_name='Удалено комментариев')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+            ],
+            options={
+                'verbose_name': 'Фоновое удаление',
+                'verbose_name_plural': 'Фоновые удаления',
+                'ordering': ('-pk',),
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0007_purgejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNews',
+            fields=[
+                ('news_id', models.PositiveBigIntegerField(primary_key=True, serialize=False, verbose_name='id новости')),
+                ('title', models.CharField(max_length=50, verbose_name='Заголовок')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('comment_count', models.PositiveIntegerField(verbose_name='Количество комментариев')),
+                ('segment', models.CharField(max_length=100, verbose_name='Файл архива')),
+                ('offset', models.PositiveBigIntegerField(verbose_name='Смещение в файле')),
+                ('length', models.PositiveIntegerField(verbose_name='Длина в байтах')),
+                ('archived', models.DateTimeField(auto_now_add=True, verbose_name='Перенесена в архив')),
+            ],
+            options={
+                'verbose_name': 'Архивная новость',
+                'verbose_name_plural': 'Архивные новости',
+                'ordering': ('-date',),
+            },
+        ),
+    ]
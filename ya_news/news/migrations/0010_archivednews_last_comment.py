@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0009_purgejob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivednews',
+            name='last_comment',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='id последнего комментария в архиве'),
+        ),
+    ]
@@ -2,21 +2,80 @@ from datetime import datetime
 
 from django.conf import settings
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.text import Truncator
+
+from ya_common.purge import PurgeJobBase
+
+# Анонс на главной — первые слова текста, как у truncatewords.
+EXCERPT_WORDS = 15
+
+
+def make_excerpt(text):
+    return Truncator(text).words(EXCERPT_WORDS, truncate=' …')
+
+
+class NewsQuerySet(models.QuerySet):
+
+    def recount_comments(self):
+        """Пересчитывает comment_count по фактическим комментариям."""
+        comments = Comment.objects.filter(
+            news=OuterRef('pk')
+        ).order_by().values('news').annotate(total=Count('pk'))
+        return self.update(comment_count=Coalesce(
+            Subquery(comments.values('total')), 0
+        ))
 
 
 class News(models.Model):
     title = models.CharField(max_length=50)
     text = models.TextField()
+    excerpt = models.TextField('Анонс', editable=False, default='')
     date = models.DateField(default=datetime.today)
+    comment_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = NewsQuerySet.as_manager()
 
     class Meta:
         ordering = ('-date',)
+        indexes = (
+            models.Index(fields=('date',), name='news_date_idx'),
+        )
         verbose_name_plural = 'Новости'
         verbose_name = 'Новость'
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, update_fields=None, **kwargs):
+        """
+        Анонс пересчитывается вместе с текстом.
+
+        comment_count меняют только запросы F() из news.signals, поэтому
+        обычное сохранение существующей новости его не записывает:
+        иначе правка в админке затёрла бы параллельные изменения
+        счётчика значением, прочитанным при загрузке формы.
+        """
+        self.excerpt = make_excerpt(self.text)
+        if update_fields is None and not (
+            self._state.adding or kwargs.get('force_insert')
+        ):
+            deferred = self.get_deferred_fields()
+            update_fields = {
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.attname != 'comment_count'
+            }
+        if update_fields is not None and 'text' in update_fields:
+            update_fields = {*update_fields, 'excerpt'}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
 
 class Comment(models.Model):
     news = models.ForeignKey(
@@ -32,6 +91,77 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('created',)
+        indexes = (
+            models.Index(
+                fields=('news', 'created'), name='comment_news_created_idx'
+            ),
+            models.Index(
+                fields=('author', 'created'),
+                name='comment_author_created_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text[:50]
+
+
+class BadWord(models.Model):
+    word = models.CharField('Слово', max_length=100, unique=True)
+
+    class Meta:
+        ordering = ('word',)
+        verbose_name_plural = 'Запрещённые слова'
+        verbose_name = 'Запрещённое слово'
+
+    def __str__(self):
+        return self.word
+
+
+class PurgeJob(PurgeJobBase):
+    """
+    Удаление новости или пользователя вместе с комментариями
+    небольшими пачками в фоне, см. news.purge.
+    """
+    NEWS = 'news'
+    USER = 'user'
+    KINDS = (
+        (NEWS, 'Новость'),
+        (USER, 'Пользователь'),
+    )
+
+    kind = models.CharField('Что удаляется', max_length=10, choices=KINDS)
+    total = models.PositiveIntegerField('Комментариев всего', default=0)
+    deleted = models.PositiveIntegerField('Удалено комментариев', default=0)
+
+    class Meta(PurgeJobBase.Meta):
+        verbose_name_plural = 'Фоновые удаления'
+        verbose_name = 'Фоновое удаление'
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.target or self.target_id}'
+
+
+class ArchivedNews(models.Model):
+    """
+    Новость, перенесённая в архив командой archive_news: где в файлах
+    архива лежат она и её комментарии, см. news.archive.
+    """
+    news_id = models.PositiveBigIntegerField('id новости', primary_key=True)
+    title = models.CharField('Заголовок', max_length=50)
+    date = models.DateField('Дата')
+    comment_count = models.PositiveIntegerField('Количество комментариев')
+    segment = models.CharField('Файл архива', max_length=100)
+    offset = models.PositiveBigIntegerField('Смещение в файле')
+    length = models.PositiveIntegerField('Длина в байтах')
+    last_comment = models.PositiveBigIntegerField(
+        'id последнего комментария в архиве', default=0
+    )
+    archived = models.DateTimeField('Перенесена в архив', auto_now_add=True)
+
+    class Meta:
+        ordering = ('-date',)
+        verbose_name_plural = 'Архивные новости'
+        verbose_name = 'Архивная новость'
+
+    def __str__(self):
+        return self.title
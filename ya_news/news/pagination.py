@@ -0,0 +1,57 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.conf import settings
+from django.core.exceptions import BadRequest
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment
+
+CURSOR_SEPARATOR = '|'
+INVALID_CURSOR = 'Некорректный курсор страницы комментариев.'
+
+
+def encode_cursor(comment):
+    """Курсор — это пара (created, id) последнего показанного комментария."""
+    raw = f'{comment.created.isoformat()}{CURSOR_SEPARATOR}{comment.pk}'
+    return urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор, при любой ошибке отвечаем 400."""
+    padding = '=' * (-len(cursor) % 4)
+    try:
+        raw = urlsafe_b64decode(cursor + padding).decode()
+        created, pk = raw.rsplit(CURSOR_SEPARATOR, 1)
+        created = parse_datetime(created)
+        pk = int(pk)
+    except (BinasciiError, UnicodeDecodeError, ValueError):
+        raise BadRequest(INVALID_CURSOR)
+    if created is None:
+        raise BadRequest(INVALID_CURSOR)
+    return created, pk
+
+
+def get_comments_page(news, cursor=None):
+    """
+    Возвращает страницу комментариев новости и курсор следующей страницы.
+
+    Страницы выбираются по ключу (created, id), а не через OFFSET,
+    поэтому стоимость страницы не зависит от её глубины.
+    """
+    page_size = settings.COMMENTS_COUNT_ON_DETAIL_PAGE
+    comments = Comment.objects.filter(news=news).select_related(
+        'author'
+    ).order_by('created', 'pk')
+    if cursor is not None:
+        created, pk = decode_cursor(cursor)
+        comments = comments.filter(created__gte=created).filter(
+            Q(created__gt=created) | Q(pk__gt=pk)
+        )
+    page = list(comments[:page_size + 1])
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor(page[-1])
+    return page, next_cursor
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from django.conf import settings
+
+
+class WordMatcher:
+    """
+    Автомат Ахо — Корасик для поиска запрещённых слов.
+
+    Словарь компилируется один раз, а текст просматривается за один
+    проход, независимо от количества слов в словаре.
+    """
+
+    def __init__(self, words):
+        self._goto = [{}]
+        self._fail = [0]
+        self._found = [None]
+        for word in words:
+            self._add(word.lower())
+        self._link()
+
+    def _add(self, word):
+        if not word:
+            return
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._found.append(None)
+                self._goto[state][char] = next_state
+            state = next_state
+        self._found[state] = word
+
+    def _link(self):
+        """Строит суффиксные ссылки обходом бора в ширину."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                if self._found[next_state] is None:
+                    self._found[next_state] = self._found[
+                        self._fail[next_state]
+                    ]
+
+    def find(self, text):
+        """Возвращает первое найденное в тексте слово или None."""
+        goto, fail, found = self._goto, self._fail, self._found
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if found[state] is not None:
+                return found[state]
+        return None
+
+
+class BadWords:
+    """
+    Словарь запрещённых слов: встроенный список, файл и таблица BadWord.
+
+    Автомат пересобирается целиком и подменяется одной операцией
+    присваивания, поэтому проверки в других потоках всегда видят
+    согласованный словарь.
+    """
+
+    def __init__(self, words):
+        self._words = tuple(words)
+        self._loaded = None
+        self._matcher = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def matcher(self):
+        interval = settings.BAD_WORDS_RELOAD_INTERVAL
+        if self._matcher is None or (
+                interval is not None
+                and time.monotonic() - self._checked_at > interval
+        ):
+            self.rebuild()
+        return self._matcher
+
+    def load(self):
+        """Собирает слова из всех источников."""
+        from .models import BadWord
+
+        words = {word.lower() for word in self._words}
+        if settings.BAD_WORDS_FILE:
+            lines = Path(settings.BAD_WORDS_FILE).read_text(
+                encoding='utf-8'
+            ).splitlines()
+            words.update(line.strip().lower() for line in lines)
+        words.update(
+            word.lower()
+            for word in BadWord.objects.values_list('word', flat=True)
+        )
+        words.discard('')
+        return frozenset(words)
+
+    def rebuild(self):
+        """Перечитывает словарь и пересобирает автомат, если он изменился."""
+        with self._lock:
+            words = self.load()
+            if words != self._loaded:
+                self._matcher = WordMatcher(words)
+                self._loaded = words
+            self._checked_at = time.monotonic()
+
+    def find(self, text):
+        return self.matcher.find(text.lower())
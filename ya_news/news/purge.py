@@ -0,0 +1,125 @@
+"""
+Удаление новостей и пользователей вместе с комментариями.
+
+Сборщик удаления Django загружает все зависимые строки в память
+и удаляет их одной транзакцией, которая всё это время держит
+блокировку записи SQLite. Задание PurgeJob удаляет комментарии пачками
+по PURGE_BATCH_SIZE: каждая пачка — короткая транзакция с обычными
+сигналами, поэтому счётчики, поисковый индекс и кэш страниц остаются
+согласованными. Сам объект удаляется последним, когда зависимых
+строк уже нет. Пачки, захват задания и прогресс — в ya_common.purge.
+
+Если удаляется сама новость, счётчик её комментариев и кэш её страниц
+на каждый комментарий не обновляются: внутри purging() эти сигналы
+пропускаются, остаётся только очистка поискового индекса. Страницы
+сбрасывает удаление самой новости.
+
+Задания выполняет один фоновый поток процесса, и удаления не спорят
+за блокировку друг с другом. Прерванное задание продолжает команда
+run_purge_jobs.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from ya_common import purge
+
+from .models import Comment, News, PurgeJob
+
+User = get_user_model()
+
+# Модель объекта и поле комментария, которое на него ссылается.
+TARGETS = {
+    PurgeJob.NEWS: (News, 'news_id'),
+    PurgeJob.USER: (User, 'author_id'),
+}
+
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='purge')
+logger = logging.getLogger(__name__)
+# id новости, комментарии которой сейчас удаляются вместе с ней.
+_purging = threading.local()
+
+
+@contextmanager
+def purging(news_id):
+    """Комментарии новости удаляются вместе с ней, см. is_purging."""
+    previous = getattr(_purging, 'news_id', None)
+    _purging.news_id = news_id
+    try:
+        yield
+    finally:
+        _purging.news_id = previous
+
+
+def is_purging(news_id):
+    """
+    Удаляется ли новость в этом потоке: тогда сигналы комментариев
+    не обновляют её счётчик и кэш страниц.
+    """
+    return getattr(_purging, 'news_id', None) == news_id
+
+
+def enqueue(kind, target):
+    """
+    Создаёт задание на удаление объекта. Задание запускается после
+    фиксации текущей транзакции.
+    """
+    job = PurgeJob.objects.create(
+        kind=kind, target_id=target.pk, target=str(target)[:150]
+    )
+    transaction.on_commit(lambda: submit(job.pk))
+    return job
+
+
+def submit(pk):
+    if settings.PURGE_IN_BACKGROUND:
+        executor.submit(run_in_background, pk)
+    else:
+        run_job(PurgeJob.objects.get(pk=pk))
+
+
+def run_in_background(pk):
+    try:
+        run_job(PurgeJob.objects.get(pk=pk))
+    except Exception:
+        logger.exception('Не удалось выполнить фоновое удаление %s', pk)
+    finally:
+        connection.close()
+
+
+def delete_comments(comments, on_batch=None):
+    """
+    Удаляет комментарии пачками по PURGE_BATCH_SIZE, см.
+    ya_common.purge.delete_in_batches.
+
+    Пачка выбирается по индексу (news, created) или (author, created),
+    а не диапазоном id: комментарии разных новостей и авторов в id
+    перемешаны.
+    """
+    purge.delete_in_batches(comments, settings.PURGE_BATCH_SIZE, on_batch)
+
+
+def run_job(job, progress=None):
+    """
+    Удаляет комментарии объекта пачками, затем сам объект.
+    progress вызывается с заданием после каждой пачки. Возвращает
+    None, если задание выполняет другой процесс.
+    """
+    model, field = TARGETS[job.kind]
+    if job.kind == PurgeJob.NEWS:
+        context = purging(job.target_id)
+    else:
+        context = nullcontext()
+    with context:
+        return purge.run_job(
+            job,
+            Comment.objects.filter(**{field: job.target_id}),
+            model.objects.filter(pk=job.target_id),
+            settings.PURGE_BATCH_SIZE,
+            progress,
+        )
@@ -2,15 +2,25 @@ import datetime
 import pytest
 
 from django.conf import settings
+from django.core.cache import cache
 from django.urls import reverse
 from django.utils import timezone
 
-from news.forms import BAD_WORDS
+from news.forms import BAD_WORDS, bad_words
 from news.models import Comment, News
 
 CREATE_MANY_COMMENTS_COUNT = 5
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    Фикстура очищает кэш перед каждым тестом, чтобы страницы
+    не переходили из теста в тест
+    """
+    cache.clear()
+
+
 @pytest.fixture
 def author(django_user_model):
     """
@@ -37,6 +47,15 @@ def bad_words_data():
     return {'text': f'Какой-то текст, {BAD_WORDS[0]}, еще текст'}
 
 
+@pytest.fixture
+def loaded_bad_words(db):
+    """
+    Фикстура заранее собирает словарь запрещённых слов,
+    чтобы его загрузка не попадала в подсчёт запросов
+    """
+    bad_words.rebuild()
+
+
 @pytest.fixture
 def news():
     """
@@ -62,6 +81,14 @@ def comment(news, author):
     return comment
 
 
+@pytest.fixture
+def other_news():
+    """
+    Фикстура создает и возвращает ещё одну новость
+    """
+    return News.objects.create(title='Другая новость', text='Текст')
+
+
 @pytest.fixture
 def many_news():
     """
@@ -136,6 +163,14 @@ def news_home_url(news):
     return reverse('news:home')
 
 
+@pytest.fixture
+def news_search_url(news):
+    """
+     Фикстура возвращает ссылку из 'news:search'
+     """
+    return reverse('news:search')
+
+
 @pytest.fixture
 def news_detail_url(news):
     """
@@ -144,6 +179,14 @@ def news_detail_url(news):
     return reverse('news:detail', args=(news.pk,))
 
 
+@pytest.fixture
+def news_viewer_url(news):
+    """
+    Фикстура возвращает ссылку из 'news:viewer'
+    """
+    return reverse('news:viewer', args=(news.pk,))
+
+
 @pytest.fixture
 def news_edit_url(comment):
     """
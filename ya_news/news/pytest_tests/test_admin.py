@@ -0,0 +1,132 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from news.admin import NEWS_DELETED, PURGE_QUEUED
+from news.models import Comment, News, PurgeJob
+
+pytestmark = pytest.mark.django_db
+
+NEWS_CHANGELIST = reverse('admin:news_news_changelist')
+COMMENT_CHANGELIST = reverse('admin:news_comment_changelist')
+
+
+def add_comments(news, author, count):
+    for index in range(count):
+        Comment.objects.create(
+            news=news, author=author, text=f'Комментарий {index}'
+        )
+
+
+def messages(response):
+    return [str(message) for message in response.context['messages']]
+
+
+def queries(client, url):
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(url)
+    assert response.status_code == 200
+    return response, len(captured.captured_queries)
+
+
+def test_news_change_page_caps_inline(admin_client, news, author, settings):
+    """
+    На странице новости редактируются только последние комментарии,
+    количество запросов не зависит от числа комментариев
+    """
+    settings.ADMIN_INLINE_COMMENTS = 3
+    url = reverse('admin:news_news_change', args=(news.pk,))
+    add_comments(news, author, 2)
+    _, few = queries(admin_client, url)
+    add_comments(news, author, 10)
+
+    response, many = queries(admin_client, url)
+
+    formset = response.context['inline_admin_formsets'][0].formset
+    assert [form.instance.text for form in formset.forms] == [
+        'Комментарий 9', 'Комментарий 8', 'Комментарий 7'
+    ]
+    assert many == few
+
+
+def test_comment_changelist_query_count(admin_client, news, other_news,
+                                        author):
+    """
+    Список комментариев загружает новости и авторов одним запросом
+    и показывает счётчик комментариев в списке новостей
+    """
+    add_comments(news, author, 2)
+    _, few = queries(admin_client, COMMENT_CHANGELIST)
+    add_comments(other_news, author, 10)
+
+    _, many = queries(admin_client, COMMENT_CHANGELIST)
+    response, _ = queries(
+        admin_client, f'{COMMENT_CHANGELIST}?news__id__exact={news.pk}'
+    )
+
+    assert many == few
+    assert response.context['cl'].result_count == 2
+    news_list = admin_client.get(NEWS_CHANGELIST).context['cl'].result_list
+    assert {item.comment_count for item in news_list} == {2, 10}
+
+
+def test_comment_search_uses_full_text_index(admin_client, news, author):
+    """Поиск в списке комментариев находит слова через FTS5"""
+    add_comments(news, author, 3)
+    Comment.objects.create(news=news, author=author, text='Роботы пришли')
+
+    response = admin_client.get(COMMENT_CHANGELIST, {'q': 'роботы'})
+
+    assert [
+        comment.text for comment in response.context['cl'].result_list
+    ] == ['Роботы пришли']
+
+
+def test_large_news_deleted_in_background(
+        admin_client, news, author, settings,
+        django_capture_on_commit_callbacks):
+    """
+    Новость с большим числом комментариев удаляется фоновым заданием,
+    страница подтверждения не перечисляет комментарии
+    """
+    settings.PURGE_THRESHOLD = 3
+    settings.PURGE_IN_BACKGROUND = False
+    add_comments(news, author, 3)
+    url = reverse('admin:news_news_delete', args=(news.pk,))
+
+    response = admin_client.get(url)
+    assert response.context['deleted_objects'] == [str(news)]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = admin_client.post(url, {'post': 'yes'}, follow=True)
+
+    assert messages(response) == [PURGE_QUEUED.format(news)]
+    job = PurgeJob.objects.get()
+    assert (job.kind, job.status, job.deleted) == (
+        PurgeJob.NEWS, PurgeJob.DONE, 3
+    )
+    assert not News.objects.exists()
+    assert not Comment.objects.exists()
+
+
+def test_bulk_delete_counts_only_deleted_news(
+        admin_client, news, other_news, author, settings):
+    """
+    Действие удаления не считает удалёнными новости,
+    отданные фоновому заданию
+    """
+    settings.PURGE_THRESHOLD = 3
+    add_comments(news, author, 3)
+
+    response = admin_client.post(NEWS_CHANGELIST, {
+        'action': 'delete_selected',
+        '_selected_action': [news.pk, other_news.pk],
+        'post': 'yes',
+    }, follow=True)
+
+    assert messages(response) == [
+        PURGE_QUEUED.format(news), NEWS_DELETED.format(1)
+    ]
+    assert PurgeJob.objects.get().target_id == news.pk
+    assert not News.objects.filter(pk=other_news.pk).exists()
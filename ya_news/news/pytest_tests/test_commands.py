@@ -0,0 +1,395 @@
+import gzip
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, F
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from news import archive
+from news.models import ArchivedNews, Comment, News, PurgeJob
+from news.search import search
+from news.transfer import Exporter, Importer, checkpoint_path
+
+pytestmark = pytest.mark.django_db
+
+
+def test_backfill_comment_count(news, author):
+    """
+    Команда backfill_comment_count восстанавливает счётчик комментариев
+    после массовой вставки в обход сигналов
+    """
+    Comment.objects.bulk_create(
+        Comment(news=news, author=author, text=f'Текст {index}')
+        for index in range(3)
+    )
+    news.refresh_from_db()
+    assert news.comment_count == 0
+
+    call_command('backfill_comment_count', batch_size=1)
+    news.refresh_from_db()
+
+    assert news.comment_count == 3
+
+
+def test_seed_news(django_user_model):
+    """
+    Команда seed_news создаёт заданное количество строк с анонсами,
+    а счётчики комментариев новостей совпадают с фактическими.
+    Повторный запуск с тем же --seed ничего не добавляет
+    """
+    for _ in range(2):
+        call_command('seed_news', users=5, news=20, comments=300,
+                     batch_size=7, stdout=StringIO())
+
+    assert django_user_model.objects.count() == 5
+    assert News.objects.count() == 20
+    assert Comment.objects.count() == 300
+    assert not News.objects.annotate(
+        total=Count('comment')
+    ).exclude(comment_count=F('total')).exists()
+    assert not News.objects.filter(excerpt='').exists()
+
+
+def test_rebuild_search_index(news, author):
+    """
+    Команда rebuild_search_index добавляет в индекс строки,
+    вставленные в обход сигналов
+    """
+    Comment.objects.bulk_create(
+        Comment(news=news, author=author, text=f'Робот {index}')
+        for index in range(3)
+    )
+    assert search('робот').count() == 0
+
+    call_command('rebuild_search_index')
+
+    assert search('робот').count() == 3
+
+
+@pytest.fixture
+def exported_rows(news, author, other_news):
+    """
+    Фикстура создаёт комментарии с переводами строк и кавычками
+    и возвращает выгружаемые строки обеих таблиц
+    """
+    for index in range(3):
+        Comment.objects.create(
+            news=news, author=author, text=f'Строка {index}\n"в кавычках"'
+        )
+    return current_rows()
+
+
+def current_rows():
+    return (
+        list(News.objects.order_by('pk').values_list(
+            'pk', 'title', 'text', 'excerpt', 'date', 'comment_count'
+        )),
+        list(Comment.objects.order_by('pk').values_list(
+            'pk', 'news_id', 'author__username', 'text', 'created'
+        )),
+    )
+
+
+@pytest.mark.parametrize('name', ('dump.jsonl', 'dump.csv.gz'))
+def test_export_import_round_trip(exported_rows, author, tmp_path, name):
+    """
+    Выгрузка и загрузка в пустую базу сохраняют строки и даты,
+    автор сопоставляется по username, поиск и счётчики восстановлены
+    """
+    path = str(tmp_path / name)
+    call_command('export_news', path, chunk_size=2, stdout=StringIO())
+    News.objects.all().delete()
+    author.delete()
+
+    call_command('import_news', path, batch_size=2, stdout=StringIO())
+
+    assert current_rows() == exported_rows
+    assert search('кавычках').count() == 3
+
+
+def test_export_resumes_from_checkpoint(exported_rows, tmp_path):
+    """
+    Прерванная выгрузка продолжается с контрольной точки,
+    недописанный хвост файла отбрасывается
+    """
+    path = str(tmp_path / 'dump.jsonl')
+    Exporter(path, 'jsonl', chunk_size=1).run()
+    with open(path, 'rb') as dump:
+        expected = dump.read()
+    write = Exporter.write
+    calls = []
+
+    def interrupted(self, output, records):
+        calls.append(records)
+        if len(calls) == 3:
+            output.write(b'{"model": "comm')
+            raise OSError
+        write(self, output, records)
+
+    with mock.patch.object(Exporter, 'write', interrupted):
+        with pytest.raises(OSError):
+            Exporter(path, 'jsonl', chunk_size=1).run()
+
+    rows = Exporter(path, 'jsonl', chunk_size=1).run(resume=True)
+
+    with open(path, 'rb') as dump:
+        assert dump.read() == expected
+    assert rows == 5
+    assert not (tmp_path / 'dump.jsonl.checkpoint').exists()
+
+
+def test_import_resumes_from_checkpoint(exported_rows, author, tmp_path):
+    """
+    Прерванная загрузка продолжается с контрольной точки
+    и пересчитывает счётчики всех затронутых новостей
+    """
+    path = str(tmp_path / 'dump.jsonl')
+    Exporter(path, 'jsonl').run()
+    News.objects.all().delete()
+    insert = Importer.insert
+    calls = []
+
+    def interrupted(self, records):
+        calls.append(records)
+        if len(calls) == 2:
+            raise OSError
+        insert(self, records)
+
+    with mock.patch.object(Importer, 'insert', interrupted):
+        with pytest.raises(OSError):
+            Importer(path, 'jsonl', batch_size=2).run()
+    with open(checkpoint_path(path)) as checkpoint:
+        assert '"rows": 2' in checkpoint.read()
+
+    Importer(path, 'jsonl', batch_size=2).run(resume=True)
+
+    assert current_rows() == exported_rows
+
+
+def test_deactivate_user_blocks_login(author, author_client, news_edit_url):
+    """Отключённый пользователь больше не авторизован"""
+    call_command('deactivate_user', author.username, stdout=StringIO())
+
+    response = author_client.get(news_edit_url)
+
+    assert response.status_code == 302
+    assert Comment.objects.exists()
+
+
+def test_deactivate_user_purges_comments(author, news, other_news, settings):
+    """
+    Комментарии пользователя удаляются пачками вместе с поисковым
+    индексом и счётчиками, затем удаляется сам пользователь
+    """
+    settings.PURGE_BATCH_SIZE = 2
+    for target in (news, news, other_news):
+        Comment.objects.create(news=target, author=author, text='Робот')
+    stdout = StringIO()
+
+    call_command('deactivate_user', author.username, purge=True,
+                 stdout=stdout)
+
+    assert not Comment.objects.exists()
+    assert set(News.objects.values_list('comment_count', flat=True)) == {0}
+    assert search('робот').count() == 0
+    assert not type(author).objects.filter(pk=author.pk).exists()
+    job = PurgeJob.objects.get()
+    assert (job.status, job.deleted, job.total) == (PurgeJob.DONE, 3, 3)
+    assert 'Удалено комментариев: 2 из 3' in stdout.getvalue()
+
+
+def test_run_purge_jobs_resumes_interrupted(news, author, settings):
+    """
+    Прерванное задание продолжается с оставшихся комментариев
+    и учитывает уже удалённые
+    """
+    settings.PURGE_BATCH_SIZE = 2
+    for index in range(3):
+        Comment.objects.create(news=news, author=author, text=f'{index}')
+    job = PurgeJob.objects.create(
+        kind=PurgeJob.NEWS, target_id=news.pk,
+        status=PurgeJob.RUNNING, deleted=2,
+    )
+
+    call_command('run_purge_jobs', stdout=StringIO())
+
+    job.refresh_from_db()
+    assert (job.status, job.deleted, job.total) == (PurgeJob.DONE, 5, 5)
+    assert not News.objects.filter(pk=news.pk).exists()
+
+
+def test_news_purge_skips_comment_counters(news, author, settings):
+    """
+    При удалении новости комментарии удаляются без обновления её
+    счётчика и кэша на каждый комментарий, поисковый индекс
+    очищается
+    """
+    settings.PURGE_BATCH_SIZE = 2
+    for index in range(3):
+        Comment.objects.create(news=news, author=author, text='Робот')
+    job = PurgeJob.objects.create(kind=PurgeJob.NEWS, target_id=news.pk)
+
+    with CaptureQueriesContext(connection) as queries, mock.patch(
+        'news.signals.bump_version'
+    ) as bump_version:
+        call_command('run_purge_jobs', stdout=StringIO())
+
+    assert not [
+        query for query in queries
+        if query['sql'].startswith('UPDATE "news_news"')
+    ]
+    assert bump_version.call_count == 1
+    assert search('робот').count() == 0
+    job.refresh_from_db()
+    assert (job.status, job.deleted) == (PurgeJob.DONE, 3)
+
+
+def test_run_purge_jobs_skips_live_job(news, author, settings):
+    """
+    Задание, которое выполняется в другом процессе, не трогается,
+    пока его метка свежее PURGE_LEASE
+    """
+    Comment.objects.create(news=news, author=author, text='Текст')
+    job = PurgeJob.objects.create(
+        kind=PurgeJob.NEWS, target_id=news.pk,
+        status=PurgeJob.RUNNING, heartbeat=timezone.now(),
+    )
+
+    call_command('run_purge_jobs', stdout=StringIO())
+
+    job.refresh_from_db()
+    assert job.status == PurgeJob.RUNNING
+    assert News.objects.filter(pk=news.pk).exists()
+
+    PurgeJob.objects.filter(pk=job.pk).update(
+        heartbeat=timezone.now() - timedelta(
+            seconds=settings.PURGE_LEASE + 1
+        )
+    )
+    call_command('run_purge_jobs', stdout=StringIO())
+
+    job.refresh_from_db()
+    assert (job.status, job.deleted) == (PurgeJob.DONE, 1)
+
+
+@pytest.fixture
+def old_news(news, author, settings, tmp_path):
+    """Новость старше срока хранения с двумя комментариями"""
+    settings.NEWS_ARCHIVE_DIR = tmp_path
+    settings.PURGE_BATCH_SIZE = 1
+    news.date = timezone.localdate() - timedelta(
+        days=settings.NEWS_RETENTION_DAYS + 1
+    )
+    news.save()
+    for text in ('Первый', 'Второй'):
+        Comment.objects.create(news=news, author=author, text=text)
+    return news
+
+
+def test_archive_news(old_news, other_news, client, tmp_path):
+    """
+    Старая новость переносится в архив и доступна только для чтения,
+    свежая остаётся в базе, повторный запуск ничего не меняет
+    """
+    call_command('archive_news', stdout=StringIO())
+    call_command('archive_news', stdout=StringIO())
+
+    assert list(News.objects.all()) == [other_news]
+    assert not Comment.objects.exists()
+    archived = ArchivedNews.objects.get()
+    assert (archived.pk, archived.comment_count) == (old_news.pk, 2)
+    segment, = tmp_path.iterdir()
+    assert gzip.decompress(segment.read_bytes()).count(b'\n') == 3
+    response = client.get(reverse('news:detail', args=(old_news.pk,)))
+    assert response.status_code == 200
+    assert 'form' not in response.context
+    content = response.content.decode()
+    assert old_news.title in content
+    assert 'Первый' in content and 'Второй' in content
+
+
+def test_archive_news_after_interruption(old_news, tmp_path):
+    """
+    Если прерванный запуск успел записать архив, новость
+    удаляется без повторной записи
+    """
+    with mock.patch('news.archive.delete_comments',
+                    side_effect=RuntimeError):
+        with pytest.raises(RuntimeError):
+            call_command('archive_news', stdout=StringIO())
+    segment, = tmp_path.iterdir()
+    size = segment.stat().st_size
+
+    call_command('archive_news', stdout=StringIO())
+
+    assert not News.objects.exists()
+    assert ArchivedNews.objects.count() == 1
+    assert [path.stat().st_size for path in tmp_path.iterdir()] == [size]
+
+
+def test_archive_news_keeps_new_comments(old_news, author, client):
+    """
+    Если после записи в архив у новости появился комментарий,
+    новость со всеми комментариями остаётся в таблицах,
+    а следующий запуск переносит её целиком
+    """
+    sync = archive.SegmentWriter.sync
+
+    def comment_and_sync(writer):
+        if not Comment.objects.filter(text='Третий').exists():
+            Comment.objects.create(
+                news=old_news, author=author, text='Третий'
+            )
+        sync(writer)
+
+    with mock.patch.object(archive.SegmentWriter, 'sync', comment_and_sync):
+        call_command('archive_news', stdout=StringIO())
+
+    old_news.refresh_from_db()
+    assert old_news.comment_count == 3
+    content = client.get(
+        reverse('news:detail', args=(old_news.pk,))
+    ).content.decode()
+    assert all(text in content for text in ('Первый', 'Второй', 'Третий'))
+
+    call_command('archive_news', stdout=StringIO())
+
+    assert not News.objects.exists()
+    assert not Comment.objects.exists()
+    archived = ArchivedNews.objects.get()
+    assert archived.comment_count == 3
+    _, comments = archive.read_archived(archived, 10)
+    assert [comment['text'] for comment in comments] == [
+        'Первый', 'Второй', 'Третий'
+    ]
+
+
+def test_archive_news_rewrites_comments_added_during_removal(
+        old_news, author):
+    """
+    Комментарий, добавленный, пока удалялись пачки, дописывается
+    в архив, и новость переносится за один запуск
+    """
+    delete_comments = archive.delete_comments
+
+    def comment_and_delete(comments):
+        Comment.objects.create(news=old_news, author=author, text='Третий')
+        delete_comments(comments)
+
+    with mock.patch('news.archive.delete_comments',
+                    side_effect=comment_and_delete):
+        call_command('archive_news', stdout=StringIO())
+
+    assert not News.objects.exists()
+    assert not Comment.objects.exists()
+    archived = ArchivedNews.objects.get()
+    _, comments = archive.read_archived(archived, 10)
+    assert [comment['text'] for comment in comments] == [
+        'Первый', 'Второй', 'Третий'
+    ]
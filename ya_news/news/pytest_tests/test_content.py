@@ -1,7 +1,14 @@
+from http import HTTPStatus
+
 import pytest
 from django.conf import settings
+from django.db.models.signals import pre_init
+from django.test import Client
+from django.urls import reverse
 
 from news.forms import CommentForm
+from news.models import Comment, News
+from news.search import FtsSearchResults, SearchResults
 
 pytestmark = pytest.mark.django_db
 
@@ -28,32 +35,83 @@ def test_news_order(client, news_home_url):
     assert all_dates == sorted(all_dates, reverse=True)
 
 
+@pytest.mark.parametrize('comments_count', (1, 50))
+def test_home_page_cost_independent_of_comments(
+        client, news, author, news_home_url,
+        comments_count, django_assert_num_queries):
+    """
+    Главная страница делает один запрос и не создаёт объекты
+    комментариев, сколько бы комментариев ни было у новостей
+    """
+    Comment.objects.bulk_create(
+        Comment(news=news, author=author, text=f'Текст {index}')
+        for index in range(comments_count)
+    )
+    News.objects.filter(pk=news.pk).recount_comments()
+    built_comments = []
+
+    def count_comment(sender, **kwargs):
+        built_comments.append(sender)
+
+    pre_init.connect(count_comment, sender=Comment)
+    try:
+        with django_assert_num_queries(1):
+            response = client.get(news_home_url)
+    finally:
+        pre_init.disconnect(count_comment, sender=Comment)
+
+    assert built_comments == []
+    assert f'Комментариев: {comments_count}' in response.content.decode()
+
+
+def test_home_page_shows_excerpt_without_text(
+        client, news, news_home_url, django_assert_num_queries):
+    """
+    Главная страница выводит анонс, посчитанный при сохранении,
+    и не загружает полный текст новости
+    """
+    news.text = ' '.join(f'слово{index}' for index in range(100))
+    news.save(update_fields=('text',))
+
+    with django_assert_num_queries(1) as queries:
+        response = client.get(news_home_url)
+
+    assert 'text' not in response.context['object_list'][0].__dict__
+    assert '"news_news"."text"' not in queries.captured_queries[0]['sql']
+    content = response.content.decode()
+    assert 'слово0 слово1' in content
+    assert 'слово14 …' in content
+    assert 'слово15' not in content
+
+
 @pytest.mark.parametrize(
-    'url, user, has_access', ((pytest.lazy_fixture('news_detail_url'),
+    'url, user, has_access', ((pytest.lazy_fixture('news_viewer_url'),
                                pytest.lazy_fixture('author_client'),
                                True),
-                              (pytest.lazy_fixture('news_detail_url'),
+                              (pytest.lazy_fixture('news_viewer_url'),
                                pytest.lazy_fixture('client'),
                                False))
 )
 def test_comment_form_availability_for_different_users(user, has_access, url):
     """
     Анонимному пользователю недоступна форма для отправки комментария
-    на странице отдельной новости, а авторизованному доступна
+    на странице отдельной новости, а авторизованному доступна.
+    Форму подставляет пользовательская часть страницы
     """
-    context = user.get(url).context
+    response = user.get(url)
 
-    assert has_access == ('form' in context)
+    assert has_access == ('form' in response.context)
+    assert has_access == bool(response.json()['form'])
 
 
 def test_comment_form_author_user(author_client,
-                                  news_detail_url):
+                                  news_viewer_url):
     """
     Авторизованному пользователю представлена форма
     для отправки комментария на странице отдельной
     новости
     """
-    context = author_client.get(news_detail_url).context
+    context = author_client.get(news_viewer_url).context
 
     assert isinstance(context['form'], CommentForm)
 
@@ -66,7 +124,223 @@ def test_comments_order(client, news_detail_url):
     старые в начале списка, новые — в конце
     """
     response = client.get(news_detail_url)
-    context_news = response.context['news']
-    all_comments = context_news.comment_set.all()
+    all_comments = response.context['comments']
+    all_timestamps = [comment.created for comment in all_comments]
+
+    assert all_timestamps == sorted(all_timestamps)
+
+
+@pytest.mark.usefixtures('many_comments')
+def test_comments_paginated_by_cursor(client, settings, news,
+                                      news_detail_url):
+    """
+    Комментарии разбиты на страницы по курсору: страницы идут
+    в хронологическом порядке, без пропусков и повторов
+    """
+    settings.COMMENTS_COUNT_ON_DETAIL_PAGE = 2
+    response = client.get(news_detail_url)
+    pages = [response.context['comments']]
+    next_cursor = response.context['next_cursor']
+    while next_cursor:
+        response = client.get(
+            reverse('news:comments', args=(news.pk, next_cursor))
+        )
+        pages.append(response.context['comments'])
+        next_cursor = response.context['next_cursor']
+    shown = [comment for page in pages for comment in page]
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert shown == list(news.comment_set.order_by('created', 'pk'))
+
+
+def test_invalid_comments_cursor(client, news):
+    """На некорректный курсор страница комментариев отвечает 400"""
+    response = client.get(reverse('news:comments', args=(news.pk, 'xyz')))
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.parametrize('url, queries', (
+    (pytest.lazy_fixture('news_home_url'), 0),
+    (pytest.lazy_fixture('news_detail_url'), 1),
+))
+def test_anonymous_pages_cached(client, url, queries,
+                                django_assert_num_queries):
+    """
+    Повторный запрос анонимного пользователя обслуживается из кэша.
+    Для страницы новости остаётся только запрос валидаторов условного GET
+    """
+    first = client.get(url)
+    with django_assert_num_queries(queries):
+        second = client.get(url)
+
+    assert second.content == first.content
+
+
+def test_authenticated_pages_not_cached(author_client, news_home_url,
+                                        django_assert_num_queries):
+    """Авторизованным пользователям страницы из кэша не отдаются"""
+    author_client.get(news_home_url)
+    with django_assert_num_queries(3):
+        author_client.get(news_home_url)
+
+
+@pytest.mark.parametrize('backend', (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+))
+def test_new_comment_invalidates_only_its_news(
+        client, settings, tmp_path, backend, news, other_news, author,
+        news_home_url, news_detail_url, django_assert_num_queries):
+    """
+    Новый комментарий сбрасывает страницу своей новости и главную,
+    а страницы других новостей остаются в кэше
+    """
+    settings.CACHES = {
+        'default': {'BACKEND': backend, 'LOCATION': str(tmp_path)}
+    }
+    other_detail_url = reverse('news:detail', args=(other_news.pk,))
+    for url in (news_home_url, news_detail_url, other_detail_url):
+        client.get(url)
+
+    Comment.objects.create(news=news, author=author, text='Новый')
+
+    with django_assert_num_queries(1):
+        client.get(other_detail_url)
+    assert 'Новый' in client.get(news_detail_url).content.decode()
+    assert 'Комментариев: 1' in client.get(news_home_url).content.decode()
+
+
+def test_detail_conditional_get(client, news, author, news_detail_url,
+                                django_assert_num_queries):
+    """
+    Страница новости отдаёт ETag и отвечает 304, пока не появится
+    или не изменится комментарий. Last-Modified не отдаётся,
+    и If-Modified-Since без ETag страницу не подтверждает
+    """
+    response = client.get(news_detail_url)
+    etag = response['ETag']
+
+    assert not response.has_header('Last-Modified')
+    with django_assert_num_queries(1):
+        response = client.get(news_detail_url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    response = client.get(
+        news_detail_url,
+        HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT',
+    )
+    assert response.status_code == HTTPStatus.OK
+
+    comment = Comment.objects.create(news=news, author=author, text='Новый')
+    response = client.get(news_detail_url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == HTTPStatus.OK
+    assert response['ETag'] != etag
+    etag = response['ETag']
+    comment.text = 'Исправленный'
+    comment.save()
+    response = client.get(news_detail_url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_detail_shared_between_users(author_client, comment, news_detail_url,
+                                     django_assert_num_queries):
+    """
+    Страница новости одинакова для всех пользователей: общий ETag,
+    публичный Cache-Control, без Vary: Cookie, и для авторизованного
+    пользователя она тоже берётся из кэша без чтения сессии
+    """
+    anonymous = Client().get(news_detail_url)
+    with django_assert_num_queries(1):
+        response = author_client.get(news_detail_url)
+
+    assert response.content == anonymous.content
+    assert response['ETag'] == anonymous['ETag']
+    assert 'public' in response['Cache-Control']
+    assert 'Cookie' not in response.get('Vary', '')
+    assert 'Выйти' not in response.content.decode()
+    response = author_client.get(
+        news_detail_url, HTTP_IF_NONE_MATCH=anonymous['ETag']
+    )
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert 'public' in response['Cache-Control']
+
+
+def test_viewer_fragment(author_client, author, comment, news_viewer_url):
+    """
+    Пользовательская часть страницы новости содержит навигацию
+    и id комментариев пользователя и не кэшируется
+    """
+    author_data = author_client.get(news_viewer_url)
+    anonymous_data = Client().get(news_viewer_url).json()
+
+    assert 'private' in author_data['Cache-Control']
+    assert author_data.json()['own_comments'] == [comment.pk]
+    assert author.username in author_data.json()['nav']
+    assert anonymous_data['own_comments'] == []
+    assert anonymous_data['form'] == ''
+
+
+def test_search_results_ranked_and_paginated(client, settings, news, author,
+                                             news_search_url):
+    """
+    Поиск находит новости и комментарии, совпадение в заголовке
+    выше совпадения в тексте, результаты разбиты на страницы
+    """
+    settings.NEWS_SEARCH_RESULTS_ON_PAGE = 2
+    title_hit = News.objects.create(title='Робот победил', text='Текст')
+    Comment.objects.bulk_create(
+        Comment(news=news, author=author, text=f'Робот номер {index}')
+        for index in range(2)
+    )
+    Comment.objects.create(news=news, author=author, text='Ещё робот')
+
+    response = client.get(news_search_url, {'q': 'робот'})
+    page = response.context['results']
+
+    assert response.context['paginator'].count == 2
+    assert [hit.news_id for hit in page] == [title_hit.pk, news.pk]
+    assert page[0].comment_id is None
+    assert page[1].title == news.title
+    assert response.context['page_obj'].has_next() is False
+
+
+def test_search_snippet_escaped(client, news, author, news_search_url):
+    """Найденный фрагмент подсвечен, а HTML из текста экранирован"""
+    Comment.objects.create(
+        news=news, author=author, text='<script>робот</script>'
+    )
+
+    response = client.get(news_search_url, {'q': 'робот'})
+
+    assert '<mark>робот</mark>' in response.content.decode()
+    assert '<script>' not in response.content.decode()
+
+
+@pytest.mark.parametrize('query', ('', '"', 'AND OR'))
+def test_search_query_syntax_hidden(client, news_search_url, query):
+    """Синтаксис FTS5 в запросе не приводит к ошибке"""
+    response = client.get(news_search_url, {'q': query})
+
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_fallback_search_matches_fts(news, other_news, author):
+    """
+    Запасной поиск находит те же новости и комментарии, что и FTS5.
+    LIKE в SQLite не различает регистр только у латиницы,
+    поэтому текст в нижнем регистре
+    """
+    comment = Comment.objects.create(
+        news=other_news, author=author, text='новость про робота'
+    )
+
+    def found(results):
+        return {(hit.news_id, hit.comment_id) for hit in results[:10]}
+
+    fallback = SearchResults('новость')
 
-    assert list(all_comments) == list(all_comments.order_by('created'))
+    assert fallback.count() == 2
+    assert found(fallback) == found(FtsSearchResults('новость')) == {
+        (other_news.pk, None), (other_news.pk, comment.pk)
+    }
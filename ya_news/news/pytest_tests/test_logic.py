@@ -1,13 +1,27 @@
+import os
+import threading
 from http import HTTPStatus
 
 import pytest
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
 from pytest_django.asserts import assertFormError
+from pytest_lazyfixture import lazy_fixture
 
+from news import ingest
 from news.forms import WARNING
-from news.models import Comment
+from news.models import BadWord, Comment, News
+from news.profanity import WordMatcher
+from news.search import search
+from yanews import settings_cached, settings_production
 
 pytestmark = pytest.mark.django_db
 
+# pid, которого нет среди процессов теста.
+DEAD_PID = 999999999
+# Сколько секунд ждать записи фоновым потоком.
+WRITER_TIMEOUT = 5
+
 
 def test_anonymous_user_cant_create_comment(client,
                                             form_data,
@@ -42,6 +56,37 @@ def test_user_can_create_comment(
     assert comment.author == author
 
 
+def test_comment_count_follows_comments(
+        author_client, news, form_data, news_detail_url):
+    """
+    Счётчик комментариев новости растёт при создании комментария
+    и уменьшается при удалении
+    """
+    author_client.post(news_detail_url, data=form_data)
+    news.refresh_from_db()
+
+    assert news.comment_count == 1
+
+    Comment.objects.get(news=news).delete()
+    news.refresh_from_db()
+
+    assert news.comment_count == 0
+
+
+def test_news_save_keeps_comment_count(author, news):
+    """
+    Сохранение загруженной раньше новости не затирает счётчик,
+    изменившийся после её загрузки
+    """
+    stale = News.objects.get(pk=news.pk)
+    Comment.objects.create(news=news, author=author, text='Текст')
+    stale.title = 'Новый заголовок'
+    stale.save()
+    news.refresh_from_db()
+
+    assert (news.title, news.comment_count) == ('Новый заголовок', 1)
+
+
 def test_user_cant_use_bad_words(admin_client,
                                  bad_words_data,
                                  news_detail_url):
@@ -57,6 +102,35 @@ def test_user_cant_use_bad_words(admin_client,
     assert count_initial_comments == count_after_comments
 
 
+def test_word_matcher_finds_overlapping_words():
+    """
+    Автомат находит слова, в том числе вложенные друг в друга,
+    и не срабатывает на чистый текст
+    """
+    matcher = WordMatcher(('he', 'she', 'his', 'hers', 'Редиска'))
+
+    assert matcher.find('ushers') == 'she'
+    assert matcher.find('this') == 'his'
+    assert matcher.find('ты редиска!') == 'редиска'
+    assert matcher.find('hi there') == 'he'
+    assert matcher.find('tiny text') is None
+
+
+def test_bad_words_from_table(admin_client, news_detail_url,
+                              django_capture_on_commit_callbacks):
+    """
+    Слово, добавленное в таблицу BadWord, сразу попадает в словарь
+    """
+    with django_capture_on_commit_callbacks(execute=True):
+        BadWord.objects.create(word='Бяка')
+    response = admin_client.post(
+        news_detail_url, data={'text': 'Сам ты бяка'}
+    )
+
+    assertFormError(response, form='form', field='text', errors=WARNING)
+    assert not Comment.objects.exists()
+
+
 def test_author_can_edit_comment(
         author_client,
         comment,
@@ -124,3 +198,254 @@ def test_other_user_cant_delete_comment(
     assert comment.author == initial_comment_author
     assert comment.text == initial_comment_text
     assert count_initial_comments == count_after_comments
+
+
+@pytest.mark.usefixtures('loaded_bad_words')
+@pytest.mark.parametrize(
+    'url, form_data_to_send, queries',
+    # Сессия и пользователь — первые два запроса в каждом случае,
+    # запись в поисковый индекс — ещё один.
+    ((lazy_fixture('news_detail_url'), lazy_fixture('form_data'), 6),
+     (lazy_fixture('news_edit_url'), lazy_fixture('form_data'), 5),
+     (lazy_fixture('news_delete_url'), None, 6)),
+)
+def test_comment_writes_query_count(author_client, url, form_data_to_send,
+                                    queries, django_assert_num_queries):
+    """
+    Запись комментария находит новость или комментарий один раз
+    и переиспользует объект при построении адреса редиректа
+    """
+    with django_assert_num_queries(queries):
+        author_client.post(url, data=form_data_to_send)
+
+
+@pytest.mark.usefixtures('loaded_bad_words')
+def test_cached_profile_skips_session_and_user_queries(
+        client, author, settings, news_edit_url, form_data,
+        django_assert_num_queries):
+    """
+    С профилем settings_cached сессия и пользователь берутся из кэша:
+    правка комментария обходится без двух запросов из пяти
+    """
+    settings.SESSION_ENGINE = settings_cached.SESSION_ENGINE
+    settings.MIDDLEWARE = settings_cached.MIDDLEWARE
+    client.force_login(author)
+    client.get(news_edit_url)
+
+    with django_assert_num_queries(3):
+        client.post(news_edit_url, data=form_data)
+
+
+def test_search_index_follows_writes(author_client, news, comment,
+                                     news_edit_url, news_delete_url):
+    """
+    Поисковый индекс обновляется при сохранении и удалении
+    новостей и комментариев
+    """
+    def found(query):
+        return {(hit.news_id, hit.comment_id) for hit in search(query)[:10]}
+
+    assert found('текст') == {(news.pk, None), (news.pk, comment.pk)}
+
+    author_client.post(news_edit_url, data={'text': 'Обновлённый'})
+    assert found('обновлённый') == {(news.pk, comment.pk)}
+
+    author_client.post(news_delete_url)
+    assert found('обновлённый') == set()
+
+    news.delete()
+    assert found('текст') == set()
+
+
+@pytest.fixture
+def comment_buffer(settings, tmp_path, monkeypatch):
+    """
+    Отложенная запись комментариев без фонового потока:
+    очередь записывается вызовом flush()
+    """
+    settings.COMMENT_INGESTION = True
+    settings.COMMENT_INGESTION_FLUSH_INTERVAL = None
+    settings.COMMENT_INGESTION_SPOOL = str(tmp_path / 'comments.jsonl')
+    registered = []
+    monkeypatch.setattr(ingest.atexit, 'register', registered.append)
+    buffer = ingest.CommentBuffer()
+    buffer.registered = registered
+    monkeypatch.setattr(ingest, 'comment_buffer', buffer)
+    return buffer
+
+
+def test_queued_comment_written_by_flush(
+        author_client, news, comment_buffer, news_detail_url,
+        news_comment_redirect, news_viewer_url):
+    """
+    Комментарий из очереди виден автору до записи в базу,
+    а после flush() записан со счётчиком и поисковым индексом
+    """
+    count_initial_comments = Comment.objects.count()
+    response = author_client.post(
+        news_detail_url, data={'text': 'Очередной отклик'}
+    )
+
+    assert response.url == news_comment_redirect
+    assert Comment.objects.count() == count_initial_comments
+    pending = author_client.get(news_viewer_url).json()['pending']
+    assert 'Очередной отклик' in pending
+
+    assert comment_buffer.flush() == 1
+    written = Comment.objects.get(text='Очередной отклик')
+    news.refresh_from_db()
+    assert written.news == news
+    assert news.comment_count == count_initial_comments + 1
+    assert [hit.comment_id for hit in search('очередной')[:10]] == [
+        written.pk
+    ]
+    assert author_client.get(news_viewer_url).json()['pending'] == ''
+
+
+def test_full_batch_written_without_writer(author, news, comment_buffer,
+                                           settings):
+    """
+    Без фонового потока полную пачку записывает put,
+    а остаток записывается при завершении процесса
+    """
+    settings.COMMENT_INGESTION_BATCH_SIZE = 2
+    for text in ('Первый', 'Второй', 'Третий'):
+        comment_buffer.put(Comment(
+            news=news, author=author, text=text, created=timezone.now()
+        ))
+
+    assert Comment.objects.count() == 2
+    assert comment_buffer.registered == [comment_buffer.stop]
+    comment_buffer.stop()
+    assert Comment.objects.count() == 3
+
+
+def test_spooled_comments_replayed_once(author, news, comment_buffer,
+                                        settings, monkeypatch):
+    """
+    Очередь упавшего процесса дописывает в базу другой процесс,
+    уже записанные комментарии пропускаются
+    """
+    for text in ('Первый', 'Второй'):
+        comment_buffer.put(Comment(
+            news=news, author=author, text=text, created=timezone.now()
+        ))
+    ingest.write_comments([Comment(news=news, author=author, text='Первый')])
+    dead_spool = f'{settings.COMMENT_INGESTION_SPOOL}.{DEAD_PID}'
+    os.rename(ingest.spool_path(os.getpid()), dead_spool)
+    monkeypatch.setattr(ingest, 'process_alive', lambda pid: False)
+
+    restarted = ingest.CommentBuffer()
+    restarted.put(Comment(
+        news=news, author=author, text='Третий', created=timezone.now()
+    ))
+    assert restarted.flush() == 2
+
+    assert sorted(Comment.objects.values_list('text', flat=True)) == [
+        'Второй', 'Первый', 'Третий'
+    ]
+    assert not os.path.exists(dead_spool)
+    with open(ingest.spool_path(os.getpid()), encoding='utf-8') as spool:
+        assert spool.read() == ''
+
+
+def test_live_process_spool_not_replayed(author, news, comment_buffer,
+                                         settings, monkeypatch):
+    """Очередь работающего процесса другие процессы не трогают"""
+    live_spool = f'{settings.COMMENT_INGESTION_SPOOL}.{DEAD_PID}'
+    with open(live_spool, 'w', encoding='utf-8') as spool:
+        spool.write(ingest.spool_line(Comment(
+            news=news, author=author, text='Чужой', created=timezone.now()
+        )))
+    monkeypatch.setattr(ingest, 'process_alive', lambda pid: True)
+
+    comment_buffer.put(Comment(
+        news=news, author=author, text='Свой', created=timezone.now()
+    ))
+
+    assert comment_buffer.flush() == 1
+    assert list(Comment.objects.values_list('text', flat=True)) == ['Свой']
+    assert os.path.exists(live_spool)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_unwritable_comment_dropped(author, news, comment_buffer, settings):
+    """
+    Комментарий к удалённой новости пропускается,
+    остальные комментарии пачки записываются
+    """
+    removed = News.objects.create(title='Удалённая', text='Текст')
+    for news_id in (news.pk, removed.pk, news.pk):
+        comment_buffer.put(Comment(
+            news_id=news_id, author=author, text='Отклик',
+            created=timezone.now(),
+        ))
+    removed.delete()
+
+    assert comment_buffer.flush() == 2
+    assert Comment.objects.filter(news=news).count() == 2
+    assert comment_buffer.flush() == 0
+    with open(ingest.spool_path(os.getpid()), encoding='utf-8') as spool:
+        assert spool.read() == ''
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('batch_size, interval', ((100, 0.01), (2, 60)))
+def test_background_writer_flushes(author, news, settings, tmp_path,
+                                   monkeypatch, batch_size, interval):
+    """
+    Фоновый поток записывает очередь по времени
+    и по размеру пачки
+    """
+    settings.COMMENT_INGESTION_BATCH_SIZE = batch_size
+    settings.COMMENT_INGESTION_FLUSH_INTERVAL = interval
+    settings.COMMENT_INGESTION_SPOOL = None
+    buffer = ingest.CommentBuffer()
+    monkeypatch.setattr(ingest.atexit, 'register', lambda func: None)
+    written = threading.Event()
+    write_comments = ingest.write_comments
+
+    def write_and_notify(comments):
+        write_comments(comments)
+        written.set()
+
+    monkeypatch.setattr(ingest, 'write_comments', write_and_notify)
+    for text in ('Первый', 'Второй'):
+        buffer.put(Comment(
+            news=news, author=author, text=text, created=timezone.now()
+        ))
+
+    assert written.wait(WRITER_TIMEOUT)
+    buffer.stop()
+    assert buffer._writer is None
+    assert Comment.objects.count() == 2
+
+
+def test_production_profile_sets_pragmas(settings, tmp_path):
+    """
+    Новое соединение профиля settings_production работает в режиме WAL
+    с заданными PRAGMA
+    """
+    settings.SQLITE_PRAGMAS = settings_production.SQLITE_PRAGMAS
+    default = connections[DEFAULT_DB_ALIAS]
+    wrapper = default.__class__(
+        {**default.settings_dict, 'NAME': str(tmp_path / 'db.sqlite3')},
+        DEFAULT_DB_ALIAS,
+    )
+    try:
+        with wrapper.cursor() as cursor:
+            values = {
+                pragma: cursor.execute(f'PRAGMA {pragma}').fetchone()[0]
+                for pragma in ('journal_mode', 'synchronous',
+                               'busy_timeout', 'cache_size')
+            }
+    finally:
+        wrapper.close()
+
+    assert values == {
+        'journal_mode': 'wal',
+        # NORMAL
+        'synchronous': 1,
+        'busy_timeout': 5000,
+        'cache_size': -64 * 1024,
+    }
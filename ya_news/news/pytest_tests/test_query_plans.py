@@ -0,0 +1,76 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from news.pagination import encode_cursor
+
+pytestmark = pytest.mark.django_db
+
+NEWS_TABLES = ('news_news', 'news_comment')
+
+
+def query_plans(client, url):
+    """
+    Открывает страницу и возвращает EXPLAIN QUERY PLAN для каждого
+    SELECT к таблицам новостей и комментариев, выполненного при этом
+    """
+    with CaptureQueriesContext(connection) as context:
+        client.get(url)
+    plans = {}
+    with connection.cursor() as cursor:
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not any(
+                    table in sql for table in NEWS_TABLES
+            ):
+                continue
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plans[sql] = [row[-1] for row in cursor.fetchall()]
+    return plans
+
+
+def is_bad_step(step):
+    """Полный просмотр таблицы или сортировка во временном B-tree."""
+    full_scan = step.startswith('SCAN') and 'USING' not in step
+    return full_scan or 'TEMP B-TREE' in step
+
+
+def bad_steps(plans):
+    """Выбирает из планов только плохие шаги."""
+    bad = {
+        sql: [step for step in steps if is_bad_step(step)]
+        for sql, steps in plans.items()
+    }
+    return {sql: steps for sql, steps in bad.items() if steps}
+
+
+@pytest.mark.skipif(
+    connection.vendor != 'sqlite', reason='EXPLAIN QUERY PLAN есть в SQLite'
+)
+@pytest.mark.usefixtures('many_news', 'many_comments')
+@pytest.mark.parametrize(
+    'url_name, user',
+    (('home', pytest.lazy_fixture('client')),
+     ('detail', pytest.lazy_fixture('client')),
+     ('comments', pytest.lazy_fixture('client')),
+     ('edit', pytest.lazy_fixture('author_client')),
+     ('delete', pytest.lazy_fixture('author_client'))),
+)
+def test_pages_use_indexes(url_name, user, news, comment):
+    """
+    Запросы главной страницы, страницы новости, страниц комментариев
+    и CommentBase.get_queryset идут по индексам: без полного просмотра
+    таблиц и без временных B-tree для сортировки
+    """
+    url_args = {
+        'home': (),
+        'detail': (news.pk,),
+        'comments': (news.pk, encode_cursor(comment)),
+        'edit': (comment.pk,),
+        'delete': (comment.pk,),
+    }[url_name]
+    plans = query_plans(user, reverse(f'news:{url_name}', args=url_args))
+
+    assert plans
+    assert bad_steps(plans) == {}
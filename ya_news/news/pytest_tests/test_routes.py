@@ -1,9 +1,16 @@
+import multiprocessing
+import os
 from http import HTTPStatus
 
 import pytest
+from django.urls import reverse
 from pytest_django.asserts import assertRedirects
 from pytest_lazyfixture import lazy_fixture
 
+from ya_common.metrics import (REQUEST_DURATION, MmapStore, make_key,
+                               registry)
+from ya_common.middleware import get_route_stats, reset_route_stats
+
 pytestmark = pytest.mark.django_db
 
 
@@ -84,6 +91,18 @@ pytestmark = pytest.mark.django_db
                            pytest.lazy_fixture('client'),
                            HTTPStatus.OK),
 
+                          (pytest.lazy_fixture('news_search_url'),
+                           pytest.lazy_fixture('client'),
+                           HTTPStatus.OK),
+
+                          (pytest.lazy_fixture('news_viewer_url'),
+                           pytest.lazy_fixture('client'),
+                           HTTPStatus.OK),
+
+                          (pytest.lazy_fixture('news_viewer_url'),
+                           pytest.lazy_fixture('author_client'),
+                           HTTPStatus.OK),
+
                           (pytest.lazy_fixture('news_edit_url'),
                            pytest.lazy_fixture('client'),
                            HTTPStatus.FOUND),
@@ -101,6 +120,10 @@ def test_overall_availability(
 
     Страница отдельной новости доступна анонимному пользователю
 
+    Страница поиска доступна анонимному пользователю
+
+    Пользовательская часть страницы новости доступна всем
+
     Страницы удаления и редактирования комментария доступны автору комментария
 
     При попытке перейти на страницу редактирования или удаления комментария
@@ -168,3 +191,110 @@ def test_redirects_for_anonymous_client(client, url, redirect_url):
 def test_redirect_post_requests(user, url, redirect_url, form_data_to_send):
     """Проверка редиректов при POST запросах"""
     assertRedirects(user.post(url, data=form_data_to_send), redirect_url)
+
+
+def test_server_timing(client, settings, news_detail_url):
+    """
+    С включённым инструментированием ответ содержит Server-Timing,
+    а замеры копятся по имени маршрута
+    """
+    settings.PERFORMANCE_INSTRUMENTATION = True
+    settings.PERFORMANCE_MEMORY_SAMPLE_RATE = 1
+    reset_route_stats()
+    response = client.get(news_detail_url)
+    header = response['Server-Timing']
+    stats = get_route_stats()['news:detail']
+
+    for metric in ('db;desc=', 'view;dur=', 'render;dur=', 'total;dur=',
+                   'mem;desc='):
+        assert metric in header
+    assert stats['count'] == 1
+    assert stats['queries'] > 0
+    assert stats['memory']['max'] > 0
+
+
+def test_server_timing_disabled(client, news_home_url):
+    """По умолчанию инструментирование выключено"""
+    assert not client.get(news_home_url).has_header('Server-Timing')
+
+
+def test_metrics_endpoint(client, admin_client, settings, news_home_url):
+    """
+    Страница метрик доступна только персоналу и отдаёт счётчики
+    и гистограммы по маршрутам в формате Prometheus
+    """
+    settings.METRICS_ENABLED = True
+    registry.reset()
+    client.get(news_home_url)
+    client.get(news_home_url)
+    metrics_url = reverse('metrics')
+    response = admin_client.get(metrics_url)
+    text = response.content.decode()
+
+    assert client.get(metrics_url).status_code == HTTPStatus.FOUND
+    assert (
+        'http_requests_total{route="news:home",method="GET",status="200"} 2'
+        in text
+    )
+    assert (
+        'http_request_duration_seconds_count{route="news:home"} 2' in text
+    )
+    assert (
+        'http_request_duration_seconds_bucket{route="news:home",le="+Inf"} 2'
+        in text
+    )
+    assert (
+        'http_request_duration_seconds_quantile'
+        '{route="news:home",quantile="0.99"}' in text
+    )
+    assert 'db_queries_total{route="news:home"}' in text
+
+
+def test_metrics_shared_between_processes(tmp_path):
+    """
+    Значения из mmap-файлов разных процессов складываются
+    """
+    store = MmapStore(tmp_path)
+    store.inc('key', 1)
+    child = multiprocessing.get_context('fork').Process(
+        target=store.inc, args=('key', 2)
+    )
+    child.start()
+    child.join()
+    store.inc('other', 0.5)
+
+    assert len(list(tmp_path.glob('metrics_*.db'))) == 2
+    assert MmapStore(tmp_path).collect() == {'key': 3.0, 'other': 0.5}
+
+
+def test_metrics_from_dead_processes_absorbed(tmp_path):
+    """
+    Файл завершившегося процесса переходит к следующему процессу,
+    значения не теряются
+    """
+    child = multiprocessing.get_context('fork').Process(
+        target=MmapStore(tmp_path).inc, args=('key', 2)
+    )
+    child.start()
+    child.join()
+    store = MmapStore(tmp_path)
+    store.inc('key', 1)
+
+    assert [path.name for path in tmp_path.iterdir()] == [
+        f'metrics_{os.getpid()}.db'
+    ]
+    assert store.collect() == {'key': 3.0}
+
+
+def test_metrics_partial_histogram():
+    """
+    Серия гистограммы, у которой видна корзина, но ещё нет количества,
+    выводится без квантилей, а не ломает страницу метрик
+    """
+    values = {make_key(REQUEST_DURATION.name, [['route', 'news:home']],
+                       '0.1'): 1.0}
+
+    text = '\n'.join(REQUEST_DURATION.expose(values))
+
+    assert 'http_request_duration_seconds_count{route="news:home"} 0' in text
+    assert 'quantile=' not in text
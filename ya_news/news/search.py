@@ -0,0 +1,236 @@
+"""
+Полнотекстовый поиск по новостям и комментариям.
+
+На SQLite поиск идёт по виртуальной таблице FTS5 news_search: rowid
+новости хранится со знаком минус, rowid комментария совпадает с его id.
+На остальных базах SearchResults ищет через icontains.
+"""
+import re
+from collections import namedtuple
+
+from django.db import connection
+from django.db.models import F, IntegerField, Q, Value
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Comment, News
+
+SEARCH_TABLE = 'news_search'
+# Вес заголовка в ранжировании bm25 больше веса текста.
+TITLE_WEIGHT = 10.0
+TEXT_WEIGHT = 1.0
+SNIPPET_TOKENS = 16
+SNIPPET_CHARS = 100
+# Управляющие символы не встречаются в тексте: ими FTS5 размечает
+# совпадения, а после экранирования они заменяются на <mark>.
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+ELLIPSIS = '…'
+
+SearchHit = namedtuple('SearchHit', 'news_id comment_id title snippet')
+
+
+def use_fts():
+    """Таблица news_search создаётся миграцией только на SQLite."""
+    return connection.vendor == 'sqlite'
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(
+        HIGHLIGHT_START, '<mark>'
+    ).replace(HIGHLIGHT_END, '</mark>'))
+
+
+def index_news(news):
+    """Добавляет или обновляет новость в поисковом индексе."""
+    if not use_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {SEARCH_TABLE} '
+            '(rowid, news_id, title, text) VALUES (%s, %s, %s, %s)',
+            [-news.pk, news.pk, news.title, news.text],
+        )
+
+
+def index_comment(comment):
+    """Добавляет или обновляет комментарий в поисковом индексе."""
+    if not use_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {SEARCH_TABLE} '
+            "(rowid, news_id, title, text) VALUES (%s, %s, '', %s)",
+            [comment.pk, comment.news_id, comment.text],
+        )
+
+
+def unindex_news(pk):
+    if use_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [-pk]
+            )
+
+
+def unindex_comment(pk):
+    if use_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [pk]
+            )
+
+
+def rebuild_index():
+    """
+    Заполняет индекс заново из таблиц новостей и комментариев одним
+    INSERT … SELECT на каждую, без выборки строк в Python.
+    """
+    if not use_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, news_id, title, text) '
+            f'SELECT -id, id, title, text FROM {News._meta.db_table}'
+        )
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, news_id, title, text) '
+            f"SELECT id, news_id, '', text FROM {Comment._meta.db_table}"
+        )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"
+        )
+
+
+class SearchResults:
+    """
+    Результаты поиска для Paginator: count() и срезы выполняют
+    запросы только за нужной страницей.
+
+    Сам класс ищет через icontains и работает на любой базе: без
+    ранжирования, свежие новости и комментарии первыми.
+    """
+
+    def __init__(self, query):
+        self.terms = query.split()
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.fetch_count() if self.terms else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = self.count() if index.stop is None else index.stop
+        if not self.terms or stop <= start:
+            return []
+        rows = self.fetch(start, stop - start)
+        titles = dict(News.objects.filter(
+            pk__in={news_id for news_id, _, _ in rows}
+        ).values_list('pk', 'title'))
+        return [
+            SearchHit(
+                news_id=news_id,
+                comment_id=comment_id,
+                title=titles.get(news_id, ''),
+                snippet=highlight(snippet),
+            )
+            for news_id, comment_id, snippet in rows
+        ]
+
+    def queryset(self):
+        news_condition = Q()
+        comment_condition = Q()
+        for term in self.terms:
+            news_condition &= (
+                Q(title__icontains=term) | Q(text__icontains=term)
+            )
+            comment_condition &= Q(text__icontains=term)
+        # Поля модели идут в SELECT раньше аннотаций: столбцы обеих
+        # частей UNION выстроены как (news_id, text, comment_id).
+        news = News.objects.filter(news_condition).order_by().annotate(
+            comment_id=Value(None, IntegerField()),
+        ).values_list('pk', 'text', 'comment_id')
+        comments = Comment.objects.filter(
+            comment_condition
+        ).order_by().annotate(
+            comment_id=F('pk'),
+        ).values_list('news_id', 'text', 'comment_id')
+        return news.union(comments, all=True).order_by('-pk', '-comment_id')
+
+    def fetch_count(self):
+        return self.queryset().count()
+
+    def fetch(self, offset, limit):
+        """Строки (news_id, comment_id, snippet) страницы результатов."""
+        return [
+            (news_id, comment_id, self.snippet(text))
+            for news_id, text, comment_id in self.queryset()[
+                offset:offset + limit
+            ]
+        ]
+
+    def snippet(self, text):
+        """Фрагмент текста вокруг первого найденного слова."""
+        pattern = re.compile(
+            '|'.join(re.escape(term) for term in self.terms), re.IGNORECASE
+        )
+        match = pattern.search(text)
+        start = max(0, match.start() - SNIPPET_CHARS // 2) if match else 0
+        fragment = text[start:start + SNIPPET_CHARS]
+        fragment = pattern.sub(
+            lambda found: HIGHLIGHT_START + found.group() + HIGHLIGHT_END,
+            fragment,
+        )
+        prefix = ELLIPSIS if start else ''
+        suffix = ELLIPSIS if start + SNIPPET_CHARS < len(text) else ''
+        return prefix + fragment + suffix
+
+
+class FtsSearchResults(SearchResults):
+    """Поиск по FTS5 с ранжированием bm25."""
+
+    def match(self):
+        """Каждое слово запроса — отдельная фраза, синтаксис FTS5 скрыт."""
+        return ' '.join(
+            '"{}"'.format(term.replace('"', '""')) for term in self.terms
+        )
+
+    def fetch_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s',
+                [self.match()],
+            )
+            return cursor.fetchone()[0]
+
+    def fetch(self, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT news_id, rowid, snippet({SEARCH_TABLE}, -1, '
+                f'%s, %s, %s, %s) FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s '
+                f'ORDER BY bm25({SEARCH_TABLE}, 0, %s, %s) '
+                'LIMIT %s OFFSET %s',
+                [HIGHLIGHT_START, HIGHLIGHT_END, ELLIPSIS, SNIPPET_TOKENS,
+                 self.match(), TITLE_WEIGHT, TEXT_WEIGHT, limit, offset],
+            )
+            return [
+                (news_id, rowid if rowid > 0 else None, snippet)
+                for news_id, rowid, snippet in cursor.fetchall()
+            ]
+
+
+def search(query):
+    """Результаты поиска по строке запроса для текущей базы."""
+    if use_fts():
+        return FtsSearchResults(query)
+    return SearchResults(query)
@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ya_common.auth import forget_user
+
+from . import search
+from .cache import HOME_VERSION_KEY, bump_version, news_version_key
+from .forms import bad_words
+from .models import BadWord, Comment, News
+from .purge import is_purging
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Comment)
+def increase_comment_count(sender, instance, created, raw=False, **kwargs):
+    """Увеличиваем счётчик комментариев новости при создании комментария."""
+    if created and not raw:
+        News.objects.filter(pk=instance.news_id).update(
+            comment_count=F('comment_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def decrease_comment_count(sender, instance, **kwargs):
+    """Уменьшаем счётчик комментариев новости при удалении комментария."""
+    if is_purging(instance.news_id):
+        return
+    News.objects.filter(
+        pk=instance.news_id, comment_count__gt=0
+    ).update(comment_count=F('comment_count') - 1)
+
+
+@receiver(post_save, sender=News)
+@receiver(post_delete, sender=News)
+def invalidate_news_pages(sender, instance, **kwargs):
+    """Новость изменилась: сбрасываем её страницы и главную."""
+    bump_version(HOME_VERSION_KEY, news_version_key(instance.pk))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    """
+    Комментарий изменился: сбрасываем страницы его новости и главную,
+    где показано количество комментариев.
+    """
+    if is_purging(instance.news_id):
+        return
+    bump_version(HOME_VERSION_KEY, news_version_key(instance.news_id))
+
+
+@receiver(post_save, sender=News)
+def index_news(sender, instance, **kwargs):
+    """Обновляем новость в поисковом индексе."""
+    search.index_news(instance)
+
+
+@receiver(post_delete, sender=News)
+def unindex_news(sender, instance, **kwargs):
+    search.unindex_news(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    """Обновляем комментарий в поисковом индексе."""
+    search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.unindex_comment(instance.pk)
+
+
+@receiver(post_save, sender=BadWord)
+@receiver(post_delete, sender=BadWord)
+def rebuild_bad_words(sender, **kwargs):
+    """Пересобираем словарь запрещённых слов после изменения таблицы."""
+    transaction.on_commit(bad_words.rebuild)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Пользователь изменился: убираем его из кэша."""
+    forget_user(instance.pk)
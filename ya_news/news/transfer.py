@@ -0,0 +1,287 @@
+"""
+Потоковые выгрузка и загрузка новостей и комментариев.
+
+Файл содержит сначала все новости, затем все комментарии, каждую
+модель по возрастанию id. Форматы — JSONL и CSV с общим набором
+колонок COLUMNS, файл может быть сжат gzip. Автор комментария
+хранится по username и при загрузке сопоставляется с пользователем
+базы, id новостей и комментариев сохраняются.
+
+Обе стороны записывают контрольную точку после каждой пачки и могут
+продолжить с неё после прерывания. Память не зависит от размера
+таблиц: в ней одновременно держится только одна пачка строк.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .cache import HOME_VERSION_KEY, bump_version, news_version_key
+from .models import Comment, News, make_excerpt
+
+User = get_user_model()
+
+NEWS = 'news'
+COMMENT = 'comment'
+MODELS = (NEWS, COMMENT)
+COLUMNS = ('model', 'id', 'news', 'author', 'title', 'text', 'date',
+           'created')
+FORMATS = ('jsonl', 'csv')
+GZIP_SUFFIX = '.gz'
+GZIP_MAGIC = b'\x1f\x8b'
+CHECKPOINT_SUFFIX = '.checkpoint'
+
+
+def guess_format(path):
+    """Формат по расширению файла: .csv или .csv.gz — CSV, иначе JSONL."""
+    name = str(path)
+    if name.endswith(GZIP_SUFFIX):
+        name = name[:-len(GZIP_SUFFIX)]
+    return 'csv' if name.endswith('.csv') else 'jsonl'
+
+
+def checkpoint_path(path):
+    return f'{path}{CHECKPOINT_SUFFIX}'
+
+
+def read_checkpoint(path):
+    try:
+        with open(path, encoding='utf-8') as checkpoint:
+            return json.load(checkpoint)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path, state):
+    """Контрольная точка заменяется целиком, без полузаписанного файла."""
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as checkpoint:
+        json.dump(state, checkpoint)
+    os.replace(f'{path}.tmp', path)
+
+
+def remove_checkpoint(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_records(model, after=0, chunk_size=2000):
+    """Строки модели с id больше after в виде словарей колонок."""
+    if model == NEWS:
+        rows = News.objects.filter(pk__gt=after).order_by('pk').values_list(
+            'pk', 'title', 'text', 'date'
+        )
+        for pk, title, text, date in rows.iterator(chunk_size=chunk_size):
+            yield {'model': NEWS, 'id': pk, 'title': title, 'text': text,
+                   'date': date.isoformat()}
+        return
+    rows = Comment.objects.filter(pk__gt=after).order_by('pk').values_list(
+        'pk', 'news_id', 'author__username', 'text', 'created'
+    )
+    for pk, news_id, author, text, created in rows.iterator(
+        chunk_size=chunk_size
+    ):
+        yield {'model': COMMENT, 'id': pk, 'news': news_id,
+               'author': author, 'text': text,
+               'created': created.isoformat()}
+
+
+class Exporter:
+    """
+    Выгрузка в файл пачками по chunk_size строк.
+
+    Каждая пачка записывается и сбрасывается на диск до контрольной
+    точки с размером файла. При продолжении файл обрезается до этого
+    размера, поэтому недописанная пачка не попадает в результат. Сжатая
+    пачка — отдельный член gzip: такие файлы читают и gzip, и zcat.
+    """
+
+    def __init__(self, path, file_format, compress=False, chunk_size=2000):
+        self.path = path
+        self.format = file_format
+        self.compress = compress
+        self.chunk_size = chunk_size
+        self.checkpoint = checkpoint_path(path)
+
+    def run(self, resume=False):
+        """Выгружает все строки и возвращает их количество в файле."""
+        state = read_checkpoint(self.checkpoint) if resume else None
+        if state is None:
+            state = {'model': NEWS, 'last_pk': 0, 'size': 0, 'rows': 0}
+        with open(self.path, 'r+b' if state['size'] else 'wb') as output:
+            output.truncate(state['size'])
+            output.seek(state['size'])
+            if not state['size'] and self.format == 'csv':
+                self.write(output, [dict(zip(COLUMNS, COLUMNS))])
+            for model in MODELS[MODELS.index(state['model']):]:
+                after = state['last_pk'] if model == state['model'] else 0
+                for chunk in batched(
+                    export_records(model, after, self.chunk_size),
+                    self.chunk_size,
+                ):
+                    self.write(output, chunk)
+                    state = {
+                        'model': model,
+                        'last_pk': chunk[-1]['id'],
+                        'size': output.tell(),
+                        'rows': state['rows'] + len(chunk),
+                    }
+                    write_checkpoint(self.checkpoint, state)
+        remove_checkpoint(self.checkpoint)
+        return state['rows']
+
+    def write(self, output, records):
+        buffer = io.StringIO(newline='')
+        if self.format == 'csv':
+            csv.DictWriter(buffer, COLUMNS).writerows(records)
+        else:
+            for record in records:
+                buffer.write(json.dumps(record, ensure_ascii=False) + '\n')
+        data = buffer.getvalue().encode()
+        if self.compress:
+            data = gzip.compress(data)
+        output.write(data)
+        output.flush()
+        os.fsync(output.fileno())
+
+
+def read_records(path, file_format):
+    """Строки файла в виде словарей; gzip определяется по содержимому."""
+    with open(path, 'rb') as raw:
+        compressed = raw.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+    binary = gzip.open(path) if compressed else open(path, 'rb')
+    with io.TextIOWrapper(binary, encoding='utf-8', newline='') as text:
+        if file_format == 'csv':
+            yield from csv.DictReader(text)
+        else:
+            for line in text:
+                if line.strip():
+                    yield json.loads(line)
+
+
+@contextmanager
+def keep_created():
+    """
+    auto_now_add подставляет текущее время и в bulk_create;
+    на время загрузки created берётся из файла.
+    """
+    field = Comment._meta.get_field('created')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Importer:
+    """
+    Загрузка из файла пачками по batch_size строк, пачка — одна
+    транзакция. Строки с уже существующими id пропускаются, поэтому
+    повторная загрузка того же файла ничего не дублирует. Отсутствующие
+    в базе авторы создаются без пароля. Счётчики комментариев
+    и кэш страниц затронутых новостей обновляются в конце загрузки.
+    """
+
+    def __init__(self, path, file_format, batch_size=2000):
+        self.path = path
+        self.format = file_format
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint_path(path)
+        self.authors = {}
+        self.touched = set()
+
+    def run(self, resume=False):
+        """Загружает строки и возвращает количество прочитанных."""
+        state = read_checkpoint(self.checkpoint) if resume else None
+        done = state['rows'] if state else 0
+        records = read_records(self.path, self.format)
+        # Загруженные строки пропускаются, но их новости тоже
+        # нуждаются в пересчёте счётчиков.
+        for _, record in zip(range(done), records):
+            self.touch([record])
+        for batch in batched(records, self.batch_size):
+            with transaction.atomic():
+                self.insert(batch)
+            done += len(batch)
+            write_checkpoint(self.checkpoint, {'rows': done})
+        for batch in batched(self.touched, self.batch_size):
+            with transaction.atomic():
+                News.objects.filter(pk__in=batch).recount_comments()
+            bump_version(*map(news_version_key, batch))
+        bump_version(HOME_VERSION_KEY)
+        remove_checkpoint(self.checkpoint)
+        return done
+
+    def insert(self, records):
+        news = [record for record in records if record['model'] == NEWS]
+        comments = [
+            record for record in records if record['model'] == COMMENT
+        ]
+        News.objects.bulk_create((
+            News(
+                pk=int(record['id']),
+                title=record['title'],
+                text=record['text'],
+                excerpt=make_excerpt(record['text']),
+                date=parse_date(record['date']),
+            )
+            for record in news
+        ), ignore_conflicts=True)
+        self.touch(records)
+        if not comments:
+            return
+        authors = self.author_ids({record['author'] for record in comments})
+        with keep_created():
+            Comment.objects.bulk_create((
+                Comment(
+                    pk=int(record['id']),
+                    news_id=int(record['news']),
+                    author_id=authors[record['author']],
+                    text=record['text'],
+                    created=parse_datetime(record['created']),
+                )
+                for record in comments
+            ), ignore_conflicts=True)
+
+    def touch(self, records):
+        self.touched.update(
+            int(record['id'] if record['model'] == NEWS else record['news'])
+            for record in records
+        )
+
+    def author_ids(self, usernames):
+        """id пользователей по username, недостающие создаются."""
+        missing = usernames - self.authors.keys()
+        if missing:
+            found = dict(User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'pk'))
+            password = make_password(None)
+            User.objects.bulk_create(
+                User(username=username, password=password)
+                for username in missing - found.keys()
+            )
+            found.update(User.objects.filter(
+                username__in=missing - found.keys()
+            ).values_list('username', 'pk'))
+            self.authors.update(found)
+        return self.authors
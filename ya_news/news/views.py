@@ -1,14 +1,27 @@
+from hashlib import md5
+
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.shortcuts import get_object_or_404
+from django.db.models import OuterRef, Subquery
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django.views import generic
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import condition
 
+from .archive import read_archived
+from .cache import (PageCacheMixin, get_version, make_public,
+                    news_version_key)
 from .forms import CommentForm
-from .models import Comment, News
+from .ingest import pop_written, queue_comment
+from .models import ArchivedNews, Comment, News
+from .pagination import get_comments_page
+from .search import search
 
 
-class NewsList(generic.ListView):
+class NewsList(PageCacheMixin, generic.ListView):
     """Список новостей."""
     model = News
     template_name = 'news/home.html'
@@ -18,32 +31,134 @@ class NewsList(generic.ListView):
         Выводим только несколько последних новостей.
 
         Их количество определяется в настройках проекта.
+        Количество комментариев берём из поля comment_count,
+        сами комментарии не загружаем. Вместо полного текста
+        выводится заранее посчитанный анонс.
         """
-        return self.model.objects.prefetch_related(
-            'comment_set'
-        )[:settings.NEWS_COUNT_ON_HOME_PAGE]
+        return self.model.objects.defer('text')[
+            :settings.NEWS_COUNT_ON_HOME_PAGE
+        ]
+
+
+class NewsSearch(generic.ListView):
+    """Поиск по новостям и комментариям."""
+    template_name = 'news/search.html'
+    context_object_name = 'results'
+
+    def get_query(self):
+        return self.request.GET.get('q', '').strip()
+
+    def get_queryset(self):
+        return search(self.get_query())
+
+    def get_paginate_by(self, queryset):
+        return settings.NEWS_SEARCH_RESULTS_ON_PAGE
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.get_query()
+        return context
+
 
+class CommentPageMixin:
+    """Добавляет в контекст страницу комментариев новости."""
 
-class NewsDetail(generic.DetailView):
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        comments, next_cursor = get_comments_page(
+            self.object, self.kwargs.get('cursor')
+        )
+        context['comments'] = comments
+        context['next_cursor'] = next_cursor
+        return context
+
+
+class NewsPageCacheMixin(PageCacheMixin):
+    """Страницы новости сбрасываются вместе с версией этой новости."""
+
+    def get_version_keys(self):
+        return (news_version_key(self.kwargs['pk']),)
+
+
+class NewsDetail(NewsPageCacheMixin, CommentPageMixin, generic.DetailView):
+    """
+    Новость и первая страница комментариев к ней.
+
+    Страница одинакова для всех пользователей, форму комментария
+    и ссылки на свои комментарии подставляет NewsViewer.
+    """
     model = News
     template_name = 'news/detail.html'
+    shared_page = True
 
-    def get_object(self, queryset=None):
-        obj = get_object_or_404(
-            self.model.objects.prefetch_related('comment_set__author'),
-            pk=self.kwargs['pk']
-        )
-        return obj
+
+class NewsArchived(NewsPageCacheMixin, generic.DetailView):
+    """
+    Новость, перенесённая в архив командой archive_news: текст
+    и первые комментарии из файла архива, без формы комментария.
+    """
+    model = ArchivedNews
+    template_name = 'news/archived.html'
+    context_object_name = 'archived'
+    shared_page = True
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        if self.request.user.is_authenticated:
-            context['form'] = CommentForm()
+        context['news'], context['comments'] = read_archived(
+            self.object, settings.COMMENTS_COUNT_ON_DETAIL_PAGE
+        )
         return context
 
 
+class NewsComments(
+        NewsPageCacheMixin, CommentPageMixin, generic.DetailView
+):
+    """Следующие страницы комментариев, начиная с курсора."""
+    model = News
+    template_name = 'news/comments.html'
+    shared_page = True
+
+
+@method_decorator(never_cache, name='dispatch')
+class NewsViewer(generic.View):
+    """
+    Части страницы новости, которые зависят от пользователя:
+    навигация, форма комментария с CSRF-токеном, id его комментариев
+    и его комментарии, которые ещё ждут записи в базу.
+    """
+
+    def get(self, request, pk):
+        user = request.user
+        data = {
+            'nav': render_to_string(
+                'includes/user_nav.html', request=request
+            ),
+            'form': '',
+            'own_comments': [],
+            'pending': '',
+        }
+        if user.is_authenticated:
+            data['form'] = render_to_string(
+                'news/includes/comment_form.html',
+                {'news': {'pk': pk}, 'form': CommentForm()},
+                request=request,
+            )
+            data['own_comments'] = list(Comment.objects.filter(
+                news_id=pk, author=user
+            ).values_list('pk', flat=True))
+            pending = pop_written(request, pk)
+            if pending:
+                data['pending'] = render_to_string(
+                    'news/includes/pending_comments.html',
+                    {'comments': pending},
+                    request=request,
+                )
+        return JsonResponse(data)
+
+
 class NewsComment(
         LoginRequiredMixin,
+        CommentPageMixin,
         generic.detail.SingleObjectMixin,
         generic.FormView
 ):
@@ -56,26 +171,81 @@ class NewsComment(
         return super().post(request, *args, **kwargs)
 
     def form_valid(self, form):
+        """
+        С COMMENT_INGESTION комментарий ставится в очередь на запись,
+        а автор видит его на странице новости до записи в базу.
+        """
         comment = form.save(commit=False)
         comment.news = self.object
         comment.author = self.request.user
-        comment.save()
+        if settings.COMMENT_INGESTION:
+            queue_comment(self.request, comment)
+        else:
+            comment.save()
         return super().form_valid(form)
 
     def get_success_url(self):
-        post = self.get_object()
-        return reverse('news:detail', kwargs={'pk': post.pk}) + '#comments'
+        return reverse(
+            'news:detail', kwargs={'pk': self.object.pk}
+        ) + '#comments'
+
+
+def get_news_state(pk):
+    """
+    Состояние новости для ETag: дата новости, время последнего
+    комментария и их количество одним запросом, без рендеринга страницы.
+    """
+    last_comment = Comment.objects.filter(
+        news=OuterRef('pk')
+    ).order_by('-created').values('created')[:1]
+    return News.objects.filter(pk=pk).annotate(
+        last_comment=Subquery(last_comment)
+    ).values('date', 'comment_count', 'last_comment').first()
+
+
+def news_etag(request, pk, **kwargs):
+    """
+    ETag страницы новости.
+
+    Правка комментария не меняет ни дату, ни количество комментариев,
+    поэтому учитываем и версию новости из кэша страниц. Страница
+    одинакова для всех пользователей, и ETag тоже.
+
+    Last-Modified страница не отдаёт: правка или удаление комментария
+    не сдвигают вперёд ни одну дату, и проверка по If-Modified-Since
+    отвечала бы 304 на изменённую страницу.
+    """
+    state = get_news_state(pk)
+    if state is None:
+        return None
+    raw = ':'.join(str(part) for part in (
+        state['date'],
+        state['last_comment'],
+        state['comment_count'],
+        get_version(news_version_key(pk)),
+    ))
+    return md5(raw.encode()).hexdigest()
 
 
 class NewsDetailView(generic.View):
+    """Страница новости: GET показывает её, POST добавляет комментарий."""
+    detail_view = staticmethod(
+        condition(etag_func=news_etag)(NewsDetail.as_view())
+    )
+    comment_view = staticmethod(NewsComment.as_view())
+    archived_view = staticmethod(NewsArchived.as_view())
 
     def get(self, request, *args, **kwargs):
-        view = NewsDetail.as_view()
-        return view(request, *args, **kwargs)
+        try:
+            response = self.detail_view(request, *args, **kwargs)
+        except Http404:
+            return self.archived_view(request, *args, **kwargs)
+        if response.status_code == 304:
+            make_public(response)
+        return response
 
     def post(self, request, *args, **kwargs):
-        view = NewsComment.as_view()
-        return view(request, *args, **kwargs)
+        return self.comment_view(request, *args, **kwargs)
 
 
 class CommentBase(LoginRequiredMixin):
@@ -83,14 +253,20 @@ class CommentBase(LoginRequiredMixin):
     model = Comment
 
     def get_success_url(self):
-        comment = self.get_object()
         return reverse(
-            'news:detail', kwargs={'pk': comment.news.pk}
+            'news:detail', kwargs={'pk': self.object.news_id}
         ) + '#comments'
 
     def get_queryset(self):
-        """Пользователь может работать только со своими комментариями."""
-        return self.model.objects.filter(author=self.request.user)
+        """
+        Пользователь может работать только со своими комментариями.
+
+        Новость подгружаем сразу: её заголовок есть на страницах
+        редактирования и удаления.
+        """
+        return self.model.objects.filter(
+            author=self.request.user
+        ).select_related('news')
 
 
 class CommentUpdate(CommentBase, generic.UpdateView):
@@ -100,5 +276,8 @@ class CommentUpdate(CommentBase, generic.UpdateView):
 
 
 class CommentDelete(CommentBase, generic.DeleteView):
-    """Удаление комментария."""
+    """
+    Удаление комментария. У комментария нет зависимых строк, поэтому
+    он удаляется сразу, без фонового задания news.purge.
+    """
     template_name = 'news/delete.html'
@@ -1,9 +1,13 @@
+import sys
 from pathlib import Path
 
 from django.urls import reverse_lazy
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Общие модули обоих проектов лежат в пакете ya_common рядом с ними.
+sys.path.append(str(BASE_DIR.parent))
+
 SECRET_KEY = 'django-insecure-7)dgs++2!#==aye4rd=5)c)bw0eokiyqx0hts6#t80!$c&$s+('
 
 DEBUG = True
@@ -21,6 +25,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ya_common.middleware.ServerTimingMiddleware',
+    'ya_common.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,6 +64,16 @@ DATABASES = {
     }
 }
 
+# PRAGMA для каждого нового соединения SQLite, см. профиль
+# settings_production.
+SQLITE_PRAGMAS = {}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 AUTH_PASSWORD_VALIDATORS = []
 
@@ -79,4 +95,70 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = reverse_lazy('users:login')
 LOGIN_REDIRECT_URL = reverse_lazy('news:home')
 
+# Отложенная запись комментариев пачками, см. news.ingest.
+COMMENT_INGESTION = False
+COMMENT_INGESTION_BATCH_SIZE = 100
+# Раз в сколько секунд фоновый поток записывает очередь;
+# None — потока нет: полную пачку записывает запрос, который
+# её дополнил, остаток записывается при завершении процесса.
+COMMENT_INGESTION_FLUSH_INTERVAL = 0.5
+# Путь файлов очереди, к нему добавляется pid процесса;
+# None — очередь только в памяти.
+COMMENT_INGESTION_SPOOL = None
+
+# Кэш пользователя для ya_common.auth.CachedAuthenticationMiddleware,
+# включается профилем yanews.settings_cached.
+USER_CACHE_ALIAS = 'default'
+USER_CACHE_TIMEOUT = 60 * 5
+
 NEWS_COUNT_ON_HOME_PAGE = 10
+
+COMMENTS_COUNT_ON_DETAIL_PAGE = 50
+
+NEWS_SEARCH_RESULTS_ON_PAGE = 20
+
+# Сколько последних комментариев редактируется на странице новости
+# в админке, остальные — в списке комментариев.
+ADMIN_INLINE_COMMENTS = 20
+
+# Удаление новостей и пользователей с комментариями, см. news.purge.
+# Сколько комментариев удалять в одной транзакции.
+PURGE_BATCH_SIZE = 200
+# Новость с большим числом комментариев админка удаляет в фоне.
+PURGE_THRESHOLD = 1000
+# False — задание выполняется сразу, в том же потоке.
+PURGE_IN_BACKGROUND = True
+# Выполняемое задание без новой пачки дольше PURGE_LEASE секунд
+# считается прерванным, его продолжает run_purge_jobs.
+PURGE_LEASE = 5 * 60
+
+# Новости старше NEWS_RETENTION_DAYS дней команда archive_news переносит
+# из таблиц в сжатые файлы в NEWS_ARCHIVE_DIR, см. news.archive.
+NEWS_RETENTION_DAYS = 2 * 365
+NEWS_ARCHIVE_DIR = BASE_DIR / 'archive'
+# Файл архива закрывается, когда вырастает больше этого размера.
+NEWS_ARCHIVE_SEGMENT_SIZE = 64 * 1024 * 1024
+
+# Дополнительный словарь запрещённых слов: по одному слову на строку.
+BAD_WORDS_FILE = None
+# Как часто, в секундах, перечитывать словарь из файла и таблицы BadWord.
+BAD_WORDS_RELOAD_INTERVAL = 60
+
+# Кэш страниц новостей для анонимных пользователей.
+NEWS_PAGE_CACHE_ALIAS = 'default'
+NEWS_PAGE_CACHE_TIMEOUT = 60 * 15
+# Сколько секунд общий кэш или CDN может отдавать страницу новости
+# без проверки ETag.
+NEWS_PAGE_MAX_AGE = 60
+
+# Замеры запросов: заголовок Server-Timing и агрегаты по маршрутам.
+PERFORMANCE_INSTRUMENTATION = False
+# Доля запросов, для которых пиковая память замеряется tracemalloc.
+PERFORMANCE_MEMORY_SAMPLE_RATE = 0.01
+# Сколько последних запросов маршрута входит в скользящие агрегаты.
+PERFORMANCE_WINDOW = 1000
+
+# Метрики в формате Prometheus на странице /metrics/.
+METRICS_ENABLED = False
+# Директория для mmap-файлов метрик, общих для всех процессов.
+METRICS_MULTIPROCESS_DIR = None
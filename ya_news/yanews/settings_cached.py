@@ -0,0 +1,20 @@
+"""
+Профиль настроек для аутентифицированного трафика:
+сессии cached_db и пользователь из кэша вместо двух запросов к базе
+перед каждым view. Если процессов несколько, CACHES должен указывать
+на общий для них кэш, иначе сброс записи пользователя увидит только
+процесс, который его сохранил.
+
+DJANGO_SETTINGS_MODULE=yanews.settings_cached
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import MIDDLEWARE
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+MIDDLEWARE = [
+    'ya_common.auth.CachedAuthenticationMiddleware'
+    if middleware == 'django.contrib.auth.middleware.AuthenticationMiddleware'
+    else middleware
+    for middleware in MIDDLEWARE
+]
@@ -0,0 +1,32 @@
+"""
+Профиль настроек SQLite для нагрузки с параллельными запросами.
+
+WAL позволяет читать во время записи, synchronous=NORMAL в режиме WAL
+не теряет целостность базы, а busy_timeout заставляет писателя ждать
+блокировку, а не сразу получать «database is locked». Соединения
+живут CONN_MAX_AGE секунд и переиспользуются между запросами одного
+потока, поэтому PRAGMA выполняются при открытии соединения, а не на
+каждый запрос.
+
+DJANGO_SETTINGS_MODULE=yanews.settings_production
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+DATABASES = {
+    'default': {
+        **DATABASES['default'],
+        'CONN_MAX_AGE': 60,
+    },
+}
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    # Отображение файла базы в память, до 256 МиБ.
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер кэша страниц в КиБ, здесь 64 МиБ.
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
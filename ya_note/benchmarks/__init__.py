@@ -0,0 +1,14 @@
+"""
+Бенчмарки проекта YaNote.
+
+Замеры маршрутов запускаются из директории ya_note: pytest benchmarks
+"""
+import os
+
+import django
+
+
+def setup():
+    """Настраивает Django для запуска бенчмарка вне manage.py."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yanote.settings')
+    django.setup()
@@ -0,0 +1,99 @@
+"""
+Замеры маршрутов YaNote на нескольких масштабах данных.
+
+Запуск из директории ya_note: pytest benchmarks
+Масштабы задаются BENCHMARK_SCALES, число запросов — BENCHMARK_REQUESTS,
+остальные настройки описаны в ya_common.benchmarks.
+"""
+from io import StringIO
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count
+from django.test import Client, TestCase
+
+from notes.models import Note
+from notes.tests.fixtures import (AUTHOR_URLS, ONLY_AUTH_URLS, PUBLIC_URLS,
+                                  SLUG, URL_NOTES_ADD, URL_NOTES_SEARCH,
+                                  URL_USERS_LOGOUT)
+from ya_common.benchmarks import Results, measure, scales
+
+User = get_user_model()
+
+# Частое слово из seed_notes, пара слов и слово, которого нет в заметках.
+SEARCH_QUERIES = ('план', 'книга отпуск', 'иголка')
+
+
+class TestRouteLatency(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = Results(Path(__file__).resolve().parent)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.results.save()
+        super().tearDownClass()
+
+    def seed(self, scale):
+        """
+        Заполняет базу заметками и возвращает автора с наибольшим
+        их количеством; ему же принадлежит заметка SLUG из fixtures.
+        """
+        call_command(
+            'seed_notes',
+            users=max(scale // 100, 1),
+            notes=scale,
+            seed=scale,
+            stdout=StringIO(),
+        )
+        top = Note.objects.filter(
+            author__username__startswith=f'seed{scale}_'
+        ).values('author').annotate(total=Count('pk')).order_by(
+            '-total'
+        ).first()
+        author = User.objects.get(pk=top['author'])
+        Note.objects.filter(slug=SLUG).delete()
+        Note.objects.create(
+            title='Заголовок', text='Текст', slug=SLUG, author=author
+        )
+        return author
+
+    def test_routes(self):
+        """
+        Время ответа маршрутов не выходит за пределы сохранённой базы
+        """
+        for scale in scales():
+            client = Client()
+            client.force_login(self.seed(scale))
+            # Выход из учётной записи меряем последним.
+            urls = [
+                url for url in PUBLIC_URLS + ONLY_AUTH_URLS + AUTHOR_URLS
+                if url != URL_USERS_LOGOUT
+            ]
+            for url in urls:
+                with self.subTest(scale=scale, url=url):
+                    result = measure(client, url)
+                    self.assertEqual(self.results.add(url, scale, result), [])
+            for query in SEARCH_QUERIES:
+                url = f'{URL_NOTES_SEARCH}?{urlencode({"q": query})}'
+                with self.subTest(scale=scale, url=url):
+                    result = measure(client, url)
+                    self.assertEqual(self.results.add(url, scale, result), [])
+            with self.subTest(scale=scale, url=URL_NOTES_ADD, method='post'):
+                result = measure(
+                    client, URL_NOTES_ADD, method='post',
+                    data={'title': 'Заголовок', 'text': 'Текст'},
+                )
+                self.assertEqual(
+                    self.results.add(f'{URL_NOTES_ADD} POST', scale, result),
+                    []
+                )
+            with self.subTest(scale=scale, url=URL_USERS_LOGOUT):
+                result = measure(client, URL_USERS_LOGOUT)
+                self.assertEqual(
+                    self.results.add(URL_USERS_LOGOUT, scale, result), []
+                )
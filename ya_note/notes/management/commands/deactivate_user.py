@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from notes.models import PurgeJob
+from notes.purge import run_job
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Отключает пользователя: он больше не может войти. С --purge '
+        'удаляет его заметки пачками и затем самого пользователя. '
+        'Прерванное удаление продолжает run_purge_jobs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--purge', action='store_true')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Сколько заметок удалять в одной транзакции, '
+                 'по умолчанию PURGE_BATCH_SIZE.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(
+                f'Пользователь {options["username"]} не найден.'
+            )
+        user.is_active = False
+        user.save(update_fields=('is_active',))
+        self.stdout.write(f'Пользователь {user} отключён.')
+        if not options['purge']:
+            return
+        job = PurgeJob.objects.create(target_id=user.pk, target=str(user))
+        run_job(job, progress=self.report, batch_size=options['batch_size'])
+        self.stdout.write(f'Пользователь {user} удалён.')
+
+    def report(self, job):
+        self.stdout.write(f'Удалено заметок: {job.deleted} из {job.total}')
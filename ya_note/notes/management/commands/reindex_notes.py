@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from notes.models import Note
+from notes.search import index_notes
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Заново строит поисковый индекс заметок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--author',
+            help='Переиндексировать только заметки этого пользователя.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько заметок индексировать в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        notes = Note.objects.only('id', 'author_id', 'title', 'text')
+        if options['author'] is not None:
+            try:
+                author = User.objects.get(username=options['author'])
+            except User.DoesNotExist:
+                raise CommandError(
+                    f'Пользователь {options["author"]} не найден.'
+                )
+            notes = notes.filter(author=author)
+        batch_size = options['batch_size']
+        last_pk = 0
+        indexed = 0
+        while True:
+            batch = list(
+                notes.filter(pk__gt=last_pk).order_by('pk')[:batch_size]
+            )
+            if not batch:
+                break
+            index_notes(batch)
+            indexed += len(batch)
+            last_pk = batch[-1].pk
+        self.stdout.write(f'Проиндексировано заметок: {indexed}')
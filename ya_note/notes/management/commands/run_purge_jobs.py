@@ -0,0 +1,8 @@
+from notes.models import PurgeJob
+from notes.purge import run_job
+from ya_common.purge import RunPurgeJobsCommand
+
+
+class Command(RunPurgeJobsCommand):
+    job_model = PurgeJob
+    run_job = staticmethod(run_job)
@@ -0,0 +1,116 @@
+import json
+from functools import lru_cache
+
+from django.db import connection, transaction
+from django.db.models import Max
+from pytils.translit import slugify
+
+from notes.models import Note, NoteTerm
+from notes.search import text_frequencies, title_frequencies
+from ya_common.seeding import SeedCommand, zipf_weights
+
+WORDS = (
+    'заметка', 'план', 'покупки', 'идея', 'встреча', 'задача', 'книга',
+    'фильм', 'рецепт', 'отпуск', 'проект', 'отчёт', 'звонок', 'письмо',
+    'спорт', 'учёба', 'дом', 'работа', 'подарок', 'список', 'курс',
+    'код', 'тест', 'релиз', 'праздник', 'поездка', 'ремонт', 'врач',
+)
+TEXT_POOL_SIZE = 10000
+TERMS_SQL = (
+    'INSERT INTO {table} (author_id, term, note_id, frequency) '
+    'SELECT %s, key, %s, value FROM json_each(%s)'
+)
+
+
+def sentence(rng, min_words, max_words):
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return ' '.join(words).capitalize()
+
+
+class Command(SeedCommand):
+    help = (
+        'Заполняет базу большим набором заметок и пользователей. '
+        'При одинаковом --seed данные одинаковы, повторный запуск '
+        'ничего не дублирует.'
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--notes', type=int, default=1000000)
+
+    def handle(self, *args, **options):
+        self.prepare(options)
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'], options['seed'])
+            last_pk = Note.objects.aggregate(last=Max('pk'))['last'] or 0
+            self.create_notes(options['notes'], options['seed'], user_ids)
+            # Вставка идёт в обход сигналов, индекс строится одним
+            # проходом по новым заметкам.
+            self.index_notes(last_pk)
+        self.stdout.write(
+            f'Создано: пользователей {len(user_ids)}, '
+            f'заметок {options["notes"]}'
+        )
+
+    def create_notes(self, count, seed, user_ids):
+        """
+        Заметки распределены по авторам по закону Ципфа: у немногих
+        авторов десятки тысяч заметок, у большинства — единицы.
+
+        Note.save не вызывается: slug транслитерируется один раз
+        на каждый из заголовков, а уникальность даёт суффикс с --seed
+        и номером. Заметки, чей slug уже занят, пропускаются.
+        """
+        if not user_ids:
+            return
+        titles = list({
+            sentence(self.rng, 1, 3) for _ in range(TEXT_POOL_SIZE)
+        })
+        titles.sort()
+        slugs = {title: slugify(title)[:60] for title in titles}
+        texts = [sentence(self.rng, 5, 60) for _ in range(TEXT_POOL_SIZE)]
+        authors = self.rng.sample(user_ids, len(user_ids))
+        author_weights = zipf_weights(len(authors))
+        self.insert(
+            Note,
+            ('title', 'text', 'slug', 'author'),
+            ((title, text, f'{slugs[title]}-{seed}-{index}', author_id)
+             for index, (title, text, author_id) in enumerate(zip(
+                 self.choices(titles, None, count),
+                 self.choices(texts, None, count),
+                 self.choices(authors, author_weights, count),
+             ))),
+        )
+
+    def index_notes(self, last_pk):
+        """
+        Строки NoteTerm для заметок с id больше last_pk. Заголовки
+        и тексты берутся из небольших наборов, поэтому слова каждого
+        из них считаются один раз.
+        """
+        text_terms = lru_cache(maxsize=None)(text_frequencies)
+        title_terms = lru_cache(maxsize=None)(title_frequencies)
+        notes = Note.objects.filter(pk__gt=last_pk).values_list(
+            'pk', 'author_id', 'title', 'text'
+        ).iterator(chunk_size=self.batch_size)
+        frequencies = (
+            (pk, author_id, text_terms(text) + title_terms(title))
+            for pk, author_id, title, text in notes
+        )
+        if connection.vendor == 'sqlite':
+            # Слов в десятки раз больше, чем заметок: база получает
+            # по строке на заметку, а слова разворачивает json_each.
+            self.execute_rows(NoteTerm, TERMS_SQL.format(
+                table=connection.ops.quote_name(NoteTerm._meta.db_table)
+            ), (
+                (author_id, pk, json.dumps(terms, ensure_ascii=False))
+                for pk, author_id, terms in frequencies
+            ))
+            return
+        self.insert(
+            NoteTerm,
+            ('author', 'term', 'note', 'frequency'),
+            ((author_id, term, pk, frequency)
+             for pk, author_id, terms in frequencies
+             for term, frequency in terms.items()),
+        )
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notes', '0002_note_author_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50, verbose_name='Слово')),
+                ('frequency', models.PositiveIntegerField(verbose_name='Вес слова в заметке')),
+                ('author', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='notes.note')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='noteterm',
+            index=models.Index(fields=['author', 'term', 'note', 'frequency'], name='noteterm_author_term_idx'),
+        ),
+    ]
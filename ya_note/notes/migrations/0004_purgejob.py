@@ -0,0 +1,34 @@
+# Generated by Django 3.2.15 on 2026-10-18 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0003_noteterm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurgeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_id', models.PositiveBigIntegerField(verbose_name='id объекта')),
+                ('target', models.CharField(blank=True, max_length=150, verbose_name='Объект')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Состояние')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('heartbeat', models.DateTimeField(blank=True, null=True, verbose_name='Последняя пачка')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Заметок всего')),
+                ('deleted', models.PositiveIntegerField(default=0, verbose_name='Удалено заметок')),
+            ],
+            options={
+                'verbose_name': 'Удаление пользователя',
+                'verbose_name_plural': 'Удаления пользователей',
+                'ordering': ('-pk',),
+                'abstract': False,
+            },
+        ),
+    ]
@@ -1,7 +1,13 @@
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
 
-from pytils.translit import slugify
+from ya_common.purge import PurgeJobBase
+
+from .slugs import allocate_slug
+
+# Сколько раз подбирать slug заново, если параллельный запрос
+# успел занять выбранный.
+SLUG_ALLOCATION_ATTEMPTS = 3
 
 
 class Note(models.Model):
@@ -28,11 +34,76 @@ class Note(models.Model):
         on_delete=models.CASCADE,
     )
 
+    class Meta:
+        indexes = (
+            # Список заметок листается по ключу (author, id).
+            models.Index(
+                fields=('author', 'id'), name='note_author_id_idx'
+            ),
+        )
+
     def __str__(self):
         return self.title
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            max_slug_length = self._meta.get_field('slug').max_length
-            self.slug = slugify(self.title)[:max_slug_length]
-        super().save(*args, **kwargs)
+        """
+        Пустой slug подбирается по заголовку: первый свободный из серии
+        base, base-2, base-3… Гонку с параллельной вставкой решает
+        уникальный индекс, после конфликта slug подбирается заново.
+        """
+        if self.slug:
+            return super().save(*args, **kwargs)
+        others = type(self).objects.exclude(pk=self.pk)
+        for attempt in range(1, SLUG_ALLOCATION_ATTEMPTS + 1):
+            self.slug = allocate_slug(others, self.title)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                self.slug = ''
+                if attempt == SLUG_ALLOCATION_ATTEMPTS:
+                    raise
+
+
+class NoteTerm(models.Model):
+    """
+    Запись обратного индекса для поиска по заметкам: слово и сколько
+    раз оно встречается в заметке. Индекс разбит по авторам, поиск
+    читает только строки своего автора.
+    """
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    term = models.CharField('Слово', max_length=50)
+    note = models.ForeignKey(Note, on_delete=models.CASCADE)
+    frequency = models.PositiveIntegerField('Вес слова в заметке')
+
+    class Meta:
+        indexes = (
+            # Покрывающий индекс: поиск не обращается к самой таблице.
+            models.Index(
+                fields=('author', 'term', 'note', 'frequency'),
+                name='noteterm_author_term_idx',
+            ),
+        )
+
+    def __str__(self):
+        return self.term
+
+
+class PurgeJob(PurgeJobBase):
+    """
+    Удаление пользователя вместе с заметками небольшими пачками,
+    см. notes.purge.
+    """
+    total = models.PositiveIntegerField('Заметок всего', default=0)
+    deleted = models.PositiveIntegerField('Удалено заметок', default=0)
+
+    class Meta(PurgeJobBase.Meta):
+        verbose_name_plural = 'Удаления пользователей'
+        verbose_name = 'Удаление пользователя'
+
+    def __str__(self):
+        return f'Пользователь {self.target or self.target_id}'
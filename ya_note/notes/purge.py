@@ -0,0 +1,32 @@
+"""
+Удаление пользователя вместе с заметками.
+
+Задание PurgeJob удаляет заметки пачками по PURGE_BATCH_SIZE, каждая
+пачка — короткая транзакция, слова поискового индекса удаляются
+каскадом вместе с ней. Пользователь удаляется последним. Пачки,
+захват задания и прогресс — в ya_common.purge: прерванное задание
+продолжает команда run_purge_jobs.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from ya_common import purge
+
+from .models import Note
+
+User = get_user_model()
+
+
+def run_job(job, progress=None, batch_size=None):
+    """
+    Удаляет заметки пользователя пачками, затем его самого.
+    progress вызывается с заданием после каждой пачки. Возвращает
+    None, если задание выполняет другой процесс.
+    """
+    return purge.run_job(
+        job,
+        Note.objects.filter(author_id=job.target_id).order_by('pk'),
+        User.objects.filter(pk=job.target_id),
+        batch_size or settings.PURGE_BATCH_SIZE,
+        progress,
+    )
@@ -0,0 +1,138 @@
+"""
+Поиск по заметкам пользователя через обратный индекс NoteTerm.
+
+Заметка разбивается на слова, для каждого слова хранится его вес
+в заметке. Ранжирование — tf-idf внутри заметок одного автора.
+"""
+import math
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Note, NoteTerm
+
+TOKEN_RE = re.compile(r'\w+')
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = NoteTerm._meta.get_field('term').max_length
+# Слово из заголовка весит как несколько слов из текста.
+TITLE_WEIGHT = 3
+SNIPPET_WORDS = 30
+
+
+def normalize(word):
+    return word.lower().replace('ё', 'е')[:MAX_TERM_LENGTH]
+
+
+def tokenize(text):
+    """Слова текста в нормальной форме, слишком короткие отброшены."""
+    return [
+        normalize(word) for word in TOKEN_RE.findall(text)
+        if len(word) >= MIN_TERM_LENGTH
+    ]
+
+
+def text_frequencies(text):
+    return Counter(tokenize(text))
+
+
+def title_frequencies(title):
+    return Counter({
+        term: count * TITLE_WEIGHT
+        for term, count in Counter(tokenize(title)).items()
+    })
+
+
+def term_frequencies(note):
+    return text_frequencies(note.text) + title_frequencies(note.title)
+
+
+def index_notes(notes):
+    """
+    Переиндексирует заметки: старые слова удаляются одним запросом,
+    новые вставляются пачкой.
+    """
+    notes = list(notes)
+    with transaction.atomic():
+        NoteTerm.objects.filter(note__in=notes).delete()
+        NoteTerm.objects.bulk_create(
+            NoteTerm(
+                author_id=note.author_id,
+                term=term,
+                note=note,
+                frequency=frequency,
+            )
+            for note in notes
+            for term, frequency in term_frequencies(note).items()
+        )
+
+
+def search_notes(author, query):
+    """
+    Заметки автора, содержащие все слова запроса, по убыванию tf-idf.
+
+    Возвращает QuerySet словарей {'note', 'score'}: его можно отдать
+    в Paginator, тогда в базу уходят только count() и нужная страница.
+    Все запросы читают покрывающий индекс (author, term, note, frequency)
+    и не касаются строк других авторов.
+    """
+    terms = sorted(set(tokenize(query)))
+    postings = NoteTerm.objects.filter(author=author, term__in=terms)
+    if not terms:
+        return postings.none().values('note')
+    document_frequencies = dict(
+        postings.order_by().values('term').annotate(
+            total=Count('note')
+        ).values_list('term', 'total')
+    )
+    if len(document_frequencies) < len(terms):
+        return postings.none().values('note')
+    notes_count = Note.objects.filter(author=author).count()
+    idf = Case(
+        *(
+            When(term=term, then=Value(
+                math.log(1 + notes_count / total)
+            ))
+            for term, total in document_frequencies.items()
+        ),
+        output_field=FloatField(),
+    )
+    return postings.order_by().values('note').annotate(
+        score=Sum(F('frequency') * idf, output_field=FloatField()),
+        matched=Count('term'),
+    ).filter(matched=len(terms)).order_by('-score', '-note')
+
+
+def highlight(text, terms, limit=None):
+    """
+    Экранирует текст и выделяет слова запроса. С limit возвращает
+    фрагмент из limit слов вокруг первого совпадения.
+    """
+    words = list(TOKEN_RE.finditer(text))
+    start, end = 0, len(text)
+    if limit is not None and len(words) > limit:
+        first = next((
+            index for index, word in enumerate(words)
+            if normalize(word.group()) in terms
+        ), 0)
+        first = max(0, min(first - limit // 3, len(words) - limit))
+        start = words[first].start()
+        end = words[first + limit - 1].end()
+    parts = ['…'] if start > 0 else []
+    position = start
+    for word in words:
+        if word.start() < start or word.end() > end:
+            continue
+        parts.append(escape(text[position:word.start()]))
+        if normalize(word.group()) in terms:
+            parts.append(f'<mark>{escape(word.group())}</mark>')
+        else:
+            parts.append(escape(word.group()))
+        position = word.end()
+    parts.append(escape(text[position:end]))
+    if end < len(text):
+        parts.append('…')
+    return mark_safe(''.join(parts))
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ya_common.auth import forget_user
+
+from .models import Note
+from .search import index_notes
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Note)
+def index_note(sender, instance, **kwargs):
+    """
+    Обновляем слова заметки в поисковом индексе.
+    При удалении заметки её слова удаляет каскад внешнего ключа.
+    """
+    index_notes([instance])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Пользователь изменился: убираем его из кэша."""
+    forget_user(instance.pk)
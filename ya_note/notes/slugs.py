@@ -0,0 +1,87 @@
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+from django.db.models import Q
+from django.db.models.functions import Length
+from pytils.translit import slugify
+
+SLUG_MAX_LENGTH = 100
+SLUGIFY_CACHE_SIZE = 10000
+SUFFIX_SEPARATOR = '-'
+# slug для заголовков, от которых после транслитерации ничего не осталось.
+DEFAULT_SLUG = 'note'
+# Место под суффикс «-N» у длинных slug: base-2 и далее строятся
+# от укороченной основы, чтобы вся серия помещалась в поле.
+SUFFIX_MAX_LENGTH = 8
+# «:» следует сразу за «9»: диапазон [base-0, base-:) покрывает
+# все slug вида base-N и читается по уникальному индексу.
+SUFFIX_RANGE_START = '0'
+SUFFIX_RANGE_END = ':'
+
+
+@lru_cache(maxsize=SLUGIFY_CACHE_SIZE)
+def transliterate(title):
+    """Транслитерирует заголовок в slug, результат запоминается."""
+    return slugify(title)[:SLUG_MAX_LENGTH] or DEFAULT_SLUG
+
+
+def stem(base):
+    return base[:SLUG_MAX_LENGTH - SUFFIX_MAX_LENGTH] + SUFFIX_SEPARATOR
+
+
+def with_suffix(base, number):
+    """N-й slug серии: base, затем base-2, base-3…"""
+    if number == 1:
+        return base
+    return f'{stem(base)}{number}'
+
+
+def suffix_number(base, slug):
+    """Номер slug в серии base; None — slug не из серии."""
+    if slug == base:
+        return 1
+    match = re.fullmatch(re.escape(stem(base)) + r'([1-9]\d*)', slug)
+    return int(match.group(1)) if match else None
+
+
+def last_number(queryset, base):
+    """
+    Наибольший занятый номер в серии base одним запросом.
+
+    Кандидаты берутся диапазоном по уникальному индексу slug, а самый
+    длинный и затем наибольший по алфавиту slug несёт наибольший номер.
+    """
+    candidates = queryset.filter(
+        Q(slug=base)
+        | Q(slug__gte=stem(base) + SUFFIX_RANGE_START,
+            slug__lt=stem(base) + SUFFIX_RANGE_END)
+    ).order_by(Length('slug').desc(), '-slug').values_list('slug', flat=True)
+    for slug in candidates.iterator():
+        number = suffix_number(base, slug)
+        if number is not None:
+            return number
+    return 0
+
+
+def allocate_slug(queryset, title):
+    """Первый свободный slug для заголовка: base, затем base-2, base-3…"""
+    base = transliterate(title)
+    return with_suffix(base, last_number(queryset, base) + 1)
+
+
+def allocate_slugs(queryset, titles):
+    """
+    slug для пачки заголовков: один запрос на каждый различный base,
+    номера внутри пачки раздаются в памяти.
+    """
+    numbers = {}
+    counters = defaultdict(int)
+    slugs = []
+    for title in titles:
+        base = transliterate(title)
+        if base not in numbers:
+            numbers[base] = last_number(queryset, base)
+        counters[base] += 1
+        slugs.append(with_suffix(base, numbers[base] + counters[base]))
+    return slugs
@@ -9,6 +9,9 @@ URL_NOTES_DELETE = reverse('notes:delete', args=(SLUG,))
 URL_NOTES_SUCCESS = reverse('notes:success')
 URL_NOTES_HOME = reverse('notes:home')
 URL_NOTES_DETAIL = reverse('notes:detail', args=(SLUG,))
+URL_NOTES_SEARCH = reverse('notes:search')
+URL_NOTES_EXPORT = reverse('notes:export')
+URL_NOTES_IMPORT = reverse('notes:import')
 
 URL_USERS_LOGIN = reverse('users:login')
 URL_USERS_LOGOUT = reverse('users:logout')
@@ -20,6 +23,9 @@ URL_REDIRECT_LIST = f'{URL_USERS_LOGIN}?next={URL_NOTES_LIST}'
 URL_REDIRECT_DETAIL = f'{URL_USERS_LOGIN}?next={URL_NOTES_DETAIL}'
 URL_REDIRECT_EDIT = f'{URL_USERS_LOGIN}?next={URL_NOTES_EDIT}'
 URL_REDIRECT_DELETE = f'{URL_USERS_LOGIN}?next={URL_NOTES_DELETE}'
+URL_REDIRECT_SEARCH = f'{URL_USERS_LOGIN}?next={URL_NOTES_SEARCH}'
+URL_REDIRECT_EXPORT = f'{URL_USERS_LOGIN}?next={URL_NOTES_EXPORT}'
+URL_REDIRECT_IMPORT = f'{URL_USERS_LOGIN}?next={URL_NOTES_IMPORT}'
 
 REDIRECTS_ANONYM = (
     (URL_NOTES_LIST, URL_REDIRECT_LIST),
@@ -28,6 +34,9 @@ REDIRECTS_ANONYM = (
     (URL_NOTES_DETAIL, URL_REDIRECT_DETAIL),
     (URL_NOTES_EDIT, URL_REDIRECT_EDIT),
     (URL_NOTES_DELETE, URL_REDIRECT_DELETE),
+    (URL_NOTES_SEARCH, URL_REDIRECT_SEARCH),
+    (URL_NOTES_EXPORT, URL_REDIRECT_EXPORT),
+    (URL_NOTES_IMPORT, URL_REDIRECT_IMPORT),
 )
 
 PUBLIC_URLS = (
@@ -41,6 +50,9 @@ ONLY_AUTH_URLS = (
     URL_NOTES_LIST,
     URL_NOTES_SUCCESS,
     URL_NOTES_ADD,
+    URL_NOTES_SEARCH,
+    URL_NOTES_EXPORT,
+    URL_NOTES_IMPORT,
 )
 AUTHOR_URLS = (
     URL_NOTES_DETAIL,
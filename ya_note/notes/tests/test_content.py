@@ -1,10 +1,18 @@
+from http import HTTPStatus
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
 
+from ya_common.auth import user_cache_key
 from notes.forms import NoteForm
 from notes.models import Note
 
-from .fixtures import FORM_URLS, SLUG, URL_NOTES_LIST
+from yanote import settings as project_settings
+from yanote import settings_cached
+
+from .fixtures import (FORM_URLS, SLUG, URL_NOTES_LIST, URL_NOTES_SEARCH,
+                       URL_REDIRECT_LIST)
 
 User = get_user_model()
 
@@ -66,3 +74,163 @@ class TestContent(TestCase):
         self.assertEqual(note.title, self.note.title)
         self.assertEqual(note.slug, self.note.slug)
         self.assertEqual(note.author, self.note.author)
+
+    @override_settings(NOTES_COUNT_ON_LIST_PAGE=2)
+    def test_notes_list_pages(self):
+        """
+        Список листается по параметру after, на каждой странице
+        показано общее число заметок, а текст заметок не загружается
+        """
+        Note.objects.bulk_create(
+            Note(title=f'Заметка {index}', text='Текст',
+                 slug=f'note-{index}', author=self.author)
+            for index in range(3)
+        )
+        expected = list(
+            Note.objects.filter(author=self.author).values_list(
+                'id', flat=True
+            ).order_by('id')
+        )
+        seen = []
+        url = URL_NOTES_LIST
+        while url:
+            response = self.auth_client.get(url)
+            self.assertEqual(response.context['notes_count'], len(expected))
+            page = list(response.context['object_list'])
+            self.assertLessEqual(len(page), 2)
+            for note in page:
+                self.assertIn('text', note.get_deferred_fields())
+            seen.extend(note.id for note in page)
+            next_after = response.context.get('next_after')
+            url = next_after and f'{URL_NOTES_LIST}?after={next_after}'
+        self.assertEqual(seen, expected)
+
+    def test_notes_list_bad_cursor(self):
+        """Некорректный параметр after — это ошибка клиента"""
+        response = self.auth_client.get(f'{URL_NOTES_LIST}?after=abc')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_search_ranked_and_scoped_to_author(self):
+        """
+        Поиск находит только заметки пользователя со всеми словами
+        запроса, совпадение в заголовке выше совпадения в тексте,
+        найденные слова выделены, а HTML экранирован
+        """
+        in_text = Note.objects.create(
+            title='Покупки', text='<b>Купить</b> молоко и хлеб',
+            slug='in-text', author=self.author,
+        )
+        in_title = Note.objects.create(
+            title='Молоко', text='Купить два пакета',
+            slug='in-title', author=self.author,
+        )
+        Note.objects.create(
+            title='Молоко', text='Купить молоко', slug='other-author',
+            author=self.author_two,
+        )
+        Note.objects.create(
+            title='Молоко', text='Без второго слова', slug='one-word',
+            author=self.author,
+        )
+
+        response = self.auth_client.get(
+            URL_NOTES_SEARCH, {'q': 'КУПИТЬ молоко'}
+        )
+        results = response.context['results']
+
+        self.assertEqual(response.context['paginator'].count, 2)
+        self.assertEqual(
+            [result['note'] for result in results], [in_title, in_text]
+        )
+        self.assertEqual(results[0]['title'], '<mark>Молоко</mark>')
+        self.assertEqual(
+            results[1]['snippet'],
+            '&lt;b&gt;<mark>Купить</mark>&lt;/b&gt; <mark>молоко</mark> '
+            'и хлеб',
+        )
+
+    def test_search_snippet_is_limited(self):
+        """Из длинной заметки показывается фрагмент вокруг совпадения"""
+        words = [f'слово{index}' for index in range(100)]
+        words[70] = 'иголка'
+        Note.objects.create(title='Длинная', text=' '.join(words),
+                            slug='long', author=self.author)
+
+        response = self.auth_client.get(URL_NOTES_SEARCH, {'q': 'иголка'})
+        snippet = response.context['results'][0]['snippet']
+
+        self.assertIn('<mark>иголка</mark>', snippet)
+        self.assertTrue(snippet.startswith('…'))
+        self.assertTrue(snippet.endswith('…'))
+        self.assertNotIn('слово0 ', snippet)
+
+
+@override_settings(
+    SESSION_ENGINE=settings_cached.SESSION_ENGINE,
+    MIDDLEWARE=settings_cached.MIDDLEWARE,
+)
+class TestCachedAuthentication(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Тестовый автор')
+        Note.objects.create(
+            title='Заголовок', text='Текст', slug=SLUG, author=cls.author
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.auth_client = Client()
+        self.auth_client.force_login(self.author)
+
+    def test_notes_list_query_count(self):
+        """
+        С профилем settings_cached сессия и пользователь берутся
+        из кэша: список заметок обходится без двух запросов из пяти
+        """
+        with override_settings(
+            SESSION_ENGINE='django.contrib.sessions.backends.db',
+            MIDDLEWARE=project_settings.MIDDLEWARE,
+        ):
+            client = Client()
+            client.force_login(self.author)
+            with self.assertNumQueries(5):
+                client.get(URL_NOTES_LIST)
+
+        self.auth_client.get(URL_NOTES_LIST)
+        with self.assertNumQueries(3):
+            self.auth_client.get(URL_NOTES_LIST)
+
+    def test_user_cache_invalidated(self):
+        """
+        Сохранение пользователя сбрасывает кэш, а смена пароля
+        завершает сессию, даже если пользователь был в кэше
+        """
+        self.auth_client.get(URL_NOTES_LIST)
+        self.assertIsNotNone(cache.get(user_cache_key(self.author.pk)))
+
+        self.author.set_password('new-password')
+        self.author.save()
+        self.assertIsNone(cache.get(user_cache_key(self.author.pk)))
+
+        response = self.auth_client.get(URL_NOTES_LIST)
+        self.assertRedirects(response, URL_REDIRECT_LIST)
+
+    def test_cached_record_without_password(self):
+        """В кэше лежит короткая запись без хэша пароля"""
+        self.author.set_password('password')
+        self.author.save()
+        self.auth_client.force_login(self.author)
+        self.auth_client.get(URL_NOTES_LIST)
+        record = cache.get(user_cache_key(self.author.pk))
+        self.assertNotIn('password', record['fields'])
+        self.assertNotIn(self.author.password, str(record))
+
+    def test_inactive_cached_user_rejected(self):
+        """Неактивный пользователь из кэша не аутентифицируется"""
+        self.auth_client.get(URL_NOTES_LIST)
+        key = user_cache_key(self.author.pk)
+        record = cache.get(key)
+        record['fields']['is_active'] = False
+        cache.set(key, record)
+        response = self.auth_client.get(URL_NOTES_LIST)
+        self.assertRedirects(response, URL_REDIRECT_LIST)
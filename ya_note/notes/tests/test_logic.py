@@ -1,14 +1,30 @@
+import io
+import json
+import tempfile
+import zipfile
 from http import HTTPStatus
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from pytils.translit import slugify
 
 from notes.forms import WARNING
-from notes.models import Note
+from notes.models import Note, NoteTerm, PurgeJob
+from notes.search import search_notes, term_frequencies
+from notes.slugs import allocate_slug, allocate_slugs
+from notes.transfer import INVALID_ARCHIVE
+from yanote import settings_production
 
 from .fixtures import (SLUG, URL_NOTES_ADD, URL_NOTES_DELETE, URL_NOTES_EDIT,
-                       URL_NOTES_SUCCESS)
+                       URL_NOTES_EXPORT, URL_NOTES_IMPORT, URL_NOTES_SUCCESS)
 
 User = get_user_model()
 
@@ -109,6 +125,57 @@ class TestNoteCreation(TestCase):
         self.assertEqual(objects.last().slug, expected_slug)
         self.assertEqual(objects.last().author, self.author)
 
+    def test_empty_slug_collision(self):
+        """
+        Если автоматический slug занят, подбирается первый свободный
+        номер серии одним запросом
+        """
+        base = slugify(self.NOTE_TITLE)
+        for slug in (base, f'{base}-2', f'{base}-10', f'{base}-3-x'):
+            Note.objects.create(title=self.NOTE_TITLE, text=self.NOTE_TEXT,
+                                slug=slug, author=self.author)
+
+        with self.assertNumQueries(1):
+            slug = allocate_slug(Note.objects.all(), self.NOTE_TITLE)
+        response = self.auth_client.post(URL_NOTES_ADD,
+                                         data=self.form_data_no_slug)
+
+        self.assertEqual(slug, f'{base}-11')
+        self.assertRedirects(response, URL_NOTES_SUCCESS)
+        self.assertEqual(Note.objects.last().slug, f'{base}-11')
+
+    def test_allocate_slugs_batch(self):
+        """
+        Пачке заголовков slug раздаются по запросу на каждую серию
+        """
+        with self.assertNumQueries(2):
+            slugs = allocate_slugs(Note.objects.all(), (
+                self.NOTE_TITLE, 'Другой', self.NOTE_TITLE,
+            ))
+
+        self.assertEqual(slugs, [
+            'zagolovok', slugify('Другой'), 'zagolovok-2'
+        ])
+
+    def test_slug_race_is_retried(self):
+        """
+        Если выбранный slug занят параллельной вставкой,
+        он подбирается заново
+        """
+        Note.objects.create(title=self.NOTE_TITLE, text=self.NOTE_TEXT,
+                            slug='zagolovok', author=self.author)
+        stale = iter(['zagolovok'])
+
+        def allocate(queryset, title):
+            return next(stale, None) or allocate_slug(queryset, title)
+
+        with mock.patch('notes.models.allocate_slug', allocate):
+            note = Note.objects.create(title=self.NOTE_TITLE,
+                                       text=self.NOTE_TEXT,
+                                       author=self.author)
+
+        self.assertEqual(note.slug, 'zagolovok-2')
+
 
 class TestEditAndDeleteNote(TestCase):
     NOTE_TEXT = 'Текст заметки'
@@ -186,3 +253,331 @@ class TestEditAndDeleteNote(TestCase):
         self.assertEqual(note_from_db.title, self.note.title)
         self.assertEqual(note_from_db.slug, self.note.slug)
         self.assertEqual(note_from_db.author, self.note.author)
+
+
+class TestNoteSearchIndex(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Тестовый автор')
+        cls.note = Note.objects.create(title='Заголовок', text='Текст',
+                                       slug=SLUG, author=cls.author)
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def found(self, query):
+        return [row['note'] for row in search_notes(self.author, query)]
+
+    def test_index_follows_edits_and_deletes(self):
+        """
+        Поисковый индекс обновляется при изменении и удалении заметки
+        """
+        self.assertEqual(self.found('текст'), [self.note.pk])
+
+        self.author_client.post(URL_NOTES_EDIT, data={
+            'title': 'Заголовок', 'text': 'Новый', 'slug': SLUG,
+        })
+        self.assertEqual(self.found('текст'), [])
+        self.assertEqual(self.found('новый'), [self.note.pk])
+
+        self.author_client.post(URL_NOTES_DELETE)
+        self.assertEqual(self.found('новый'), [])
+        self.assertFalse(NoteTerm.objects.exists())
+
+    def test_reindex_notes(self):
+        """
+        Команда reindex_notes индексирует заметки,
+        вставленные в обход Note.save
+        """
+        Note.objects.bulk_create(
+            Note(title='Робот', text='Текст', slug=f'robot-{index}',
+                 author=self.author)
+            for index in range(3)
+        )
+        self.assertEqual(self.found('робот'), [])
+
+        call_command('reindex_notes', author=self.author.username,
+                     batch_size=2, stdout=StringIO())
+
+        self.assertEqual(len(self.found('робот')), 3)
+
+
+@override_settings(NOTES_TRANSFER_BATCH_SIZE=4)
+class TestNotesTransfer(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Тестовый автор')
+        cls.reader = User.objects.create(username='Читатель')
+        for index in range(5):
+            Note.objects.create(title='Робот', text=f'Текст {index}',
+                                author=cls.author)
+        Note.objects.create(title='Чужая', text='Текст', author=cls.reader)
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def export(self, file_format):
+        response = self.author_client.get(
+            URL_NOTES_EXPORT, {'format': file_format}
+        )
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def upload(self, client, content, name='notes.jsonl'):
+        return client.post(URL_NOTES_IMPORT, {
+            'file': SimpleUploadedFile(name, content),
+        })
+
+    def test_export_only_own_notes(self):
+        """
+        Выгрузка в JSONL и zip содержит все заметки пользователя
+        и только их
+        """
+        lines = self.export('jsonl')
+        with zipfile.ZipFile(io.BytesIO(self.export('zip'))) as archive:
+            archived = archive.read('notes.jsonl')
+
+        self.assertEqual(lines, archived)
+        self.assertEqual(
+            [json.loads(line) for line in lines.splitlines()],
+            list(Note.objects.filter(author=self.author).order_by(
+                'id'
+            ).values('title', 'text', 'slug')),
+        )
+
+    def test_export_bad_format(self):
+        response = self.author_client.get(URL_NOTES_EXPORT, {'format': 'xml'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_import_allocates_taken_slugs(self):
+        """
+        Загрузка чужой выгрузки создаёт заметки с новыми slug,
+        свободные slug из файла сохраняются, заметки попадают в поиск
+        """
+        content = self.export('zip')
+        Note.objects.filter(author=self.author, slug='robot-5').delete()
+
+        response = self.upload(self.reader_client, content, 'notes.zip')
+
+        self.assertEqual(response.context['imported'], 5)
+        slugs = set(Note.objects.filter(
+            author=self.reader, title='Робот'
+        ).values_list('slug', flat=True))
+        self.assertEqual(len(slugs), 5)
+        self.assertIn('robot-5', slugs)
+        self.assertEqual(Note.objects.filter(slug='robot').count(), 1)
+        self.assertEqual(len(search_notes(self.reader, 'робот')), 5)
+
+    def test_import_query_count_independent_of_rows(self):
+        """
+        Количество запросов зависит от числа пачек, а не строк:
+        slug не проверяются по одному
+        """
+        def queries(count):
+            content = ''.join(
+                json.dumps({'title': 'Новая', 'text': f'Текст {index}'},
+                           ensure_ascii=False) + '\n'
+                for index in range(count)
+            ).encode()
+            with CaptureQueriesContext(connection) as captured:
+                self.upload(self.author_client, content)
+            return len(captured.captured_queries)
+
+        self.assertEqual(queries(1), queries(4))
+
+    def test_import_skips_bad_lines(self):
+        """
+        Некорректные строки пропускаются, неподходящий slug
+        подбирается по заголовку
+        """
+        content = '\n'.join((
+            '{"title": "Хорошая", "text": "Текст", "slug": "не slug"}',
+            'не json',
+            '{"title": "", "text": "Без заголовка"}',
+            '[1, 2]',
+        )).encode()
+
+        response = self.upload(self.author_client, content)
+
+        self.assertEqual(response.context['imported'], 1)
+        self.assertEqual(response.context['skipped'], 3)
+        self.assertTrue(
+            Note.objects.filter(slug=slugify('Хорошая')).exists()
+        )
+
+    def test_import_corrupt_archive(self):
+        """
+        Повреждённый zip и zip без notes.jsonl не загружаются,
+        форма показывает ошибку
+        """
+        without_member = io.BytesIO()
+        with zipfile.ZipFile(without_member, 'w') as archive:
+            archive.writestr('other.txt', 'текст')
+        count = Note.objects.count()
+        for content in (b'PK\x03\x04 not a zip', without_member.getvalue()):
+            with self.subTest(content=content[:10]):
+                response = self.upload(
+                    self.author_client, content, 'notes.zip'
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertFormError(
+                    response, 'form', 'file', INVALID_ARCHIVE
+                )
+        self.assertEqual(Note.objects.count(), count)
+
+
+class TestDeactivateUser(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Тестовый автор')
+        cls.reader = User.objects.create(username='Читатель')
+        for author in (cls.author, cls.author, cls.author, cls.reader):
+            Note.objects.create(title='Робот', text='Текст', author=author)
+
+    def test_deactivated_user_logged_out(self):
+        """Отключённый пользователь больше не авторизован"""
+        client = Client()
+        client.force_login(self.author)
+
+        call_command('deactivate_user', self.author.username,
+                     stdout=StringIO())
+
+        self.assertEqual(client.get(URL_NOTES_ADD).status_code,
+                         HTTPStatus.FOUND)
+        self.assertEqual(Note.objects.count(), 4)
+
+    def test_purge_deletes_notes_in_batches(self):
+        """
+        С --purge заметки пользователя и их поисковый индекс удаляются
+        пачками, затем удаляется сам пользователь
+        """
+        stdout = StringIO()
+
+        call_command('deactivate_user', self.author.username, purge=True,
+                     batch_size=2, stdout=stdout)
+
+        self.assertIn('Удалено заметок: 2 из 3', stdout.getvalue())
+        self.assertFalse(User.objects.filter(pk=self.author.pk).exists())
+        self.assertEqual(
+            list(Note.objects.values_list('author', flat=True)),
+            [self.reader.pk],
+        )
+        self.assertEqual(
+            set(NoteTerm.objects.values_list('author', flat=True)),
+            {self.reader.pk},
+        )
+        job = PurgeJob.objects.get()
+        self.assertEqual(
+            (job.status, job.deleted, job.total), (PurgeJob.DONE, 3, 3)
+        )
+
+    def interrupted_job(self, heartbeat):
+        """Задание, прерванное после удаления одной заметки"""
+        Note.objects.filter(author=self.author).first().delete()
+        return PurgeJob.objects.create(
+            target_id=self.author.pk, target=str(self.author),
+            status=PurgeJob.RUNNING, deleted=1, heartbeat=heartbeat,
+        )
+
+    def test_run_purge_jobs_resumes_interrupted_job(self):
+        """run_purge_jobs продолжает прерванное удаление с прогрессом"""
+        job = self.interrupted_job(
+            timezone.now() - timezone.timedelta(hours=1)
+        )
+        stdout = StringIO()
+
+        call_command('run_purge_jobs', stdout=stdout)
+
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.status, job.deleted, job.total), (PurgeJob.DONE, 3, 3)
+        )
+        self.assertIn('удалено 3 из 3', stdout.getvalue())
+        self.assertFalse(User.objects.filter(pk=self.author.pk).exists())
+
+    def test_run_purge_jobs_skips_live_job(self):
+        """Задание, которое выполняет другой процесс, не запускается"""
+        job = self.interrupted_job(timezone.now())
+        stdout = StringIO()
+
+        call_command('run_purge_jobs', stdout=stdout)
+
+        self.assertIn('выполняется другим процессом', stdout.getvalue())
+        self.assertEqual(Note.objects.filter(author=self.author).count(), 2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, PurgeJob.RUNNING)
+
+
+class TestSeedNotes(TestCase):
+
+    def test_seed_notes(self):
+        """
+        Команда seed_notes создаёт заданное количество заметок
+        с уникальными slug без вызова Note.save и поисковым индексом,
+        повторный запуск с тем же --seed ничего не добавляет
+        """
+        for _ in range(2):
+            call_command(
+                'seed_notes', users=3, notes=200, batch_size=7,
+                stdout=StringIO(),
+            )
+        slugs = Note.objects.values_list('slug', flat=True)
+
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(len(slugs), 200)
+        self.assertEqual(len(set(slugs)), 200)
+        note = Note.objects.order_by('pk').first()
+        terms = NoteTerm.objects.filter(note=note)
+        self.assertEqual(
+            sorted(terms.values_list('term', 'frequency')),
+            sorted(term_frequencies(note).items()),
+        )
+        self.assertIn(
+            note.pk,
+            [hit['note'] for hit in search_notes(note.author, note.title)],
+        )
+
+
+class TestSqlitePragmas(TestCase):
+
+    @override_settings(SQLITE_PRAGMAS=settings_production.SQLITE_PRAGMAS)
+    def test_production_pragmas(self):
+        """
+        Новое соединение профиля settings_production работает в режиме
+        WAL с заданными PRAGMA
+        """
+        default = connections[DEFAULT_DB_ALIAS]
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = default.__class__(
+                {
+                    **default.settings_dict,
+                    'NAME': str(Path(directory) / 'db.sqlite3'),
+                },
+                DEFAULT_DB_ALIAS,
+            )
+            try:
+                with wrapper.cursor() as cursor:
+                    values = {
+                        pragma: cursor.execute(
+                            f'PRAGMA {pragma}'
+                        ).fetchone()[0]
+                        for pragma in ('journal_mode', 'synchronous',
+                                       'busy_timeout', 'cache_size')
+                    }
+            finally:
+                wrapper.close()
+
+        self.assertEqual(values, {
+            'journal_mode': 'wal',
+            # NORMAL
+            'synchronous': 1,
+            'busy_timeout': 5000,
+            'cache_size': -64 * 1024,
+        })
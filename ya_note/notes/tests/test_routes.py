@@ -1,12 +1,16 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
+
+from django.urls import reverse
 
 from notes.models import Note
+from ya_common.metrics import registry
+from ya_common.middleware import get_route_stats, reset_route_stats
 
 from .fixtures import (AUTHOR_URLS, ONLY_AUTH_URLS, PUBLIC_URLS,
-                       REDIRECTS_ANONYM, SLUG)
+                       REDIRECTS_ANONYM, SLUG, URL_NOTES_LIST)
 
 User = get_user_model()
 
@@ -82,3 +86,49 @@ class TestRoutes(TestCase):
             with self.subTest(url=url, redirect_url=redirect_url):
                 response = self.client.get(url)
                 self.assertRedirects(response, redirect_url)
+
+    @override_settings(
+        PERFORMANCE_INSTRUMENTATION=True, PERFORMANCE_MEMORY_SAMPLE_RATE=1
+    )
+    def test_server_timing(self):
+        """
+        С включённым инструментированием ответ содержит Server-Timing,
+        а замеры копятся по имени маршрута
+        """
+        reset_route_stats()
+        response = self.client_author.get(URL_NOTES_LIST)
+        stats = get_route_stats()['notes:list']
+
+        self.assertIn('db;desc="', response['Server-Timing'])
+        self.assertIn('render;dur=', response['Server-Timing'])
+        self.assertIn('mem;desc=', response['Server-Timing'])
+        self.assertEqual(stats['count'], 1)
+        self.assertGreater(stats['queries'], 0)
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_metrics_endpoint(self):
+        """
+        Страница метрик доступна только персоналу и отдаёт
+        счётчики и гистограммы по маршрутам
+        """
+        registry.reset()
+        self.client_author.get(URL_NOTES_LIST)
+        admin = User.objects.create(username='Администратор', is_staff=True)
+        admin_client = Client()
+        admin_client.force_login(admin)
+        metrics_url = reverse('metrics')
+        text = admin_client.get(metrics_url).content.decode()
+
+        self.assertEqual(
+            self.client_author.get(metrics_url).status_code,
+            HTTPStatus.FOUND
+        )
+        self.assertIn(
+            'http_requests_total'
+            '{route="notes:list",method="GET",status="200"} 1',
+            text
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count{route="notes:list"} 1', text
+        )
+        self.assertIn('db_queries_total{route="notes:list"}', text)
@@ -0,0 +1,186 @@
+"""
+Выгрузка и загрузка заметок пользователя.
+
+Выгрузка — JSONL, по строке {"title", "text", "slug"} на заметку,
+или zip с тем же JSONL внутри. Ответ собирается из итератора: в памяти
+одновременно держится только одна пачка заметок.
+
+Загрузка принимает те же форматы. Строки вставляются пачками через
+bulk_create, slug подбираются для всей пачки сразу, а не запросом
+exists() на каждую строку. Повреждённый zip или zip без notes.jsonl
+останавливает загрузку с ValidationError.
+"""
+import io
+import json
+import zipfile
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_slug
+from django.db import IntegrityError, transaction
+
+from .models import SLUG_ALLOCATION_ATTEMPTS, Note
+from .search import index_notes
+from .slugs import SLUG_MAX_LENGTH, allocate_slugs
+
+FORMATS = ('jsonl', 'zip')
+ARCHIVE_MEMBER = 'notes.jsonl'
+ZIP_MAGIC = b'PK'
+TITLE_MAX_LENGTH = Note._meta.get_field('title').max_length
+INVALID_ARCHIVE = (
+    f'Архив повреждён или в нём нет файла {ARCHIVE_MEMBER}.'
+)
+
+
+def export_lines(author):
+    """Заметки автора строками JSONL в байтах, по возрастанию id."""
+    notes = Note.objects.filter(author=author).order_by('id').values_list(
+        'title', 'text', 'slug'
+    )
+    for title, text, slug in notes.iterator(
+        chunk_size=settings.NOTES_TRANSFER_BATCH_SIZE
+    ):
+        yield (json.dumps(
+            {'title': title, 'text': text, 'slug': slug},
+            ensure_ascii=False,
+        ) + '\n').encode()
+
+
+class StreamBuffer(io.RawIOBase):
+    """Файл для ZipFile, из которого записанное забирается кусками."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_zip(author):
+    """
+    zip с JSONL заметок автора. Файл в архиве пишется потоком:
+    размеры и контрольная сумма идут после данных.
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(ARCHIVE_MEMBER, 'w', force_zip64=True) as member:
+            for line in export_lines(author):
+                member.write(line)
+                if buffer.chunks:
+                    yield buffer.take()
+    yield buffer.take()
+
+
+def read_lines(upload):
+    """
+    Строки загруженного JSONL или JSONL из zip. Ошибка архива может
+    обнаружиться и посреди чтения, когда часть пачек уже загружена.
+    """
+    upload.seek(0)
+    if upload.read(len(ZIP_MAGIC)) == ZIP_MAGIC:
+        upload.seek(0)
+        try:
+            with zipfile.ZipFile(upload) as archive:
+                with archive.open(ARCHIVE_MEMBER) as member:
+                    yield from member
+        except (zipfile.BadZipFile, KeyError, EOFError, zlib.error):
+            raise ValidationError(INVALID_ARCHIVE)
+        return
+    upload.seek(0)
+    yield from upload
+
+
+def parse_note(line):
+    """
+    Заметка из строки файла или None, если строка некорректна.
+    Slug, который не подходит для адреса, подбирается заново.
+    """
+    try:
+        record = json.loads(line)
+        title = str(record.get('title') or '').strip()
+        text = str(record.get('text') or '').strip()
+        slug = str(record.get('slug') or '').strip()
+    except (ValueError, AttributeError):
+        return None
+    if not title or not text or len(title) > TITLE_MAX_LENGTH:
+        return None
+    try:
+        validate_slug(slug)
+    except ValidationError:
+        slug = ''
+    return Note(title=title, text=text, slug=slug[:SLUG_MAX_LENGTH])
+
+
+def insert_batch(author, notes):
+    """
+    Вставляет пачку заметок. Свободные slug из файла сохраняются,
+    занятые и пустые подбираются по заголовку одним проходом.
+    Гонку с параллельной вставкой решает уникальный индекс.
+    """
+    for attempt in range(1, SLUG_ALLOCATION_ATTEMPTS + 1):
+        try:
+            with transaction.atomic():
+                return insert_notes(author, notes)
+        except IntegrityError:
+            if attempt == SLUG_ALLOCATION_ATTEMPTS:
+                raise
+
+
+def insert_notes(author, notes):
+    wanted = {note.slug for note in notes if note.slug}
+    taken = set(Note.objects.filter(
+        slug__in=wanted
+    ).values_list('slug', flat=True))
+    keep, allocate = [], []
+    for note in notes:
+        note.author = author
+        if note.slug and note.slug not in taken:
+            taken.add(note.slug)
+            keep.append(note)
+        else:
+            allocate.append(note)
+    # Сначала вставляются slug из файла, чтобы подбор их учёл.
+    Note.objects.bulk_create(keep)
+    for note, slug in zip(allocate, allocate_slugs(
+        Note.objects.all(), [note.title for note in allocate]
+    )):
+        note.slug = slug
+    Note.objects.bulk_create(allocate)
+    # bulk_create на SQLite не возвращает id, заметки читаются по slug.
+    index_notes(Note.objects.filter(
+        slug__in=[note.slug for note in notes]
+    ))
+    return len(notes)
+
+
+def import_notes(author, upload):
+    """
+    Загружает заметки из файла пачками по NOTES_TRANSFER_BATCH_SIZE.
+    Возвращает количество загруженных и пропущенных строк.
+    """
+    imported = skipped = 0
+    batch = []
+    for line in read_lines(upload):
+        if not line.strip():
+            continue
+        note = parse_note(line)
+        if note is None:
+            skipped += 1
+            continue
+        batch.append(note)
+        if len(batch) == settings.NOTES_TRANSFER_BATCH_SIZE:
+            imported += insert_batch(author, batch)
+            batch = []
+    if batch:
+        imported += insert_batch(author, batch)
+    return imported, skipped
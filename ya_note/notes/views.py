@@ -1,9 +1,21 @@
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import BadRequest, ValidationError
+from django.http import StreamingHttpResponse
 from django.urls import reverse_lazy
 from django.views import generic
 
-from .forms import NoteForm
+from .forms import NoteForm, NotesImportForm
 from .models import Note
+from .search import SNIPPET_WORDS, highlight, search_notes, tokenize
+from .transfer import FORMATS, export_lines, export_zip, import_notes
+
+INVALID_CURSOR = 'Некорректный параметр after.'
+INVALID_FORMAT = 'Некорректный параметр format.'
+EXPORT_RESPONSES = {
+    'jsonl': (export_lines, 'application/x-ndjson', 'notes.jsonl'),
+    'zip': (export_zip, 'application/zip', 'notes.zip'),
+}
 
 
 class Home(generic.TemplateView):
@@ -32,9 +44,7 @@ class NoteCreate(NoteBase, generic.CreateView):
     form_class = NoteForm
 
     def form_valid(self, form):
-        new_note = form.save(commit=False)
-        new_note.author = self.request.user
-        new_note.save()
+        form.instance.author = self.request.user
         return super().form_valid(form)
 
 
@@ -50,10 +60,127 @@ class NoteDelete(NoteBase, generic.DeleteView):
 
 
 class NotesList(NoteBase, generic.ListView):
-    """Список всех заметок пользователя."""
+    """
+    Список заметок пользователя.
+
+    Страницы выбираются по ключу (author, id) из параметра after,
+    а не через OFFSET, поэтому стоимость страницы не зависит от её глубины.
+    """
     template_name = 'notes/list.html'
 
+    def get_after(self):
+        after = self.request.GET.get('after')
+        if after is None:
+            return None
+        try:
+            return int(after)
+        except ValueError:
+            raise BadRequest(INVALID_CURSOR)
+
+    def get_queryset(self):
+        """Для списка нужны только id, slug и title."""
+        return super().get_queryset().only(
+            'id', 'slug', 'title'
+        ).order_by('id')
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Ограничивает страницу сверху id первой заметки следующей страницы,
+        чтобы object_list остался QuerySet-ом.
+        """
+        after = self.get_after()
+        if after is not None:
+            queryset = queryset.filter(id__gt=after)
+        boundary = next(iter(
+            queryset.values_list('id', flat=True)[page_size:page_size + 1]
+        ), None)
+        if boundary is None:
+            return None, None, queryset, False
+        return None, None, queryset.filter(id__lt=boundary), True
+
+    def get_paginate_by(self, queryset):
+        return settings.NOTES_COUNT_ON_LIST_PAGE
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = list(context['object_list'])
+        context['notes_count'] = super().get_queryset().count()
+        if context['is_paginated'] and page:
+            context['next_after'] = page[-1].id
+        return context
+
+
+class NoteSearch(LoginRequiredMixin, generic.ListView):
+    """Поиск по заметкам пользователя."""
+    template_name = 'notes/search.html'
+
+    def get_query(self):
+        return self.request.GET.get('q', '').strip()
+
+    def get_queryset(self):
+        return search_notes(self.request.user, self.get_query())
+
+    def get_paginate_by(self, queryset):
+        return settings.NOTES_SEARCH_RESULTS_ON_PAGE
+
+    def get_context_data(self, **kwargs):
+        """Загружаем только заметки текущей страницы результатов."""
+        context = super().get_context_data(**kwargs)
+        query = self.get_query()
+        terms = set(tokenize(query))
+        page = list(context['object_list'])
+        notes = Note.objects.filter(author=self.request.user).only(
+            'id', 'slug', 'title', 'text'
+        ).in_bulk([row['note'] for row in page])
+        context['query'] = query
+        context['results'] = [
+            {
+                'note': notes[row['note']],
+                'title': highlight(notes[row['note']].title, terms),
+                'snippet': highlight(
+                    notes[row['note']].text, terms, SNIPPET_WORDS
+                ),
+            }
+            for row in page if row['note'] in notes
+        ]
+        return context
+
 
 class NoteDetail(NoteBase, generic.DetailView):
     """Заметка подробно."""
     template_name = 'notes/detail.html'
+
+
+class NotesExport(LoginRequiredMixin, generic.View):
+    """Выгрузка всех заметок пользователя в JSONL или zip."""
+
+    def get(self, request):
+        file_format = request.GET.get('format', FORMATS[0])
+        if file_format not in EXPORT_RESPONSES:
+            raise BadRequest(INVALID_FORMAT)
+        export, content_type, filename = EXPORT_RESPONSES[file_format]
+        response = StreamingHttpResponse(
+            export(request.user), content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{filename}"'
+        )
+        return response
+
+
+class NotesImport(LoginRequiredMixin, generic.FormView):
+    """Загрузка заметок из файла выгрузки."""
+    template_name = 'notes/import.html'
+    form_class = NotesImportForm
+
+    def form_valid(self, form):
+        try:
+            imported, skipped = import_notes(
+                self.request.user, form.cleaned_data['file']
+            )
+        except ValidationError as error:
+            form.add_error('file', error)
+            return self.form_invalid(form)
+        return self.render_to_response(self.get_context_data(
+            form=NotesImportForm(), imported=imported, skipped=skipped
+        ))
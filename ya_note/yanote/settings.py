@@ -1,9 +1,13 @@
+import sys
 from pathlib import Path
 
 from django.urls import reverse_lazy
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Общие модули обоих проектов лежат в пакете ya_common рядом с ними.
+sys.path.append(str(BASE_DIR.parent))
+
 SECRET_KEY = 'django-insecure-yipnj$#j!ajarq%k55z4kuf3x79)91h0h42o9!1ho(z=!%mt=#'
 
 DEBUG = False
@@ -22,6 +26,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ya_common.middleware.ServerTimingMiddleware',
+    'ya_common.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +65,10 @@ DATABASES = {
     }
 }
 
+# PRAGMA для каждого нового соединения SQLite, см. профиль
+# settings_production.
+SQLITE_PRAGMAS = {}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -85,5 +95,36 @@ STATIC_URL = '/static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Кэш пользователя для ya_common.auth.CachedAuthenticationMiddleware,
+# включается профилем yanote.settings_cached.
+USER_CACHE_ALIAS = 'default'
+USER_CACHE_TIMEOUT = 60 * 5
+
+NOTES_COUNT_ON_LIST_PAGE = 100
+
+NOTES_SEARCH_RESULTS_ON_PAGE = 20
+
+# Сколько заметок читать и вставлять за раз при выгрузке и загрузке.
+NOTES_TRANSFER_BATCH_SIZE = 500
+
+# Удаление пользователя с заметками, см. notes.purge.
+# Сколько заметок удалять в одной транзакции.
+PURGE_BATCH_SIZE = 200
+# Выполняемое задание без новой пачки дольше PURGE_LEASE секунд
+# считается прерванным, его продолжает run_purge_jobs.
+PURGE_LEASE = 5 * 60
+
 LOGIN_URL = reverse_lazy('users:login')
 LOGIN_REDIRECT_URL = reverse_lazy('notes:home')
+
+# Замеры запросов: заголовок Server-Timing и агрегаты по маршрутам.
+PERFORMANCE_INSTRUMENTATION = False
+# Доля запросов, для которых пиковая память замеряется tracemalloc.
+PERFORMANCE_MEMORY_SAMPLE_RATE = 0.01
+# Сколько последних запросов маршрута входит в скользящие агрегаты.
+PERFORMANCE_WINDOW = 1000
+
+# Метрики в формате Prometheus на странице /metrics/.
+METRICS_ENABLED = False
+# Директория для mmap-файлов метрик, общих для всех процессов.
+METRICS_MULTIPROCESS_DIR = None